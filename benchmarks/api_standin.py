@@ -0,0 +1,233 @@
+# A local stand-in for the RapidAPI Twitter and Google Trends endpoints, to load-test the fetch layer.
+#
+# Serves the Locations, Trends, Hashflags and Google trends endpoints from synthetic payloads, or
+# from an archive of real responses written by `update_database.py --archive`. Every request can be
+# delayed, failed with a server error, or rejected with 429 once the requests per second exceed the
+# plan, as RapidAPI does.
+#
+# Usage:
+#     python benchmarks/api_standin.py --port 8765 --latency 0.3 --jitter 0.2 --error-rate 0.02 --rate-limit 5
+#     TWITTER_API_BASE_URL=http://127.0.0.1:8765 GOOGLE_API_BASE_URL=http://127.0.0.1:8765 \
+#         python scripts/update_database.py --full
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.synthetic import google_payload, twitter_hashflags, twitter_locations, twitter_timeline
+from scripts.response_archive import read_archive
+
+# Path of each endpoint -> source name of its responses in the archive
+ENDPOINTS = {
+    "/v1.1/Locations/": "twitter_locations",
+    "/v1.1/Trends/": "twitter_trends",
+    "/v1.1/Hashflags/": "twitter_hashflags",
+    "/trends": "google_trends",
+}
+
+SERVER_ERRORS = (500, 502, 503)
+RATE_LIMIT_MESSAGE = "You have exceeded the rate limit per second for your plan, BASIC, by the API provider"
+
+
+class Behaviour(NamedTuple):
+    """How the stand-in answers, shared by every endpoint."""
+    latency: float = 0.0      # seconds before every answer
+    jitter: float = 0.0       # up to this many seconds added at random to the latency
+    error_rate: float = 0.0   # share of the requests failed with a 5xx
+    rate_limit: float = 0.0   # requests per second before answering 429, unlimited when 0
+    burst: int = 1            # requests accepted at once before the rate limit applies
+
+
+class RateLimiter:
+    """Token bucket of `rate` requests per second, holding up to `burst` requests."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token. Returns 0 if there was one, or else the seconds until the next one."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class SyntheticPayloads:
+    """Generated responses, the trends of every location seeded by its id so they stay the same between runs."""
+
+    def __init__(self, countries=50, trends=20, hashflags=500, google_countries=20, keywords=25):
+        self.countries = countries
+        self.trends = trends
+        self.hashflags = hashflags
+        self.google_countries = google_countries
+        self.keywords = keywords
+
+    def get(self, source, location):
+        if source == "twitter_locations":
+            return twitter_locations(self.countries)
+        if source == "twitter_trends":
+            return twitter_timeline(self.trends, seed=int(location or 0))
+        if source == "twitter_hashflags":
+            return twitter_hashflags(self.hashflags)
+        return google_payload(self.google_countries, self.keywords)
+
+
+class ArchivedPayloads:
+    """Responses read back from an archive, the latest one of every source and location."""
+
+    def __init__(self, paths):
+        self.responses = {}
+        for record in read_archive(paths):
+            self.responses[record["source"], record["location"]] = record["response"]
+
+    def get(self, source, location):
+        return self.responses.get((source, location))
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, payloads, behaviour=Behaviour(), seed=None):
+        super().__init__(address, StandinHandler)
+        self.payloads = payloads
+        self.behaviour = behaviour
+        self.limiter = RateLimiter(behaviour.rate_limit, behaviour.burst) if behaviour.rate_limit else None
+        self.random = random.Random(seed)
+        self.stats = Counter()  # (endpoint, status) -> requests
+        self._encoded = {}      # (source, location) -> JSON body, encoded once
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def body(self, source, location):
+        """The encoded response of an endpoint, or None if there is none for the location."""
+        key = (source, location)
+        with self._lock:
+            if key not in self._encoded:
+                payload = self.payloads.get(source, location)
+                self._encoded[key] = None if payload is None else json.dumps(payload, ensure_ascii=False).encode()
+            return self._encoded[key]
+
+    def count(self, endpoint, status):
+        with self._lock:
+            self.stats[endpoint, status] += 1
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the shared requests session expects
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        source = ENDPOINTS.get(url.path)
+        if source is None:
+            return self.answer(url.path, 404, {"message": f"Endpoint {url.path} does not exist"})
+
+        server = self.server
+        if server.limiter is not None:
+            wait = server.limiter.acquire()
+            if wait:
+                # The gateway rejects the request before it reaches the API, so right away
+                return self.answer(url.path, 429, {"message": RATE_LIMIT_MESSAGE},
+                                   {"Retry-After": str(math.ceil(wait))})
+
+        behaviour = server.behaviour
+        time.sleep(behaviour.latency + server.random.uniform(0, behaviour.jitter))
+        if server.random.random() < behaviour.error_rate:
+            return self.answer(url.path, server.random.choice(SERVER_ERRORS), {"message": "Internal Server Error"})
+
+        location = parse_qs(url.query).get("location_id", [None])[0]
+        body = server.body(source, location)
+        if body is None:
+            return self.answer(url.path, 200, {"status": False, "message": f"No trends for location {location}"})
+        self.answer(url.path, 200, body)
+
+    def answer(self, endpoint, status, payload, headers=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.server.count(endpoint, status)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per request would slow down the server under load
+
+
+def start_standin(payloads, behaviour=Behaviour(), host="127.0.0.1", port=0, seed=None):
+    """Serves the stand-in on a background thread, on a free port unless one is given.
+    Stop it with `server.shutdown()`."""
+    server = StandinServer((host, port), payloads, behaviour, seed)
+    threading.Thread(target=server.serve_forever, name="api-standin", daemon=True).start()
+    return server
+
+
+def print_stats(stats):
+    for (endpoint, status), requests in sorted(stats.items()):
+        print(f"{endpoint:<20} {status:>4} {requests:>8}")
+
+
+def add_arguments(parser):
+    """Arguments of the stand-in, shared with the benchmarks that start one."""
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many random seconds added")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failed with a 5xx")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second before 429")
+    parser.add_argument("--burst", type=int, default=1, help="requests accepted at once under the rate limit")
+    parser.add_argument("--countries", type=int, default=50, help="countries of the synthetic locations")
+    parser.add_argument("--trends", type=int, default=20, help="trends per synthetic Trends response")
+    parser.add_argument("--archive", metavar="PATH", nargs="+",
+                        help="serve the responses of archive files or directories instead of synthetic ones")
+    parser.add_argument("--seed", type=int, help="seed of the random latency and errors")
+
+
+def from_arguments(args):
+    """Payloads and behaviour of the parsed arguments."""
+    payloads = ArchivedPayloads(args.archive) if args.archive else SyntheticPayloads(args.countries, args.trends)
+    behaviour = Behaviour(args.latency, args.jitter, args.error_rate, args.rate_limit, args.burst)
+    return payloads, behaviour
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the RapidAPI endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    payloads, behaviour = from_arguments(args)
+    server = StandinServer((args.host, args.port), payloads, behaviour, args.seed)
+    print(f"Serving the API stand-in on {server.base_url}, stop with Ctrl-C")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print_stats(server.stats)
+
+
+if __name__ == "__main__":
+    main()
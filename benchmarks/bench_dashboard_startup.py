@@ -0,0 +1,86 @@
+# Measures the cold start of the dashboard: the first render of each page in a fresh process,
+# the reruns after it, and which heavy modules the page had to import.
+#
+# Usage:
+#     python benchmarks/bench_dashboard_startup.py --runs 5 --reruns 10
+#
+# Every run is a new Python process rendering the page with streamlit's AppTest. The pages read
+# an empty embedded database (DB_BACKEND=duckdb) in a temporary directory, since the start-up cost
+# does not depend on the data; pass --configured-database to read the configured one instead.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DASHBOARD = os.path.join(REPO_DIR, "frontend", "streamlit_NowTrending_dashboard.py")
+PAGES = ("Twitter", "Google")
+HEAVY_MODULES = ("matplotlib", "scipy", "duckdb", "requests", "psycopg2", "pyarrow")
+
+
+def render(page, reruns):
+    """Runs in the child process: times the first render of a page and its reruns."""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_seconds = time.perf_counter() - start
+
+    app = AppTest.from_file(DASHBOARD, default_timeout=120)
+    app.session_state["platform"] = page
+    start = time.perf_counter()
+    app.run()
+    first_render = time.perf_counter() - start
+    heavy = [module for module in HEAVY_MODULES if module in sys.modules]
+
+    start = time.perf_counter()
+    for _ in range(reruns):
+        app.run()
+    rerun = (time.perf_counter() - start) / max(reruns, 1)
+    return {"streamlit_import": streamlit_seconds, "first_render": first_render, "rerun": rerun,
+            "heavy_modules": heavy, "errors": [exception.message for exception in app.exception]}
+
+
+def run_child(page, reruns, env):
+    result = subprocess.run([sys.executable, __file__, "--child", page, "--reruns", str(reruns)],
+                            capture_output=True, text=True, cwd=REPO_DIR, env=env, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the cold start and the reruns of the dashboard pages.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per page (default: %(default)s)")
+    parser.add_argument("--reruns", type=int, default=10, help="reruns timed after the first render")
+    parser.add_argument("--pages", nargs="+", choices=PAGES, default=list(PAGES))
+    parser.add_argument("--configured-database", action="store_true",
+                        help="read the database of the environment or secrets instead of an empty embedded one")
+    parser.add_argument("--child", choices=PAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(render(args.child, args.reruns)))
+        return
+
+    env = dict(os.environ)
+    directory = tempfile.TemporaryDirectory(prefix="nowtrending-startup-")
+    if not args.configured_database:
+        env.update(DB_BACKEND="duckdb", DB_DUCKDB_PATH=os.path.join(directory.name, "startup.duckdb"),
+                   SNAPSHOT_DIR="")
+    with directory:
+        run_child(PAGES[0], 0, env)  # Creates the database and warms the disk cache, not counted
+
+        print(f"{'page':<8} {'streamlit':>10} {'first render':>13} {'rerun':>8}  heavy modules")
+        for page in args.pages:
+            results = [run_child(page, args.reruns, env) for _ in range(args.runs)]
+            for error in {error for result in results for error in result["errors"]}:
+                print(f"{page}: the page failed to render: {error}", file=sys.stderr)
+            median = {key: statistics.median(result[key] for result in results)
+                      for key in ("streamlit_import", "first_render", "rerun")}
+            print(f"{page:<8} {median['streamlit_import'] * 1000:>8.0f}ms {median['first_render'] * 1000:>11.0f}ms "
+                  f"{median['rerun'] * 1000:>6.1f}ms  {', '.join(results[-1]['heavy_modules']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Compares the previous parse_trends_data with the compiled extractor of scripts/trend_parser.py,
+# on decoded timelines and from the JSON of a response: decoded whole then parsed, or streamed.
+#
+# A real response holds 20 trends, which are parsed while still in the CPU caches; larger timelines
+# show the cost of walking decoded JSON that no longer fits in them.
+# Timelines larger than --max-decoded items take several GB once decoded, so only the
+# streaming parser is timed on them.
+#
+# Usage:
+#     python benchmarks/bench_parse_trends.py --items 20 10000 100000 1000000
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.synthetic import twitter_timeline, twitter_timeline_json
+from scripts.trend_parser import parse_trends, iter_trends
+
+
+def legacy_parse_trends_data(trends_data):
+    """The previous parser of scripts/update_database.py, which walks the nested lookups once per field."""
+    parsed_trends = []
+    timeline_data = trends_data.get("timeline", {})
+    instructions = timeline_data.get("instructions", [])
+
+    entries = []
+    for instruction in instructions:
+        if "addEntries" in instruction:
+            entries = instruction["addEntries"].get("entries", [])
+            break
+
+    for entry in entries:
+        content = entry.get("content", {})
+        trend = content.get("timelineModule", {}).get("items", [])
+
+        for item in trend:
+            trend_data = item.get("item", {}).get("content", {}).get("trend", {})
+
+            if trend_data:
+                parsed_trends.append({
+                    "trendName": trend_data.get("name"),
+                    "position": item.get("item", {}).get("clientEventInfo", {}).get("details", {}).get("guideDetails", {}).get("transparentGuideDetails", {}).get("trendMetadata", {}).get("position", 0),
+                    "metaDescription": trend_data.get("trendMetadata", {}).get("metaDescription", ""),
+                    "domainContext": trend_data.get("trendMetadata", {}).get("domainContext", ""),
+                    "url": trend_data.get("url", {}).get("url", ""),
+                    "impressionId": trend_data.get("clientEventInfo", {}).get("details", {}).get("guideDetails", {}).get("transparentGuideDetails", {}).get("trendMetadata", {}).get("impressionId", ""),
+                    "relatedTerms": trend_data.get("clientEventInfo", {}).get("details", {}).get("guideDetails", {}).get("transparentGuideDetails", {}).get("trendMetadata", {}).get("relatedTerms", [])
+                })
+
+    return parsed_trends
+
+
+def best_time(func, make_argument, repeat, loops=1):
+    """Best time of `repeat` runs, each calling func `loops` times, per call."""
+    best = float("inf")
+    for _ in range(repeat):
+        arguments = [make_argument() for _ in range(loops)]
+        start = time.perf_counter()
+        for argument in arguments:
+            func(argument)
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trend timeline parsers.")
+    parser.add_argument("--items", type=int, nargs="+", default=[20, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-decoded", type=int, default=200_000,
+                        help="largest timeline to also time decoded (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'items':>10} {'legacy':>11} {'compiled':>11} {'speedup':>8} {'json+legacy':>12} {'streamed':>11} {'speedup':>8}")
+    for n_items in args.items:
+        loops = max(1, 10_000 // n_items)  # Small timelines are timed over several calls
+        raw = twitter_timeline_json(n_items)
+        streamed = best_time(lambda stream: sum(1 for _ in iter_trends(stream)), lambda: io.BytesIO(raw),
+                             args.repeat, loops)
+        if n_items > args.max_decoded:
+            print(f"{n_items:>10} {'-':>11} {'-':>11} {'-':>8} {'-':>12} {streamed * 1e3:>9.2f}ms {'-':>8}")
+            continue
+
+        timeline = twitter_timeline(n_items)
+        assert parse_trends(timeline) == legacy_parse_trends_data(timeline)
+        legacy = best_time(legacy_parse_trends_data, lambda: timeline, args.repeat, loops)
+        compiled = best_time(parse_trends, lambda: timeline, args.repeat, loops)
+        decoded = best_time(lambda stream: legacy_parse_trends_data(json.load(stream)), lambda: io.BytesIO(raw),
+                            args.repeat, loops)
+        del timeline
+
+        print(f"{n_items:>10} {legacy * 1e3:>9.2f}ms {compiled * 1e3:>9.2f}ms {legacy / compiled:>7.1f}x "
+              f"{decoded * 1e3:>10.2f}ms {streamed * 1e3:>9.2f}ms {decoded / streamed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Compares the per-row popularity parsers with the vectorized one in frontend/popularity.py.
+#
+# Usage:
+#     python benchmarks/bench_popularity.py --rows 100000 1000000
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.synthetic import popularity_strings
+from frontend.popularity import parse_popularity_series
+
+
+def extract_numeric(meta_desc):
+    """The previous parser of frontend/explorations.py, applied row by row."""
+    meta_desc = meta_desc.replace(',', '')
+    match = re.search(r'(\d+(?:\.\d+)?)\s*([KM])?', meta_desc, re.IGNORECASE)
+    if not match:
+        return np.nan
+    number = float(match.group(1))
+    suffix = (match.group(2) or '').upper()
+    return number * {'K': 1000, 'M': 1000000}.get(suffix, 1)
+
+
+def parse_popularity(pop_str):
+    """The previous parser of the dashboard, applied row by row."""
+    pop_str = pop_str.strip().lower().replace(" posts", "")
+    try:
+        if pop_str.endswith("m"):
+            return float(pop_str[:-1]) * 1_000_000
+        if pop_str.endswith("k"):
+            return float(pop_str[:-1]) * 1_000
+        return float(pop_str)
+    except ValueError:
+        return 0
+
+
+def best_time(func, values, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(values)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the popularity parsers.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    parsers = {
+        "extract_numeric (apply)": lambda s: s.fillna('').apply(extract_numeric),
+        "parse_popularity (apply)": lambda s: s.fillna('').apply(parse_popularity),
+        "parse_popularity_series": parse_popularity_series,
+    }
+
+    print(f"{'rows':>10} " + " ".join(f"{name:>26}" for name in parsers) + f" {'speedup':>8}")
+    for rows in args.rows:
+        values = pd.Series(popularity_strings(rows), dtype=object)
+        times = [best_time(func, values, args.repeat) for func in parsers.values()]
+        speedup = times[0] / times[-1]
+        print(f"{rows:>10} " + " ".join(f"{t:>25.4f}s" for t in times) + f" {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# Synthetic API payloads for the benchmarks, shaped like the RapidAPI responses
+import io
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+COUNTRIES = [
+    "Argentina", "Australia", "Brazil", "Canada", "Egypt", "France", "Germany", "India",
+    "Indonesia", "Italy", "Japan", "Kenya", "Lebanon", "Mexico", "Netherlands", "Nigeria",
+    "Poland", "Portugal", "Saudi Arabia", "South Africa", "Spain", "Turkey",
+    "United Kingdom", "United States",
+]
+
+
+def country_name(i: int) -> str:
+    """Returns a country name, adding a suffix once the real names run out."""
+    name = COUNTRIES[i % len(COUNTRIES)]
+    return name if i < len(COUNTRIES) else f"{name} {i // len(COUNTRIES)}"
+
+
+def google_payload(n_countries: int = 20, keywords_per_country: int = 25, seed: int = 0) -> dict:
+    """
+    Builds a Google Trends API response.
+    Args:
+        n_countries (int): Number of country records.
+        keywords_per_country (int): Number of keywords in every record.
+        seed (int): Seed for the random generator, so runs are comparable.
+    Returns:
+        dict: A payload accepted by update_google_trends_database.
+    """
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    records = []
+    for i in range(n_countries):
+        scraped_at = now - timedelta(minutes=rng.randint(0, 600))
+        records.append({
+            "country": country_name(i),
+            "lastUpdate": scraped_at.strftime("%d-%m-%Y , %H:%M:%S"),
+            "scrapedAt": scraped_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "keywordsText": [f"keyword {i}-{k} {rng.randint(0, 10**6)}" for k in range(keywords_per_country)],
+        })
+    return {"data": records}
+
+
+def popularity_strings(n: int, seed: int = 0) -> list:
+    """
+    Builds meta_description values as stored in twitter_trend, e.g. "1.7M posts",
+    "997K posts", "9,969 posts", plus empty and missing values.
+    """
+    rng = random.Random(seed)
+    values = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.4:
+            values.append(f"{rng.randint(1, 999)}K posts")
+        elif kind < 0.6:
+            values.append(f"{rng.randint(10, 99) / 10}M posts")
+        elif kind < 0.8:
+            values.append(f"{rng.randint(1000, 9999):,} posts")
+        elif kind < 0.9:
+            values.append("")
+        else:
+            values.append(None)
+    return values
+
+
+def twitter_timeline_items(n_items: int, seed: int = 0):
+    """
+    Yields `n_items` items of a Twitter Trends timeline.
+    A few items are not trends or lack optional fields, as in the real responses.
+    """
+    rng = random.Random(seed)
+    for i in range(n_items):
+        kind = rng.random()
+        if kind < 0.02:
+            yield {"item": {"content": {}}}  # Not a trend
+            continue
+
+        trend_metadata = {"metaDescription": f"{rng.randint(1, 999)}K posts"}
+        if kind > 0.1:
+            trend_metadata["domainContext"] = f"Category {rng.randint(0, 30)} · Trending"
+        trend = {
+            "name": f"#Trend{i}",
+            "url": {"url": f"twitter://search/?query=%23Trend{i}", "urlType": "DeepLink"},
+            "trendMetadata": trend_metadata,
+        }
+        if kind > 0.05:
+            trend["clientEventInfo"] = {"details": {"guideDetails": {"transparentGuideDetails": {"trendMetadata": {
+                "impressionId": f"impression-{i}",
+                "relatedTerms": [f"term {rng.randint(0, 100)}" for _ in range(rng.randint(0, 3))],
+            }}}}}
+        yield {"item": {
+            "content": {"trend": trend},
+            "clientEventInfo": {"details": {"guideDetails": {"transparentGuideDetails": {
+                "trendMetadata": {"position": i + 1}}}}},
+        }}
+
+
+def twitter_timeline(n_items: int, seed: int = 0) -> dict:
+    """Builds a Twitter Trends API response with `n_items` timeline items."""
+    items = list(twitter_timeline_items(n_items, seed))
+    return {"timeline": {"id": "trends", "instructions": [
+        {"clearCache": {}},
+        {"addEntries": {"entries": [{"content": {"timelineModule": {"items": items}}}]}},
+    ]}}
+
+
+def twitter_timeline_json(n_items: int, seed: int = 0) -> bytes:
+    """
+    Same response as twitter_timeline, encoded as JSON one item at a time,
+    so timelines too large to hold decoded in memory can be built.
+    """
+    buffer = io.BytesIO()
+    buffer.write(b'{"timeline": {"id": "trends", "instructions": [{"clearCache": {}}, '
+                 b'{"addEntries": {"entries": [{"content": {"timelineModule": {"items": [')
+    for i, item in enumerate(twitter_timeline_items(n_items, seed)):
+        if i:
+            buffer.write(b", ")
+        buffer.write(json.dumps(item).encode())
+    buffer.write(b"]}}}]}}]}}")
+    return buffer.getvalue()
+
+
+def twitter_locations(n_countries: int, seed: int = 0) -> list:
+    """Builds a Locations API response: `n_countries` countries plus a city for every tenth one."""
+    rng = random.Random(seed)
+    locations = []
+    for i in range(n_countries):
+        name = country_name(i)
+        locations.append({"name": name, "place_id": str(23424700 + i), "location_type": "Country", "country": name})
+        if i % 10 == 0:
+            locations.append({"name": f"City {rng.randint(0, 10**6)}", "place_id": str(10**9 + i),
+                              "location_type": "City", "country": name})
+    return locations
+
+
+def twitter_hashflags(n: int, seed: int = 0) -> list:
+    """Builds a Hashflags API response with `n` distinct hashtags."""
+    rng = random.Random(seed)
+    start = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    hashflags = []
+    for i in range(n):
+        starting = start + rng.randint(0, 30) * 86_400_000
+        hashflags.append({
+            "hashtag": f"Hashflag{i}",
+            "starting_timestamp_ms": starting,
+            "ending_timestamp_ms": starting + rng.randint(1, 60) * 86_400_000,
+            "asset_url": f"https://abs.twimg.com/hashflags/Hashflag{i}.png",
+            "is_hashfetti_enabled": rng.random() < 0.1,
+        })
+    return hashflags
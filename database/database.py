@@ -1,20 +1,31 @@
 import psycopg2
 # import sys
+import csv
+import io
 import os
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+from psycopg2 import pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values as pg_execute_values
+import pandas as pd
 import streamlit as st
 
+from database import duckdb_backend
+
 # # Add the parent directory to Python's module search path
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 # from config import DB_HOST, DB_NAME, DB_USER, DB_PASS, DB_PORT
 
-# Database Credentials
-DB_HOST=st.secrets["DB_HOST"]
-DB_NAME=st.secrets["DB_NAME"]
-DB_USER=st.secrets["DB_USER"]
-DB_PASS=st.secrets["DB_PASS"]
-DB_PORT=st.secrets["DB_PORT"]
+# Database backends, chosen with the DB_BACKEND setting
+POSTGRES = "postgres"
+DUCKDB = "duckdb"   # embedded, in the file of the DB_DUCKDB_PATH setting
+
+DEFAULT_DUCKDB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nowtrending.duckdb")
 
 # Configure logging to only show ERROR or CRITICAL messages
 logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -22,16 +33,72 @@ logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %
 # Optionally, you can set specific loggers to CRITICAL, to prevent messages from specific modules
 logging.getLogger("psycopg2").setLevel(logging.ERROR)  # This suppresses logs from psycopg2
 
+
+# The environment the process started with. Reading st.secrets copies the top-level secrets into os.environ,
+# over the variables already set there, so this is what tells an exported setting from a copied secret.
+_started_with = dict(os.environ)
+
+
+def _secret(name):
+    try:
+        return st.secrets.get(name)
+    except FileNotFoundError:  # No secrets file
+        return None
+
+
+def setting(name, default=None):
+    """Reads a database setting from the environment, or else from the Streamlit secrets.
+       Settings are read when they are needed, so importing this module needs neither.
+       A variable exported before the process started wins over a secret Streamlit copied over it;
+       `streamlit run` copies them before this module is imported, so in the dashboard the secrets win.
+
+    Raises:
+        KeyError: If a setting without a default is set nowhere.
+    """
+    value = os.environ.get(name)
+    if value is not None and name in _started_with and value != _started_with[name]:
+        secret = _secret(name)
+        if secret is not None and value == str(secret):
+            value = _started_with[name]
+    if value is None:
+        value = _secret(name)
+    if value is None:
+        if default is None:
+            raise KeyError(f"{name} is not set in the environment or the Streamlit secrets")
+        return default
+    return value
+
+
+def backend():
+    """Returns the configured database backend, POSTGRES unless DB_BACKEND says otherwise."""
+    name = str(setting("DB_BACKEND", POSTGRES)).lower()
+    if name not in (POSTGRES, DUCKDB):
+        raise ValueError(f"Unknown DB_BACKEND {name!r}, expected {POSTGRES!r} or {DUCKDB!r}")
+    return name
+
+
+def duckdb_path():
+    return setting("DB_DUCKDB_PATH", DEFAULT_DUCKDB_PATH)
+
+
+def credentials():
+    """Returns the psycopg2 connection arguments of the configured Postgres database."""
+    return dict(host=setting("DB_HOST"), dbname=setting("DB_NAME"), user=setting("DB_USER"),
+                password=setting("DB_PASS"), port=setting("DB_PORT"))
+
+
+def database_identity():
+    """Names the configured database, e.g. postgres://host:5432/nowtrending or duckdb:///path/nowtrending.duckdb,
+    so data kept from one database is not mistaken for data of another."""
+    if backend() == DUCKDB:
+        return f"{DUCKDB}://{os.path.abspath(duckdb_path())}"
+    return f"{POSTGRES}://{setting('DB_HOST')}:{setting('DB_PORT')}/{setting('DB_NAME')}"
+
+
 def get_db_connection():
     """Establishes a database connection and returns the connection object."""
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASS,
-            port=DB_PORT
-        )
+        conn = psycopg2.connect(**credentials())
         logging.info("✅ Database connection established successfully.")  # This line won't show now
         return conn
     except psycopg2.DatabaseError as e:
@@ -39,8 +106,205 @@ def get_db_connection():
         return None
 
 
+class ConnectionPool(NamedTuple):
+    """The process-wide Postgres pool, with the semaphore its callers wait on for a free connection."""
+    connections: pool.ThreadedConnectionPool
+    slots: threading.BoundedSemaphore
+    size: int
+
+
+_pool = None            # the ConnectionPool, replaced as a whole so its parts always match
+_pool_lock = threading.Lock()
+_last_used = {}
+_pool_timeout = 30      # seconds to wait for a free connection (DB_POOL_TIMEOUT)
+_pool_ping_after = 30   # idle seconds before a connection is re-checked (DB_POOL_PING_AFTER)
+
+
+def _create_pool(minconn=None, maxconn=None, **connect_kwargs):
+    """Connects a new pool, sized and timed by the settings unless arguments are given."""
+    global _pool_timeout, _pool_ping_after
+    minconn = int(setting("DB_POOL_MIN", 1)) if minconn is None else minconn
+    maxconn = int(setting("DB_POOL_MAX", 10)) if maxconn is None else maxconn
+    _pool_timeout = float(setting("DB_POOL_TIMEOUT", 30))
+    _pool_ping_after = float(setting("DB_POOL_PING_AFTER", 30))
+    if not connect_kwargs:
+        connect_kwargs = credentials()
+    return ConnectionPool(pool.ThreadedConnectionPool(minconn, maxconn, **connect_kwargs),
+                          threading.BoundedSemaphore(maxconn), maxconn)
+
+
+def init_pool(minconn=None, maxconn=None, **connect_kwargs):
+    """Creates the process-wide connection pool, replacing any existing one.
+       Connects with the configured credentials unless connection arguments are given.
+       The pool sizes and timeouts are optional settings, DB_POOL_MIN, DB_POOL_MAX,
+       DB_POOL_TIMEOUT and DB_POOL_PING_AFTER.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.connections.closeall()
+        _last_used.clear()
+        _pool = _create_pool(minconn, maxconn, **connect_kwargs)
+    return _pool.connections
+
+
+def get_pool():
+    """Returns the process-wide ConnectionPool, creating it on first use.
+       Threads starting at once wait for the pool of the first one instead of replacing it.
+    """
+    global _pool
+    current = _pool
+    if current is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _create_pool()
+            current = _pool
+    return current
+
+
+def close_pool():
+    """Closes every connection of the pool, e.g. before the process exits."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.connections.closeall()
+            _pool = None
+        _last_used.clear()
+
+
+def _is_healthy(conn):
+    """Checks that a pooled connection is still usable, pinging it if it has been idle for a while."""
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < _pool_ping_after:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+@contextmanager
+def db_connection():
+    """Lends a connection of the configured backend and takes it back afterwards.
+       Uncommitted work is rolled back on return.
+    """
+    if backend() == DUCKDB:
+        with duckdb_backend.connection(duckdb_path()) as conn:
+            yield conn
+    else:
+        with pooled_connection() as conn:
+            yield conn
+
+
+@contextmanager
+def pooled_connection():
+    """Lends a connection from the process-wide Postgres pool and gives it back afterwards.
+
+    Waits up to DB_POOL_TIMEOUT seconds when all connections are in use. Broken
+    connections are replaced, and uncommitted work is rolled back on return.
+
+    Raises:
+        psycopg2.Error: If no healthy connection could be obtained.
+    """
+    current = get_pool()
+    db_pool, slots = current.connections, current.slots
+    if not slots.acquire(timeout=_pool_timeout):
+        raise pool.PoolError("Timed out waiting for a free database connection")
+
+    try:
+        conn = db_pool.getconn()
+        # After a server restart every idle connection is broken; once they are discarded, a new one is made
+        discarded = 0
+        while not _is_healthy(conn):
+            logging.warning("Discarding a broken pooled database connection.")
+            db_pool.putconn(conn, close=True)
+            discarded += 1
+            if discarded > current.size:
+                raise pool.PoolError("Could not get a healthy database connection")
+            conn = db_pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+
+    try:
+        yield conn
+    finally:
+        try:
+            if not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()  # Never hand out a connection in the middle of a transaction
+        except psycopg2.Error:
+            pass
+        _last_used[id(conn)] = time.monotonic()
+        db_pool.putconn(conn, close=bool(conn.closed))
+        slots.release()
+
+
+# Statements that differ between the backends. Each takes the cursor or connection lent by db_connection.
+
+def is_embedded(cursor):
+    """Checks whether a cursor or connection belongs to the embedded DuckDB backend."""
+    return isinstance(cursor, (duckdb_backend.Cursor, duckdb_backend.Connection))
+
+
+def read_frame(conn, sql, params=None):
+    """Runs a query and returns the result as a pandas dataframe."""
+    if is_embedded(conn):
+        return conn.read_frame(sql, params)
+    return pd.read_sql(sql, conn, params=params)
+
+
+def execute_values(cursor, sql, argslist, page_size=100, fetch=False):
+    """Runs a statement with a single VALUES %s once per page of rows, as psycopg2.extras.execute_values."""
+    if is_embedded(cursor):
+        return cursor.execute_values(sql, argslist, page_size=page_size, fetch=fetch)
+    return pg_execute_values(cursor, sql, argslist, page_size=page_size, fetch=fetch)
+
+
+def pg_array_literal(values):
+    """Formats a list of strings as a PostgreSQL array literal, e.g. {"a","b"}."""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'"{value}"' for value in escaped) + "}"
+
+
+def copy_rows(cursor, table, columns, rows, force_null=()):
+    """Bulk-loads rows into a table. On Postgres they are streamed with COPY as CSV, where
+       every value is quoted so empty strings stay '' and lists are written as arrays;
+       `force_null` lists the columns whose empty values are NULL.
+    """
+    if is_embedded(cursor):
+        return cursor.copy_rows(table, columns, rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    writer.writerows(
+        [pg_array_literal(value) if isinstance(value, list) else value for value in row] for row in rows
+    )
+    buffer.seek(0)
+
+    options = "FORMAT csv" + (f", FORCE_NULL ({', '.join(force_null)})" if force_null else "")
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH ({options});", buffer)
+
+
+def refresh_materialized_view(cursor, view, concurrently=True):
+    """Recomputes a materialized view. CONCURRENTLY keeps it readable while it is rebuilt,
+       which the embedded backend always does."""
+    if is_embedded(cursor):
+        return cursor.refresh_view(view)
+    cursor.execute(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{view};")
+
+
 def execute_schema():
     """Reads and executes the schema.sql file to set up database tables."""
+    if backend() == DUCKDB:
+        # The embedded database creates its schema when it is opened
+        with db_connection():
+            logging.info(f"✅ DuckDB schema ready in {duckdb_path()}.")
+        return True
+
     conn = get_db_connection()
     if conn is None:
         logging.error("Failed to connect to the database.")
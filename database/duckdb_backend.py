@@ -0,0 +1,205 @@
+"""Embedded DuckDB backend, selected with DB_BACKEND=duckdb.
+
+Keeps the student.* tables of database/schema_duckdb.sql in a local file, so a small deployment
+or a test run needs no Postgres server. Connections and cursors behave like psycopg2's for the
+calls the ingest and the dashboard make: %s and %(name)s placeholders, an implicit transaction
+ended by commit() or rollback(), and rowcount after an INSERT, UPDATE or DELETE.
+
+DuckDB runs inside the process and only one process can open a database file for writing,
+so the ingest runs from the dashboard (scripts/refresh_runner.py) or while it is stopped.
+"""
+import importlib.util
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_duckdb.sql")
+
+# psycopg2 placeholders and the escaped percent sign
+PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+# Statements whose result is the number of rows they changed
+CHANGES_ROWS = re.compile(r"\s*(INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+_databases = {}  # path -> the connection the database was opened with, once per process
+_databases_lock = threading.Lock()
+
+
+def translate(sql):
+    """Rewrites psycopg2 placeholders for DuckDB: %s -> ?, %(name)s -> $name and %% -> %."""
+    def replace(match):
+        if match.group(1):
+            return f"${match.group(1)}"
+        return "?" if match.group(0) == "%s" else "%"
+    return PLACEHOLDER.sub(replace, sql)
+
+
+def available():
+    """Whether the optional duckdb package is installed."""
+    return importlib.util.find_spec("duckdb") is not None
+
+
+def open_database(path):
+    """Opens a database file once per process, creating the schema if needed.
+    duckdb is imported here, so the Postgres backend does not pay for loading it."""
+    with _databases_lock:
+        if path not in _databases:
+            if not available():
+                raise RuntimeError("DB_BACKEND is duckdb, but the duckdb package is not installed.")
+            import duckdb
+            database = duckdb.connect(path)
+            with open(SCHEMA_PATH) as schema:
+                database.execute(schema.read())
+            _databases[path] = database
+        return _databases[path]
+
+
+def close_databases():
+    """Closes every database file opened by this process."""
+    with _databases_lock:
+        for database in _databases.values():
+            database.close()
+        _databases.clear()
+
+
+@contextmanager
+def connection(path):
+    """Lends a connection to a database file. Uncommitted work is rolled back afterwards.
+    Every connection has a DuckDB cursor of its own, so threads can use the database at once."""
+    conn = Connection(open_database(path).cursor())
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+class Connection:
+    """A DuckDB connection with the psycopg2 interface used by the ingest and the dashboard."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.closed = 0
+        self._in_transaction = False
+
+    def cursor(self):
+        return Cursor(self)
+
+    def begin(self):
+        # psycopg2 starts a transaction with the first statement, which commit() or rollback() ends
+        if not self._in_transaction:
+            self.raw.begin()
+            self._in_transaction = True
+
+    def commit(self):
+        if self._in_transaction:
+            self._in_transaction = False
+            self.raw.commit()
+
+    def rollback(self):
+        if self._in_transaction:
+            self._in_transaction = False
+            self.raw.rollback()
+
+    def close(self):
+        if not self.closed:
+            self.rollback()
+            self.raw.close()
+            self.closed = 1
+
+    def read_frame(self, sql, params=None):
+        """Runs a query and returns its result as a pandas dataframe, converted column by column."""
+        self.begin()
+        if params is None:
+            return self.raw.execute(sql).df()
+        return self.raw.execute(translate(sql), params).df()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+class Cursor:
+    """Runs statements on the DuckDB cursor of its connection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = -1
+        self.description = None
+
+    def execute(self, sql, params=None):
+        self.connection.begin()
+        raw = self.connection.raw
+        if params is None:
+            raw.execute(sql)
+        else:
+            raw.execute(translate(sql), params)
+
+        self.description = raw.description
+        self.rowcount = -1
+        # DuckDB answers a change with a single Count column, psycopg2 with rowcount
+        if CHANGES_ROWS.match(sql) and [column[0] for column in self.description or ()] == ["Count"]:
+            self.rowcount = raw.fetchone()[0]
+            self.description = None
+
+    def executemany(self, sql, rows):
+        self.connection.begin()
+        self.connection.raw.executemany(translate(sql), rows)
+        self.rowcount = -1
+
+    def execute_values(self, sql, rows, page_size=1000, fetch=False):
+        """Same as psycopg2.extras.execute_values: expands the VALUES %s of the statement into
+        a page of rows at a time, and returns the rows of every page when `fetch` is set."""
+        before, after = sql.split("%s", 1)
+        before, after = translate(before), translate(after)
+        result = [] if fetch else None
+        for start in range(0, len(rows), max(1, page_size)):
+            page = rows[start:start + page_size]
+            values = ", ".join("(" + ", ".join(["?"] * len(row)) + ")" for row in page)
+            self.connection.begin()
+            self.connection.raw.execute(before + values + after, [value for row in page for value in row])
+            if fetch:
+                result.extend(self.connection.raw.fetchall())
+        return result
+
+    def copy_rows(self, table, columns, rows):
+        """Bulk-loads rows, handing them to DuckDB as a dataframe instead of one statement per row."""
+        frame = pd.DataFrame.from_records(rows, columns=columns)
+        raw = self.connection.raw
+        self.connection.begin()
+        raw.register("copy_rows", frame)
+        try:
+            raw.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM copy_rows;")
+        finally:
+            raw.unregister("copy_rows")
+
+    def refresh_view(self, view):
+        """Recomputes a materialized view, kept as a table next to the view of its query.
+        Readers see the previous rows until the transaction is committed."""
+        self.execute(f"DELETE FROM {view};")
+        self.execute(f"INSERT INTO {view} SELECT * FROM {view}_query;")
+
+    def fetchone(self):
+        return self.connection.raw.fetchone()
+
+    def fetchall(self):
+        return self.connection.raw.fetchall()
+
+    def fetchmany(self, size=1):
+        return self.connection.raw.fetchmany(size)
+
+    def close(self):
+        pass  # The DuckDB cursor belongs to the connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -26,9 +26,62 @@ CREATE TABLE IF NOT EXISTS student.twitter_trend (
     related_terms TEXT[],  
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     location_id VARCHAR(255) NOT NULL,
+    popularity BIGINT,  -- meta_description parsed at ingest, e.g. '1.7M posts' -> 1700000
+    modified_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- last insert or update of the row
     CONSTRAINT unique_trend_per_location UNIQUE (trend_name, location_id)  -- ✅ Ensures uniqueness per location
 );
 
+-- Adds the popularity column to tables created before it existed
+-- Existing rows are filled by: python scripts/update_database.py --backfill-popularity
+ALTER TABLE student.twitter_trend ADD COLUMN IF NOT EXISTS popularity BIGINT;
+
+-- The dashboard snapshots sync on modified_at, so every statement changing a row in place also sets it.
+-- last_updated cannot serve, it is the fetch time of the trend and orders the Latest Trends.
+ALTER TABLE student.twitter_trend ADD COLUMN IF NOT EXISTS modified_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+CREATE INDEX IF NOT EXISTS twitter_trend_modified_at_idx ON student.twitter_trend (modified_at);
+
+-- Serves the Top-10 panel with an ORDER BY popularity ... LIMIT
+CREATE INDEX IF NOT EXISTS twitter_trend_popularity_idx ON student.twitter_trend (popularity DESC NULLS LAST);
+
+-- Staging table for bulk loading trends with COPY before merging them into twitter_trend
+-- UNLOGGED skips the write-ahead log, its rows only live for the duration of a load
+CREATE UNLOGGED TABLE IF NOT EXISTS student.twitter_trend_staging (
+    trend_name VARCHAR(255) NOT NULL,
+    position INT NOT NULL,
+    meta_description TEXT,
+    domain_context VARCHAR(255),
+    url TEXT,
+    impression_id VARCHAR(255),
+    related_terms TEXT[],
+    location_id VARCHAR(255) NOT NULL,
+    popularity BIGINT
+);
+
+ALTER TABLE student.twitter_trend_staging ADD COLUMN IF NOT EXISTS popularity BIGINT;
+
+-- Append-only history of the trends, one row per trend, location and fetch, so popularity can be followed over time
+-- Partitioned by month: the ingest creates the partition of the current month before loading into it
+CREATE TABLE IF NOT EXISTS student.twitter_trend_observation (
+    trend_name VARCHAR(255) NOT NULL,
+    location_id VARCHAR(255) NOT NULL,
+    observed_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP,
+    position INT,
+    meta_description TEXT,
+    popularity BIGINT
+) PARTITION BY RANGE (observed_at);
+
+-- Rows are appended in time order, so a BRIN index maps time ranges to table blocks at a tiny size
+CREATE INDEX IF NOT EXISTS twitter_trend_observation_observed_at_brin
+    ON student.twitter_trend_observation USING BRIN (observed_at);
+
+-- Follows a single trend through time
+CREATE INDEX IF NOT EXISTS twitter_trend_observation_trend_idx
+    ON student.twitter_trend_observation (trend_name, observed_at);
+
+-- Finds the newest observation, the version of the Trend Growth chart, from the end of each partition
+CREATE INDEX IF NOT EXISTS twitter_trend_observation_observed_at_idx
+    ON student.twitter_trend_observation (observed_at);
+
 -- A table to map the trends to the locations
 CREATE TABLE IF NOT EXISTS student.twitter_locations (
     location_id VARCHAR(255) PRIMARY KEY,  
@@ -47,10 +100,150 @@ CREATE TABLE IF NOT EXISTS student.google_locations (
     scrapedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
--- Separate table for keywords
+-- Separate table for keywords, one row per keyword and country
+-- A refresh upserts the keywords it sees: last_updated is the last time a keyword was seen,
+-- first_seen the first time, and seen_count the number of refreshes that saw it
 CREATE TABLE IF NOT EXISTS student.google_trend (
     id SERIAL PRIMARY KEY,
     google_location_id INT REFERENCES student.google_locations(id) ON DELETE CASCADE,
     keyword TEXT NOT NULL,
-    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    seen_count INT NOT NULL DEFAULT 1,
+    modified_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP  -- last insert or update of the row
 );
+
+-- Adds the observation counters to tables created before they existed.
+-- first_seen gets its default afterwards, so the existing rows are not all stamped with the time of the migration.
+ALTER TABLE student.google_trend ADD COLUMN IF NOT EXISTS first_seen TIMESTAMP;
+ALTER TABLE student.google_trend ADD COLUMN IF NOT EXISTS seen_count INT NOT NULL DEFAULT 1;
+ALTER TABLE student.google_trend ADD COLUMN IF NOT EXISTS modified_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+CREATE INDEX IF NOT EXISTS google_trend_modified_at_idx ON student.google_trend (modified_at);
+
+-- Compacts the keywords appended by every refresh before they were unique, and the keywords stored before they
+-- were lower case: the oldest row of every keyword and country, in any case, is kept with the counters of all its
+-- copies and lower-cased, then the unique index is built
+DO $$
+BEGIN
+    IF to_regclass('student.google_trend_keyword_idx') IS NULL
+       OR EXISTS (SELECT 1 FROM student.google_trend WHERE keyword <> lower(keyword)) THEN
+        UPDATE student.google_trend g
+        SET first_seen = d.first_seen, last_updated = d.last_seen, seen_count = d.seen_count,
+            modified_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT MIN(id) AS id, MIN(COALESCE(first_seen, last_updated)) AS first_seen,
+                   MAX(last_updated) AS last_seen, SUM(seen_count) AS seen_count
+            FROM student.google_trend
+            WHERE google_location_id IS NOT NULL
+            GROUP BY google_location_id, lower(keyword)
+        ) d
+        WHERE g.id = d.id;
+
+        DELETE FROM student.google_trend g
+        USING (
+            SELECT id, row_number() OVER (PARTITION BY google_location_id, lower(keyword) ORDER BY id) AS copy
+            FROM student.google_trend
+            WHERE google_location_id IS NOT NULL
+        ) d
+        WHERE g.id = d.id AND d.copy > 1;
+
+        UPDATE student.google_trend SET keyword = lower(keyword), modified_at = CURRENT_TIMESTAMP
+        WHERE keyword <> lower(keyword);
+        UPDATE student.google_trend SET first_seen = last_updated WHERE first_seen IS NULL;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS google_trend_keyword_idx ON student.google_trend (google_location_id, keyword);
+    END IF;
+END $$;
+
+ALTER TABLE student.google_trend ALTER COLUMN first_seen SET DEFAULT CURRENT_TIMESTAMP;
+
+
+-- Last successful fetch of every source, e.g. 'twitter_locations' or 'twitter_trends:<location_id>'
+-- A refresh skips the sources that are still fresh
+CREATE TABLE IF NOT EXISTS student.ingest_watermark (
+    source VARCHAR(255) PRIMARY KEY,
+    last_success TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP
+);
+
+
+-- Precomputed rankings of the dashboard panels, refreshed at the end of every ingest (update_database.main)
+-- Every filter selection is a cell, '*' standing for all countries or all categories,
+-- so a panel reads a few indexed rows instead of ranking the trend table on every render.
+
+-- The 10 most popular distinct trends of every country x category cell ("The Hottest Twitter Trends")
+CREATE MATERIALIZED VIEW IF NOT EXISTS student.top_trend_rank AS
+WITH trends AS (
+    SELECT t.trend_name, t.meta_description, regexp_replace(t.domain_context, ' . Trending$', '') AS domain_context,
+           t.url, lower(l.country_name) AS country, t.popularity
+    FROM student.twitter_trend t
+    JOIN student.twitter_locations l ON l.location_id = t.location_id
+    WHERE t.popularity IS NOT NULL
+), best AS (
+    -- The most popular row of every trend per country and category
+    SELECT DISTINCT ON (country, domain_context, trend_name) *
+    FROM trends
+    ORDER BY country, domain_context, trend_name, popularity DESC
+), top AS (
+    -- The top 10 of every country x category. A top 10 over several countries or categories
+    -- only holds trends of their own top 10s, so the wider cells are ranked from these rows alone.
+    SELECT * FROM (
+        SELECT best.*, row_number() OVER (PARTITION BY country, domain_context
+                                          ORDER BY popularity DESC, trend_name) AS rank
+        FROM best
+    ) ranked_best
+    WHERE rank <= 10
+), cells AS (
+    SELECT DISTINCT ON (cell.country, cell.category, t.trend_name)
+           cell.country AS cell_country, cell.category AS cell_category,
+           t.trend_name, t.meta_description, t.domain_context, t.url, t.country, t.popularity
+    FROM top t
+    CROSS JOIN LATERAL (VALUES (t.country, t.domain_context), (t.country, '*'), ('*', t.domain_context), ('*', '*'))
+        AS cell(country, category)
+    ORDER BY cell.country, cell.category, t.trend_name, t.popularity DESC, t.country
+), ranked AS (
+    SELECT cells.*, row_number() OVER (PARTITION BY cell_country, cell_category
+                                       ORDER BY popularity DESC, trend_name) AS rank
+    FROM cells
+)
+SELECT cell_country, cell_category, rank, trend_name AS trend, meta_description, domain_context, url, country, popularity
+FROM ranked
+WHERE rank <= 10;
+
+-- REFRESH ... CONCURRENTLY needs a unique index, it also serves the lookups of a cell
+CREATE UNIQUE INDEX IF NOT EXISTS top_trend_rank_cell_idx
+    ON student.top_trend_rank (cell_country, cell_category, rank);
+
+-- The 5 most recent distinct trends of every category, and of all categories ("The Latest Twitter Trends")
+CREATE MATERIALIZED VIEW IF NOT EXISTS student.latest_trend_rank AS
+WITH trends AS (
+    SELECT trend_name, regexp_replace(domain_context, ' . Trending$', '') AS domain_context, url, last_updated
+    FROM student.twitter_trend
+    WHERE domain_context IS NOT NULL AND domain_context <> ''
+), latest AS (
+    -- The most recent row of every trend per category
+    SELECT DISTINCT ON (domain_context, trend_name) *
+    FROM trends
+    ORDER BY domain_context, trend_name, last_updated DESC
+), top AS (
+    -- The 5 most recent of every category, which also hold the 5 most recent of all categories
+    SELECT * FROM (
+        SELECT latest.*, row_number() OVER (PARTITION BY domain_context ORDER BY last_updated DESC, trend_name) AS rank
+        FROM latest
+    ) ranked_latest
+    WHERE rank <= 5
+), cells AS (
+    SELECT DISTINCT ON (cell.category, t.trend_name) cell.category AS cell_category,
+           t.trend_name, t.domain_context, t.url, t.last_updated
+    FROM top t
+    CROSS JOIN LATERAL (VALUES (t.domain_context), ('*')) AS cell(category)
+    ORDER BY cell.category, t.trend_name, t.last_updated DESC
+), ranked AS (
+    SELECT cells.*, row_number() OVER (PARTITION BY cell_category ORDER BY last_updated DESC, trend_name) AS rank
+    FROM cells
+)
+SELECT cell_category, rank, trend_name AS trend, domain_context, url, last_updated
+FROM ranked
+WHERE rank <= 5;
+
+CREATE UNIQUE INDEX IF NOT EXISTS latest_trend_rank_cell_idx
+    ON student.latest_trend_rank (cell_category, rank);
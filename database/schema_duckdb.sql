@@ -0,0 +1,213 @@
+-- The tables of database/schema.sql for the embedded DuckDB backend (DB_BACKEND=duckdb).
+-- Same tables, columns and constraints, without the Postgres storage features DuckDB has no use for:
+-- ids come from sequences instead of SERIAL, and there are no partitions, BRIN or non-unique indexes,
+-- DuckDB scans only the columns a query reads and skips row groups by their min/max values.
+-- Run on every start of the backend (database/duckdb_backend.py), so every statement is idempotent.
+
+CREATE SCHEMA IF NOT EXISTS student;
+
+-- Postgres' initcap: the first letter of every word in upper case and the rest in lower case
+CREATE OR REPLACE MACRO initcap(s) AS
+    array_to_string(list_transform(regexp_extract_all(lower(s), '[\pL\pN]+|[^\pL\pN]+'), w -> upper(w[1]) || w[2:]), '');
+
+
+CREATE SEQUENCE IF NOT EXISTS student.twitter_hashflags_id_seq;
+
+CREATE TABLE IF NOT EXISTS student.twitter_hashflags (
+    id INTEGER PRIMARY KEY DEFAULT nextval('student.twitter_hashflags_id_seq'),
+    hashtag VARCHAR NOT NULL UNIQUE,
+    starting_timestamp_ms TIMESTAMP NOT NULL,
+    ending_timestamp_ms TIMESTAMP NOT NULL,
+    asset_url TEXT,
+    is_hashfetti_enabled BOOLEAN,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+
+CREATE SEQUENCE IF NOT EXISTS student.twitter_trend_id_seq;
+
+CREATE TABLE IF NOT EXISTS student.twitter_trend (
+    id INTEGER PRIMARY KEY DEFAULT nextval('student.twitter_trend_id_seq'),
+    trend_name VARCHAR NOT NULL,
+    position INT NOT NULL,
+    meta_description TEXT,
+    domain_context VARCHAR,
+    url TEXT,
+    impression_id VARCHAR,
+    related_terms TEXT[],
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    location_id VARCHAR NOT NULL,
+    popularity BIGINT,  -- meta_description parsed at ingest, e.g. '1.7M posts' -> 1700000
+    modified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- last insert or update of the row
+    CONSTRAINT unique_trend_per_location UNIQUE (trend_name, location_id)
+);
+
+ALTER TABLE student.twitter_trend ADD COLUMN IF NOT EXISTS modified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Staging table for bulk loading trends before merging them into twitter_trend
+CREATE TABLE IF NOT EXISTS student.twitter_trend_staging (
+    trend_name VARCHAR NOT NULL,
+    position INT NOT NULL,
+    meta_description TEXT,
+    domain_context VARCHAR,
+    url TEXT,
+    impression_id VARCHAR,
+    related_terms TEXT[],
+    location_id VARCHAR NOT NULL,
+    popularity BIGINT
+);
+
+-- Append-only history of the trends, one row per trend, location and fetch
+CREATE TABLE IF NOT EXISTS student.twitter_trend_observation (
+    trend_name VARCHAR NOT NULL,
+    location_id VARCHAR NOT NULL,
+    observed_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP,
+    position INT,
+    meta_description TEXT,
+    popularity BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS student.twitter_locations (
+    location_id VARCHAR PRIMARY KEY,
+    country_name VARCHAR NOT NULL
+);
+
+
+CREATE SEQUENCE IF NOT EXISTS student.google_locations_id_seq;
+
+CREATE TABLE IF NOT EXISTS student.google_locations (
+    id INTEGER PRIMARY KEY DEFAULT nextval('student.google_locations_id_seq'),
+    success BOOLEAN NOT NULL DEFAULT TRUE,
+    message TEXT DEFAULT 'OK',
+    country TEXT NOT NULL,
+    lastUpdate TIMESTAMP,
+    scrapedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE SEQUENCE IF NOT EXISTS student.google_trend_id_seq;
+
+-- DuckDB has no ON DELETE CASCADE, a location is only deleted after its keywords
+CREATE TABLE IF NOT EXISTS student.google_trend (
+    id INTEGER PRIMARY KEY DEFAULT nextval('student.google_trend_id_seq'),
+    google_location_id INT REFERENCES student.google_locations(id),
+    keyword TEXT NOT NULL,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    seen_count INTEGER NOT NULL DEFAULT 1,
+    modified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP  -- last insert or update of the row
+);
+
+-- The keyword compaction of database/schema.sql. DuckDB has no DO blocks, so it runs on every start
+-- and only touches the keywords that still have copies, in any case, are not lower case or have no first_seen.
+ALTER TABLE student.google_trend ADD COLUMN IF NOT EXISTS first_seen TIMESTAMP;
+ALTER TABLE student.google_trend ADD COLUMN IF NOT EXISTS seen_count INTEGER DEFAULT 1;
+ALTER TABLE student.google_trend ADD COLUMN IF NOT EXISTS modified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+UPDATE student.google_trend AS g
+SET first_seen = d.first_seen, last_updated = d.last_seen, seen_count = d.seen_count,
+    modified_at = CURRENT_TIMESTAMP
+FROM (
+    SELECT MIN(id) AS id, MIN(COALESCE(first_seen, last_updated)) AS first_seen,
+           MAX(last_updated) AS last_seen, SUM(seen_count) AS seen_count
+    FROM student.google_trend
+    WHERE google_location_id IS NOT NULL
+    GROUP BY google_location_id, lower(keyword)
+    HAVING COUNT(*) > 1
+) d
+WHERE g.id = d.id;
+
+DELETE FROM student.google_trend
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (PARTITION BY google_location_id, lower(keyword) ORDER BY id) AS copy
+        FROM student.google_trend
+        WHERE google_location_id IS NOT NULL
+    ) d
+    WHERE copy > 1
+);
+
+UPDATE student.google_trend SET keyword = lower(keyword), modified_at = CURRENT_TIMESTAMP
+WHERE keyword <> lower(keyword);
+UPDATE student.google_trend SET first_seen = last_updated WHERE first_seen IS NULL;
+
+ALTER TABLE student.google_trend ALTER COLUMN first_seen SET DEFAULT CURRENT_TIMESTAMP;
+CREATE UNIQUE INDEX IF NOT EXISTS google_trend_keyword_idx ON student.google_trend (google_location_id, keyword);
+
+
+CREATE TABLE IF NOT EXISTS student.ingest_watermark (
+    source VARCHAR PRIMARY KEY,
+    last_success TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP
+);
+
+
+-- The rankings of the dashboard panels. DuckDB has no materialized views, so every ranking is
+-- a table, filled from the view of its query (<name>_query) by refresh_materialized_view.
+-- The queries are the ones of database/schema.sql.
+
+CREATE OR REPLACE VIEW student.top_trend_rank_query AS
+WITH trends AS (
+    SELECT t.trend_name, t.meta_description, regexp_replace(t.domain_context, ' . Trending$', '') AS domain_context,
+           t.url, lower(l.country_name) AS country, t.popularity
+    FROM student.twitter_trend t
+    JOIN student.twitter_locations l ON l.location_id = t.location_id
+    WHERE t.popularity IS NOT NULL
+), best AS (
+    SELECT DISTINCT ON (country, domain_context, trend_name) *
+    FROM trends
+    ORDER BY country, domain_context, trend_name, popularity DESC
+), top AS (
+    SELECT * FROM (
+        SELECT best.*, row_number() OVER (PARTITION BY country, domain_context
+                                          ORDER BY popularity DESC, trend_name) AS rank
+        FROM best
+    ) ranked_best
+    WHERE rank <= 10
+), cells AS (
+    SELECT DISTINCT ON (cell.country, cell.category, t.trend_name)
+           cell.country AS cell_country, cell.category AS cell_category,
+           t.trend_name, t.meta_description, t.domain_context, t.url, t.country, t.popularity
+    FROM top t
+    CROSS JOIN LATERAL (VALUES (t.country, t.domain_context), (t.country, '*'), ('*', t.domain_context), ('*', '*'))
+        AS cell(country, category)
+    ORDER BY cell.country, cell.category, t.trend_name, t.popularity DESC, t.country
+), ranked AS (
+    SELECT cells.*, row_number() OVER (PARTITION BY cell_country, cell_category
+                                       ORDER BY popularity DESC, trend_name) AS rank
+    FROM cells
+)
+SELECT cell_country, cell_category, rank, trend_name AS trend, meta_description, domain_context, url, country, popularity
+FROM ranked
+WHERE rank <= 10;
+
+CREATE TABLE IF NOT EXISTS student.top_trend_rank AS SELECT * FROM student.top_trend_rank_query;
+
+CREATE OR REPLACE VIEW student.latest_trend_rank_query AS
+WITH trends AS (
+    SELECT trend_name, regexp_replace(domain_context, ' . Trending$', '') AS domain_context, url, last_updated
+    FROM student.twitter_trend
+    WHERE domain_context IS NOT NULL AND domain_context <> ''
+), latest AS (
+    SELECT DISTINCT ON (domain_context, trend_name) *
+    FROM trends
+    ORDER BY domain_context, trend_name, last_updated DESC
+), top AS (
+    SELECT * FROM (
+        SELECT latest.*, row_number() OVER (PARTITION BY domain_context ORDER BY last_updated DESC, trend_name) AS rank
+        FROM latest
+    ) ranked_latest
+    WHERE rank <= 5
+), cells AS (
+    SELECT DISTINCT ON (cell.category, t.trend_name) cell.category AS cell_category,
+           t.trend_name, t.domain_context, t.url, t.last_updated
+    FROM top t
+    CROSS JOIN LATERAL (VALUES (t.domain_context), ('*')) AS cell(category)
+    ORDER BY cell.category, t.trend_name, t.last_updated DESC
+), ranked AS (
+    SELECT cells.*, row_number() OVER (PARTITION BY cell_category ORDER BY last_updated DESC, trend_name) AS rank
+    FROM cells
+)
+SELECT cell_category, rank, trend_name AS trend, domain_context, url, last_updated
+FROM ranked
+WHERE rank <= 5;
+
+CREATE TABLE IF NOT EXISTS student.latest_trend_rank AS SELECT * FROM student.latest_trend_rank_query;
@@ -0,0 +1,59 @@
+import io
+import os
+import sys
+
+import streamlit as st
+from matplotlib.figure import Figure
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from frontend.explorations import load_growth_series, CACHE_TTL_SECONDS
+from frontend.profiler import profiled
+
+# Size of the charts in inches, and their resolution
+CHART_SIZE = (10, 6)
+CHART_DPI = 100
+# Rendered charts kept per process. A chart is a PNG of about 50 KB, so this bounds the cache to a few MB.
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "64"))
+
+
+def draw_growth_chart(growth, trends, size=CHART_SIZE, dpi=CHART_DPI):
+    '''Draws the popularity over time of some trends of a GrowthSeries and returns it as PNG bytes.
+
+    The figure is built on its own instead of through pyplot, which keeps every figure it creates
+    until it is closed. Nothing refers to this one after the function returns, so it is freed.'''
+    figure = Figure(figsize=size, dpi=dpi)
+    axes = figure.subplots()
+    for trend in trends:
+        trend_data = growth.series(trend)
+        line, = axes.plot(trend_data['last_updated'], trend_data['popularity'], marker='o', linestyle='-',
+                          label=trend)
+
+        # Optionally highlight max and min points
+        max_popularity_idx = trend_data['popularity'].idxmax()
+        min_popularity_idx = trend_data['popularity'].idxmin()
+        axes.scatter(trend_data['last_updated'][[max_popularity_idx, min_popularity_idx]],
+                     trend_data['popularity'][[max_popularity_idx, min_popularity_idx]],
+                     color=line.get_color(), zorder=5)
+
+    if len(trends) == 1:
+        axes.set_title(f"Popularity Over Time for '{trends[0]}'")
+    else:
+        axes.set_title("Popularity Over Time")
+    axes.set_xlabel('Date')
+    axes.set_ylabel('Popularity')
+    axes.tick_params(axis='x', labelrotation=45)
+    if trends:
+        axes.legend()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+
+@profiled
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=CHART_CACHE_MAX_ENTRIES, show_spinner=False)
+def growth_chart(trends, version, size=CHART_SIZE, dpi=CHART_DPI):
+    '''Returns the Trend Growth chart of a tuple of trends as PNG bytes, rendered once per
+    (trends, data version, size) and shared by every session. Like the series, it expires with the
+    explorations cache, since the observations window moves with time.'''
+    return draw_growth_chart(load_growth_series(version), trends, size, dpi)
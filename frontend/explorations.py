@@ -1,110 +1,165 @@
 import pandas as pd
 import numpy as np
+import streamlit as st
 import sys
 import os
-import re
+from typing import NamedTuple
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from frontend.transformation import transform_twitter_trend, transform_twitter_locations, transform_google_locations, transform_google_trend
+from frontend.profiler import profiled
+from frontend.transformation import transform_google_locations, transform_google_trend, transform_top_trends, transform_trend_observations, table_version, expire_snapshots, transform_top_trend_rank, transform_top_trend_cells, transform_latest_trends, transform_latest_trend_categories, TOP_TREND_RANK_DEPTH
 
-import re
-import numpy as np
+# Results are shared by every dashboard session until they expire or the data is refreshed.
+# Each function keeps at most CACHE_MAX_ENTRIES results, which bounds the memory used.
+CACHE_TTL_SECONDS = int(os.getenv("EXPLORATIONS_CACHE_TTL", "900"))
+CACHE_MAX_ENTRIES = 32
 
-def extract_numeric(meta_desc):
-    # Remove commas in case there are any (e.g., "9,969")
-    meta_desc = meta_desc.replace(',', '')
-    
-    # Use regex to capture the numeric part (including decimals) and an optional suffix (K or M)
-    match = re.search(r'(\d+(?:\.\d+)?)\s*([KM])?', meta_desc, re.IGNORECASE)
-    if match:
-        # Convert the captured numeric part to a float
-        try:
-            number = float(match.group(1))
-        except ValueError:
-            return np.nan
-        
-        suffix = match.group(2)
-        if suffix:
-            suffix = suffix.upper()
-            if suffix == 'K':  # Thousands
-                number *= 1000
-            elif suffix == 'M':  # Millions
-                number *= 1000000
-        return number
-    else:
-        return np.nan
-
-def twitter_data():
-    # Assuming transform_twitter_trend() gives you a DataFrame
-    df = transform_twitter_trend()
-    df_loc = transform_twitter_locations()
-    
-    # Drop duplicates based on the 'trend' column
-    df = df.drop_duplicates(subset=['trend'])
-
-    # Remove rows where 'meta_description' is missing or empty
-    df = df[df['meta_description'].notna() & (df['meta_description'] != '')]
-
-    # Merge the DataFrames on 'location_id' using an inner join
-    merged_df = pd.merge(df_loc, df, on='location_id', how='inner')
-    
-    # Create a new column 'meta_description_numeric' for sorting by extracting the numeric value
-    merged_df['meta_description_numeric'] = merged_df['meta_description'].apply(extract_numeric)
-    
-    # Sort by the numeric part of the 'meta_description' in descending order
-    df_sorted = merged_df.sort_values('meta_description_numeric', ascending=False)
-
-    # Select only the columns you want to display
-    df_sorted = df_sorted[['trend', 'meta_description', 'domain_context', 'url', 'country']]
-    df_sorted.rename(columns={'trend': 'Trend', 
-                              'meta_description': 'Popularity', 
-                              'url': 'URL'}, inplace=True)
-    
-    # Output the sorted DataFrame (top 10 rows, if that's your intent)
-    return df_sorted
+# How far back the Trend Growth chart looks
+TREND_GROWTH_WINDOW_DAYS = int(os.getenv("TREND_GROWTH_WINDOW_DAYS", "7"))
+# Evenly spaced points every trend of the Trend Growth chart is resampled onto
+TREND_GROWTH_POINTS = 24
 
+cache_result = st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
 
-def top5_per_context():
-    # First, ensure your DataFrame is sorted by last_updated in descending order
-    df = transform_twitter_trend()
-    df_sorted = df[['trend', 'domain_context', 'last_updated', 'url']]
-    df_sorted = df_sorted.sort_values('last_updated', ascending=False)
-    df_sorted = df_sorted[df_sorted['domain_context'].notna() & (df_sorted['domain_context'] != '')]
-    
-    # Then, for each domain_context group, take the first 5 rows
-    top5_per_context = df_sorted.groupby('domain_context').head(5).reset_index(drop=True)
-    
-    # Rename columns for clarity
-    top5_per_context.rename(columns={'trend':'Trend', 'domain_context':'Category'}, inplace=True)
-    
-    # Drop duplicate trends only (if that's what you intend)
-    top5_per_context.drop_duplicates(subset=['Trend'], inplace=True)
-
-    return top5_per_context
-
-
-def trend_growth():
-    df = transform_twitter_trend()
-    
-    # Count occurrences of each trend
-    trend_counts = df['trend'].value_counts()
-    
-    # Filter trends that appear more than 3 times
-    valid_trends = trend_counts[trend_counts > 3].index
-    
-    # Filter the dataframe to keep only valid trends
-    df_filtered = df[df['trend'].isin(valid_trends)]
-    
-    # Select relevant columns
-    df_sorted = df_filtered[['trend', 'meta_description', 'last_updated']]
-    
-    return df_sorted
+# Number of refreshes done by this process, part of the observations version
+_refresh_count = 0
+
+
+class GrowthSeries(NamedTuple):
+    '''The popularity of every trend of the Trend Growth chart resampled onto evenly spaced times,
+    computed once per observations version. Row i of times and popularity belongs to trends[i].'''
+    version: tuple
+    trends: list
+    times: np.ndarray       # (trends, points) datetime64[ns]
+    popularity: np.ndarray  # (trends, points) float
+    rows: dict              # trend -> row
+
+    def series(self, trend):
+        '''Returns the resampled series of a trend as a dataframe of last_updated and popularity.'''
+        row = self.rows[trend]
+        return pd.DataFrame({'last_updated': self.times[row], 'popularity': self.popularity[row]})
+
+
+@profiled
+@cache_result
+def top_trend_filters():
+    '''Returns the country and domain_context pairs of the ranked trends, which are the options of the Top-10 filters.'''
+    return transform_top_trend_cells()
+
+
+@profiled
+@cache_result
+def top_trends(countries=None, categories=None, limit=10):
+    '''Returns the `limit` most popular trends, optionally filtered by country (lower case) and category.
+    The ranking is precomputed by the top_trend_rank view, or an indexed ORDER BY ... LIMIT for longer lists.'''
+    df_unique = None
+    if limit <= TOP_TREND_RANK_DEPTH:
+        # The best trends of a selection are among the best trends of each selected cell
+        df = transform_top_trend_rank(countries, categories)
+        if df is not None:
+            df_unique = df.drop_duplicates(subset=['trend'])
+
+    if df_unique is None:
+        # A trend can be popular in several countries, so read a few extra rows to fill the table with distinct trends
+        fetch = limit * 3
+        while True:
+            df = transform_top_trends(countries, categories, limit=fetch)
+            df_unique = df.drop_duplicates(subset=['trend'])
+            if len(df_unique) >= limit or len(df) < fetch:
+                break
+            fetch *= 4
+
+    df_top = df_unique.head(limit)[['trend', 'meta_description', 'domain_context', 'url', 'country']]
+    return df_top.rename(columns={'trend': 'Trend', 'meta_description': 'Popularity', 'url': 'URL'})
+
+
+@profiled
+@cache_result
+def latest_trend_categories():
+    '''Returns the categories of the Latest Trends filter, sorted.'''
+    return transform_latest_trend_categories()['category'].tolist()
+
+
+@profiled
+@cache_result
+def latest_trends(category=None):
+    '''Returns the 5 most recent distinct trends of a category, or of all categories, as ranked by latest_trend_rank.'''
+    df = transform_latest_trends(category)
+    return df.rename(columns={'trend': 'Trend', 'domain_context': 'Category'})
 
+
+def resample_growth(df, points=TREND_GROWTH_POINTS):
+    '''Resamples the popularity of every trend onto `points` evenly spaced times between its first and last
+    observation, interpolating linearly and counting missing popularity as 0.
+
+    All the trends are interpolated by a single np.interp call: each trend's times are scaled to [0, 1]
+    and shifted by twice its row number, so the trends follow each other on one increasing axis.
+
+    Returns:
+        tuple: The trends, sorted, and their resampled times and popularity, one row per trend.
+    '''
+    df = df.sort_values(['trend', 'last_updated'])
+    codes, trends = pd.factorize(df['trend'])  # In sorted order, since the rows are
+    times = pd.to_datetime(df['last_updated']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    popularity = pd.to_numeric(df['popularity'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    if not len(trends):
+        return [], np.empty((0, points), dtype='datetime64[ns]'), np.empty((0, points))
+
+    first = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    last = np.r_[first[1:] - 1, len(codes) - 1]
+    start, span = times[first], times[last] - times[first]
+    scale = np.where(span > 0, span, 1).astype(float)
+
+    axis = 2.0 * codes + (times - start[codes]) / scale[codes]
+    fractions = np.linspace(0.0, 1.0, points)
+    # A trend observed at a single time stays on its only point
+    targets = 2.0 * np.arange(len(trends))[:, None] + np.where(span > 0, 1.0, 0.0)[:, None] * fractions
+    resampled = np.interp(targets.ravel(), axis, popularity).reshape(len(trends), points)
+    resampled_times = (start[:, None] + np.rint(span[:, None] * fractions).astype(np.int64)).astype('datetime64[ns]')
+    return list(trends), resampled_times, resampled
+
+
+@profiled
+@st.cache_resource(ttl=CACHE_TTL_SECONDS, max_entries=2, show_spinner=False)
+def load_growth_series(version):
+    df = transform_trend_observations(TREND_GROWTH_WINDOW_DAYS)
+    if df is None:
+        # Raising keeps the failure out of the cache
+        raise RuntimeError("Could not load the trend observations.")
+    trends, times, popularity = resample_growth(df)
+    return GrowthSeries(version, trends, times, popularity, {trend: row for row, trend in enumerate(trends)})
+
+
+def observations_version():
+    '''Identifies the current contents of twitter_trend_observation: its newest observation time plus the refreshes
+    seen by this process. Every ingest run stamps a new time, whichever process loaded it.'''
+    return (table_version("student.twitter_trend_observation", "observed_at"), _refresh_count)
+
+
+@profiled
+def growth_series():
+    '''Returns the resampled Trend Growth series of the current observations, computing them if needed.
+    The observations window moves with time, so they are also recomputed after CACHE_TTL_SECONDS.'''
+    return load_growth_series(observations_version())
+
+
+@profiled
+@cache_result
 def google_loc():
     df_loc = transform_google_locations()
-    df_trend = transform_google_trend()
+    df_trend = transform_google_trend(columns=['google_location_id', 'trend', 'last_updated'])
     df_loc.rename(columns={'id' :'google_location_id', 'country':'Country'},inplace=True)
     df_merged = pd.merge(df_loc, df_trend, on='google_location_id', how='inner')
     df_merged.rename(columns={'trend' :'Trend'}, inplace=True)
     df_sorted = df_merged[['Trend', 'Country', 'last_updated']]
-    return df_sorted
\ No newline at end of file
+    return df_sorted
+
+
+def clear_cache():
+    """Drops the cached results so the next render reads the refreshed database."""
+    global _refresh_count
+    _refresh_count += 1
+    expire_snapshots()
+    for cached_function in (top_trend_filters, top_trends, latest_trend_categories, latest_trends,
+                            google_loc):
+        cached_function.clear()
@@ -0,0 +1,50 @@
+import re
+import numpy as np
+import pandas as pd
+
+# A number with an optional decimal part and an optional K or M suffix, e.g. "1.7M posts" or "997K posts".
+# Commas are removed first ("9,969 posts"). The suffix must end the word, so "5 Mentions" is 5, not 5 million.
+POPULARITY_PATTERN = r'(\d+(?:\.\d+)?)\s*(?:([KkMm])(?![A-Za-z]))?'
+MULTIPLIERS = {'K': 1_000.0, 'M': 1_000_000.0}
+
+_popularity_regex = re.compile(POPULARITY_PATTERN)
+
+
+def parse_popularity(value):
+    """
+    Convert a popularity string with 'K' or 'M' suffixes to a numeric value.
+    e.g. '1.7M posts' becomes 1700000.0 and '997K posts' becomes 997000.0.
+    Returns NaN when the value holds no number.
+    """
+    if not isinstance(value, str):
+        return np.nan
+    match = _popularity_regex.search(value.replace(',', ''))
+    if not match:
+        return np.nan
+    number = float(match.group(1))
+    suffix = match.group(2)
+    return number * MULTIPLIERS[suffix.upper()] if suffix else number
+
+
+def parse_popularity_series(values):
+    """
+    Vectorized parse_popularity for a whole column.
+    Popularity strings repeat a lot, so the column is factorized and only its distinct
+    values are parsed, with pandas string extraction, before being spread back with NumPy.
+    Returns:
+        pd.Series: Float values aligned with the input, NaN where no number was found.
+    """
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+
+    uniques = pd.Series(uniques, dtype=object)
+    uniques = uniques.where(uniques.map(type) == str)  # Non-string values have no popularity
+    parts = uniques.str.replace(',', '', regex=False).str.extract(POPULARITY_PATTERN)
+    numbers = pd.to_numeric(parts[0], errors='coerce').to_numpy(dtype=float)
+    multipliers = parts[1].str.upper().map(MULTIPLIERS).to_numpy(dtype=float, na_value=1.0)
+    parsed = numbers * multipliers
+
+    result = np.full(len(codes), np.nan)
+    found = codes >= 0
+    result[found] = parsed[codes[found]]
+    index = values.index if isinstance(values, pd.Series) else None
+    return pd.Series(result, index=index)
@@ -0,0 +1,161 @@
+'''Opt-in timing of a dashboard render: the time of every section of the page, of every explorations
+and transformation call, and the queries and rows read from the database.
+
+The dashboard starts a profile for a render with start_render() when profiling is asked for
+(DASHBOARD_PROFILE=1 or ?profile=1 in the URL) and finishes it with finish_render(). Without an
+active profile, the functions below only cost a lookup. A profile belongs to the thread rendering
+the page, so the sessions of a dashboard process do not mix their numbers.
+'''
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+# Profile every render of the dashboard, not only those asked for with ?profile=1
+PROFILE_ENABLED = os.getenv("DASHBOARD_PROFILE", "") not in ("", "0", "false")
+# File the finished profiles are appended to, one JSON object per line. Off when empty.
+PROFILE_LOG = os.getenv("DASHBOARD_PROFILE_LOG", "")
+
+_local = threading.local()
+
+
+class RenderProfile:
+    '''The measurements of one render of the dashboard.'''
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.seconds = None
+        self.sections = []
+        self._section = None
+        self.calls = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "self_seconds": 0.0})
+        self.queries = defaultdict(lambda: {"queries": 0, "rows": 0, "seconds": 0.0})
+        self._children = []  # time spent in the nested calls of every running call
+
+    def section(self, name):
+        '''Ends the running section and starts the next one.'''
+        now = time.perf_counter()
+        if self._section is not None:
+            self.sections.append({"section": self._section[0], "seconds": now - self._section[1]})
+        self._section = (name, now) if name is not None else None
+
+    def add_query(self, source, rows, seconds):
+        queries = self.queries[source]
+        queries["queries"] += 1
+        queries["rows"] += rows
+        queries["seconds"] += seconds
+
+    @contextmanager
+    def call(self, name):
+        '''Times a call, and apart from it the time spent in the profiled calls it makes.'''
+        self._children.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += seconds
+            call = self.calls[name]
+            call["calls"] += 1
+            call["seconds"] += seconds
+            call["self_seconds"] += seconds - children
+
+    def finish(self):
+        self.section(None)
+        self.seconds = time.perf_counter() - self._start
+
+    def report(self):
+        '''The measurements as a JSON-serializable dict.'''
+        return {
+            "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec="seconds"),
+            "seconds": self.seconds if self.seconds is not None else time.perf_counter() - self._start,
+            "sections": list(self.sections),
+            "calls": {name: dict(call) for name, call in self.calls.items()},
+            "queries": {source: dict(queries) for source, queries in self.queries.items()},
+            "total_queries": sum(queries["queries"] for queries in self.queries.values()),
+            "total_rows": sum(queries["rows"] for queries in self.queries.values()),
+        }
+
+
+def current():
+    '''Returns the profile of the render running on this thread, or None.'''
+    return getattr(_local, "profile", None)
+
+
+def start_render(enabled=True):
+    '''Starts profiling the render running on this thread. When not enabled, only drops the profile
+    a render stopped midway (e.g. by st.rerun) left behind.'''
+    _local.profile = RenderProfile() if enabled else None
+    return _local.profile
+
+
+def finish_render():
+    '''Ends the profile of this thread's render and returns its report, or None if it was not profiled.
+    The report is also appended to PROFILE_LOG when it is set.'''
+    profile = current()
+    if profile is None:
+        return None
+    _local.profile = None
+    profile.finish()
+    report = profile.report()
+    if PROFILE_LOG:
+        append_report(report, PROFILE_LOG)
+    return report
+
+
+def section(name):
+    '''Starts a section of the page, which lasts until the next one or the end of the render.'''
+    profile = current()
+    if profile is not None:
+        profile.section(name)
+
+
+def query(source, rows, seconds):
+    '''Counts a query and the rows it returned.'''
+    profile = current()
+    if profile is not None:
+        profile.add_query(source, rows, seconds)
+
+
+@contextmanager
+def timed_query(source):
+    '''Times the query run in the block, which sets result["rows"] to the number of rows it read.'''
+    result = {"rows": 0}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        query(source, result["rows"], time.perf_counter() - start)
+
+
+def profiled(function):
+    '''Decorates a function whose calls are timed while a render is profiled, as <module>.<function>.
+    Put it above st.cache_data, so the calls answered by the cache are counted too.'''
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}"
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        profile = current()
+        if profile is None:
+            return function(*args, **kwargs)
+        with profile.call(name):
+            return function(*args, **kwargs)
+
+    if hasattr(function, "clear"):
+        wrapper.clear = function.clear  # st.cache_data and st.cache_resource functions
+    return wrapper
+
+
+def append_report(report, path):
+    '''Appends a report to a JSON lines file, for offline analysis.'''
+    try:
+        with open(path, "a") as file:
+            file.write(json.dumps(report, default=str) + "\n")
+    except OSError as e:
+        print(f"An error occurred: {e}")
@@ -0,0 +1,58 @@
+import os
+import threading
+from typing import NamedTuple
+
+import pandas as pd
+import pyarrow as pa
+
+# Where the local table snapshots are kept. Set SNAPSHOT_DIR to an empty string to always read the database.
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".snapshots")
+)
+
+
+class StoredSnapshot(NamedTuple):
+    '''A snapshot read back from disk.'''
+    frame: pd.DataFrame
+    built_at: float     # when the snapshot was last rebuilt from the whole table
+    saved_at: float     # when it was last written, by a rebuild or a sync
+
+
+def snapshot_path(name):
+    return os.path.join(SNAPSHOT_DIR, f"{name}.arrow")
+
+
+def load(name, sql, source):
+    '''Reads a snapshot from its Arrow IPC file. The file is memory-mapped and every column is converted on its own,
+    so numeric and timestamp columns without nulls stay read-only views of the mapping; text columns and columns
+    with nulls are still copied into pandas objects.
+    Returns None if there is no snapshot, or if it was written for a different query or database (`source`).'''
+    path = snapshot_path(name)
+    try:
+        # The mapping stays open as long as the table uses it, so it is not closed here
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        saved_at = os.path.getmtime(path)
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"query") != sql.encode() or metadata.get(b"source") != source.encode():
+        return None
+    return StoredSnapshot(table.to_pandas(split_blocks=True), float(metadata[b"built_at"]), saved_at)
+
+
+def save(name, frame, sql, source, built_at):
+    '''Writes a snapshot along with the query it holds the result of and the database it was read from.
+    The file is written aside and renamed, so readers never see a partial snapshot.'''
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}), b"query": sql.encode(), b"source": source.encode(),
+        b"built_at": str(built_at).encode(),
+    })
+
+    path = snapshot_path(name)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temp_path, path)
@@ -3,30 +3,98 @@ import pandas as pd
 import os
 import sys
 import base64
-import subprocess
-import matplotlib.pyplot as plt
-from scipy.interpolate import interp1d
+import time
+import json
 import urllib.parse 
 
 # Add the parent directory of 'frontend' to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from frontend.explorations import twitter_data, top5_per_context, trend_growth, google_loc
+from frontend.explorations import top_trend_filters, top_trends, latest_trend_categories, latest_trends, growth_series, google_loc, clear_cache
+from frontend import profiler
+from scripts.refresh_runner import start_refresh, refresh_status
+
+# Seconds between two looks at a running refresh
+REFRESH_POLL_SECONDS = 2
+# How long the outcome of the last refresh stays on screen
+REFRESH_RESULT_SECONDS = 60
+# Session state entry holding the start time of the refresh this session asked for
+REFRESH_SESSION_KEY = "refresh_started_at"
+# URL query parameter turning on the render profiler for a session, e.g. ?profile=1
+PROFILE_PARAM = "profile"
 
 def refresh_data():
-    """Runs the script to update the database."""
-    script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts", "update_database.py"))
-    with st.spinner("Refreshing data..."):
-        result = subprocess.run([sys.executable, script_path], capture_output=True, text=True)
-        if result.returncode == 0:
-            st.success("Data refreshed successfully!")
+    """Starts updating the database in the background, or joins the update already running.
+    Only the sources that are no longer fresh are fetched again."""
+    status = start_refresh(on_complete=clear_cache)  # Cached results are stale once it is done
+    st.session_state[REFRESH_SESSION_KEY] = status.started_at
+
+
+def show_refresh_status():
+    """Shows the progress of a running refresh in the sidebar, and its outcome once it is done.
+    Only the sessions that asked for the refresh follow its progress; the others get a notice, so
+    a refresh does not make every open dashboard rerun."""
+    status = refresh_status()
+    if status.state == "running":
+        if st.session_state.get(REFRESH_SESSION_KEY) != status.started_at:
+            st.sidebar.info("The data is being refreshed. Reload the page once it is done to see it.")
+            return
+        st.sidebar.progress(status.fraction, text=f"Refreshing data: {status.stage}...")
+        time.sleep(REFRESH_POLL_SECONDS)
+        st.rerun()  # The page stays usable meanwhile, it is only redrawn to move the progress bar
+    elif status.finished_at and time.time() - status.finished_at < REFRESH_RESULT_SECONDS:
+        if status.state == "succeeded":
+            st.sidebar.success("Data refreshed successfully!")
+        elif status.state == "partial":
+            st.sidebar.warning(f"Data partly refreshed: {status.error}")
         else:
-            st.error(f"Failed to refresh data: {result.stderr}")
+            st.sidebar.error(f"Failed to refresh data: {status.error}")
+
+
+def query_param(name):
+    """Reads a URL query parameter. st.query_params only exists from streamlit 1.30, so the pinned 1.29
+    uses the experimental reader, which returns a list of values per parameter."""
+    if hasattr(st, "query_params"):
+        return st.query_params.get(name, "")
+    return st.experimental_get_query_params().get(name, [""])[0]
+
+
+def profiling_requested():
+    """Whether this render is profiled, for every session with DASHBOARD_PROFILE=1 or for one with ?profile=1."""
+    return profiler.PROFILE_ENABLED or query_param(PROFILE_PARAM) not in ("", "0", "false")
+
+
+def show_profile():
+    """Shows where the time of the render went in the sidebar, with the report to download."""
+    report = profiler.finish_render()
+    if report is None:
+        return
+    with st.sidebar.expander("Render profile", expanded=True):
+        st.write(f"{report['seconds'] * 1000:.0f} ms, {report['total_queries']} queries, "
+                 f"{report['total_rows']} rows fetched")
+        st.dataframe(pd.DataFrame(report['sections']).assign(ms=lambda df: df['seconds'] * 1000)[['section', 'ms']],
+                     hide_index=True)
+        if report['calls']:
+            calls = pd.DataFrame.from_dict(report['calls'], orient='index')
+            calls = calls.sort_values('seconds', ascending=False)
+            st.write("Calls (self time excludes the profiled calls they make)")
+            st.dataframe(calls.rename_axis('function'))
+        if report['queries']:
+            st.write("Queries")
+            st.dataframe(pd.DataFrame.from_dict(report['queries'], orient='index').rename_axis('source'))
+        st.download_button("Export profile", json.dumps(report, indent=2, default=str),
+                           file_name=f"render-profile-{report['started_at']}.json", mime="application/json")
+
+
+@st.cache_resource(show_spinner=False)
+def encoded_image(image_file):
+    """Reads and base64-encodes an image once per process, instead of on every rerun."""
+    with open(image_file, "rb") as f:
+        return base64.b64encode(f.read()).decode()
 
 
 def set_background(image_file):
     """Sets the background image for the app."""
-    with open(image_file, "rb") as f:
-        encoded_string = base64.b64encode(f.read()).decode()
+    encoded_string = encoded_image(image_file)
     css = f"""
     <style>
     .stApp {{
@@ -39,8 +107,7 @@ def set_background(image_file):
 
 def set_sidebar_image(image_file):
     """Sets the sidebar image dynamically."""
-    with open(image_file, "rb") as f:
-        encoded_string = base64.b64encode(f.read()).decode()
+    encoded_string = encoded_image(image_file)
     st.sidebar.markdown(
         f"""
         <style>
@@ -57,6 +124,9 @@ def set_sidebar_image(image_file):
         unsafe_allow_html=True
     )
 
+profiler.start_render(enabled=profiling_requested())
+profiler.section("Page setup")
+
 st.markdown(
     """
     <style>
@@ -78,7 +148,8 @@ set_background("lightmode.jpg")
 # Add a sidebar with a title and options
 platform = st.sidebar.selectbox(
     "Platforms:",
-    ("Twitter", "Google")
+    ("Twitter", "Google"),
+    key="platform"
 )
 
 # Set different sidebar images based on the platform selection
@@ -105,71 +176,39 @@ st.markdown(
 )
 
 
-def parse_popularity(pop_str):
-    """
-    Convert a popularity string with 'K' or 'M' suffixes to a numeric value.
-    e.g. '1.7M posts' becomes 1700000, '997K posts' becomes 997000, and plain numbers are converted to float.
-    """
-    # Clean the string by stripping any leading or trailing spaces and remove ' posts' part
-    pop_str = pop_str.strip().lower().replace(" posts", "")
-    
-    if pop_str.endswith("m"):
-        try:
-            return float(pop_str[:-1]) * 1_000_000
-        except ValueError:
-            return 0
-    elif pop_str.endswith("k"):
-        try:
-            return float(pop_str[:-1]) * 1_000
-        except ValueError:
-            return 0
-    else:
-        try:
-            return float(pop_str)
-        except ValueError:
-            return 0
-
-
 if platform == "Twitter":
+    profiler.section("Top trends")
     st.subheader("The Hottest Twitter Trends")
     with st.expander("Description"):
         st.write("""
             This section displays the Top 10 trends on Twitter at the moment. It also gives you an option to find the Top 10 trends by Country, Category or both!
         """)
 
-    df_top_ten = twitter_data()
+    df_filters = top_trend_filters()
 
     # Convert country names to title case so that options appear properly
-    df_top_ten['country'] = df_top_ten['country'].str.title()
+    df_filters['country'] = df_filters['country'].str.title()
 
     # Get unique countries (sorted alphabetically) and domain contexts
-    countries = sorted(df_top_ten['country'].unique().tolist())
-    domain_contexts = df_top_ten['domain_context'].unique().tolist()
+    countries = sorted(df_filters['country'].unique().tolist())
+    domain_contexts = df_filters['domain_context'].unique().tolist()
 
     # Multiselect widgets for country and domain context
     selected_countries = st.multiselect('Select Country:', ['All'] + countries, default='All')
     selected_domains = st.multiselect('Select Category:', ['All'] + domain_contexts, default='All')
 
-    # Filter the DataFrame based on selections
-    if 'All' not in selected_countries:
-        df_top_ten = df_top_ten[df_top_ten['country'].isin(selected_countries)]
-    if 'All' not in selected_domains:
-        df_top_ten = df_top_ten[df_top_ten['domain_context'].isin(selected_domains)]
+    # Let the database rank the 10 most popular trends for the selections
+    df_top_ten = top_trends(
+        countries=None if 'All' in selected_countries else tuple(country.lower() for country in selected_countries),
+        categories=None if 'All' in selected_domains else tuple(selected_domains),
+        limit=10,
+    )
 
-    # Select only 'Trend', 'Popularity', and 'URL' columns and keep the top 10 rows
-    df_top_ten = df_top_ten[['Trend', 'Popularity', 'URL']].head(10)
+    # Select only 'Trend', 'Popularity', and 'URL' columns, already sorted by popularity
+    df_top_ten = df_top_ten[['Trend', 'Popularity', 'URL']]
     
     # Format the 'Trend' column to title case
     df_top_ten['Trend'] = df_top_ten['Trend'].str.title()
-
-    # Create a numeric column for sorting based on the 'Popularity' string
-    df_top_ten['Popularity_numeric'] = df_top_ten['Popularity'].apply(parse_popularity)
-    
-    # Sort the table by the numeric popularity in descending order
-    df_top_ten = df_top_ten.sort_values(by='Popularity_numeric', ascending=False)
-    
-    # Remove the numeric column since it is not needed for display
-    df_top_ten = df_top_ten.drop(columns=['Popularity_numeric'])
     
     # Create clickable links in the 'Trend' column by wrapping the text with an HTML <a> tag
     df_top_ten['Trend'] = df_top_ten.apply(
@@ -239,117 +278,56 @@ if platform == "Twitter":
     # --------------------------------------------------
     # NEW SECTION: The Latest Trends (by domain_context)
     # --------------------------------------------------
+    profiler.section("Latest trends")
     st.subheader("The Latest Twitter Trends")
     with st.expander("Description"):
         st.write("""
             This section displays the Latest 5 trends on Twitter. It also gives you an option to see the Latest 5 in each category.
         """)
     
-    # Retrieve the latest trends DataFrame from your function
-    df_sorted = top5_per_context()
-    df_sorted = df_sorted.sort_values('last_updated', ascending=False)
-    
     # Create a selectbox for domain_context filtering
-    domain_context_options = sorted(df_sorted['Category'].unique())
     selected_domain_for_latest = st.selectbox(
         "Select a Category for Latest Trends:",
-        options=["All"] + domain_context_options
+        options=["All"] + latest_trend_categories()
     )
     
-    # Filter and select the top 5 based on the selection
-    if selected_domain_for_latest == "All":
-        # Display overall latest trends (top 5)
-        latest_trends = df_sorted.head(5)
-    else:
-        # Filter by the selected domain and then show top 5
-        latest_trends = (
-            df_sorted[df_sorted['Category'] == selected_domain_for_latest]
-            .sort_values('last_updated', ascending=False)
-            .head(5)
-        )
+    # The 5 latest trends of the selection, ranked in the database
+    df_latest = latest_trends(None if selected_domain_for_latest == "All" else selected_domain_for_latest)
     
     # Create clickable links in the 'Trend' column.
-    latest_trends['Trend'] = latest_trends.apply(
+    df_latest['Trend'] = df_latest.apply(
         lambda row: f'<a href="{row["url"]}" target="_blank">{row["Trend"]}</a>', axis=1
     )
     
     # Convert the DataFrame to an HTML table with the same custom CSS,
     # and output only the "Category" and "Trend" columns.
-    table_html_latest = latest_trends[['Trend', 'Category']].to_html(
+    table_html_latest = df_latest[['Trend', 'Category']].to_html(
         escape=False, index=False, classes="custom-table"
     )
     st.markdown(table_html_latest, unsafe_allow_html=True)
     
+    profiler.section("Trend Growth: data")
     st.subheader("Trend Growth")
     with st.expander("Description"):
         st.write("""
-            This section displays the Growth of a Trend over time.
+            This section displays the Growth of a Trend over time. Select several trends to compare them.
         """)
     
-    df_trends = trend_growth()
+    # Every trend is resampled onto evenly spaced points once per data version, so switching trends is a lookup
+    growth = growth_series()
     
-    trend_selection = st.selectbox(
-        "Select a Trend to Visualize Growth Over Time:",
-        df_trends['trend'].unique())
-
-    # Get the trend data filtered by the selected trend
-    trend_data = df_trends[df_trends['trend'] == trend_selection]
-
-    # Convert 'last_updated' to datetime (if it's not already)
-    trend_data['last_updated'] = pd.to_datetime(trend_data['last_updated'])
-
-    # Parse 'meta_description' to numeric popularity values
-    trend_data['popularity_numeric'] = trend_data['meta_description'].apply(parse_popularity)
-
-    # Convert 'last_updated' to datetime if it's not already
-    trend_data['last_updated'] = pd.to_datetime(trend_data['last_updated'])
-
-    # Sort the data by timestamp
-    trend_data = trend_data.sort_values('last_updated')
-
-    # Determine the start and end times for the trend
-    start_time = trend_data['last_updated'].min()
-    end_time = trend_data['last_updated'].max()
-
-    # Generate evenly spaced time intervals within the range of start and end times
-    # Let's decide how many points we want, for example 24 evenly spaced points
-    num_points = 24
-    even_time_intervals = pd.date_range(start=start_time, end=end_time, periods=num_points)
-
-    # Interpolate popularity data to match these even time intervals
-    # First, create a function for interpolation
-    interpolator = interp1d(
-        pd.to_numeric(trend_data['last_updated']), 
-        trend_data['popularity_numeric'], 
-        kind='linear', fill_value="extrapolate"
-    )
-
-    # Interpolated popularity values at the evenly spaced time intervals
-    interpolated_popularity = interpolator(pd.to_numeric(even_time_intervals))
-
-    # Plot the trend with evenly spaced intervals
-    plt.figure(figsize=(10, 6))
-    plt.plot(even_time_intervals, interpolated_popularity, marker='o', linestyle='-', color='b')
-
-    # Optionally highlight max and min points
-    max_popularity_idx = interpolated_popularity.argmax()
-    min_popularity_idx = interpolated_popularity.argmin()
-
-    plt.scatter([even_time_intervals[max_popularity_idx], even_time_intervals[min_popularity_idx]],
-                [interpolated_popularity[max_popularity_idx], interpolated_popularity[min_popularity_idx]],
-                color=['blue'], label='Popularity Count', zorder=5)
-
-    plt.title(f"Popularity Over Time for '{trend_selection}'")
-    plt.xlabel('Date')
-    plt.ylabel('Popularity')
-    plt.xticks(rotation=45)
-    plt.legend()
+    trend_selection = st.multiselect(
+        "Select Trends to Visualize Growth Over Time:",
+        growth.trends, default=growth.trends[:1])
 
-    # Show the plot
-    st.pyplot(plt)
+    profiler.section("Trend Growth: chart")
+    from frontend.charts import growth_chart  # Imports matplotlib, which only this section needs
+    # Plot every selected trend with evenly spaced intervals, rendered once per selection and data version
+    st.image(growth_chart(tuple(trend_selection), growth.version), use_column_width=True)
 
 
 elif platform == "Google":
+    profiler.section("Google trends")
     st.subheader("The Latest Google Trends")
     with st.expander('Description'):
         st.write("""
@@ -429,6 +407,9 @@ elif platform == "Google":
     st.markdown(table_html, unsafe_allow_html=True)
 
 # Sidebar button to refresh data
+profiler.section("Refresh")
 st.sidebar.markdown("""---""")  # Adds a separator line
 if st.sidebar.button("Refresh Data"):
     refresh_data()
+show_profile()
+show_refresh_status()
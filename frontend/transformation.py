@@ -1,137 +1,349 @@
 import pandas as pd
 import sys
 import os
+import threading
+import time
+from datetime import timedelta
+from typing import NamedTuple
 
 BASE_DIR = os.getcwd()  # Gets current working directory
 
 sys.path.append(os.path.abspath(os.path.join(BASE_DIR, "..")))
 
-from database.database import get_db_connection  # Now import should work
-
-
-def transform_google_locations():
-    '''This function retrieves the google_locations table and returns the clean version as a pandas dataframe.'''
-    conn = get_db_connection()
-    if conn:
-        try:
-            # query to select the whole table
-            query = "SELECT * FROM student.google_locations"
-            # my dataframe
-            df = pd.read_sql(query, conn)
-            df_transformed = df.drop(['success', 'message', 'lastupdate', 'scrapedat'], axis=1)
-            df_transformed['country'] = df_transformed['country'].str.lower()
-            # original_length = len(df_transformed)
-            df_unique = df_transformed.drop_duplicates(subset=['country'])
-            # new_length = len(df_unique)
-            # removed_count = original_length - new_length
-            # print(f"Number of duplicate rows removed: {removed_count} out of {original_length}")
-            # print(df_unique)
-            return df_unique
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        finally:
-            # always close connection when done
-            conn.close()
-    else:
-        print("Failed to establish a database connection.")
-
-
-def transform_google_trend():
-    conn = get_db_connection()
-    if conn:
-        try:
-            # my query
-            query = "SELECT * FROM student.google_trend"
-            # my dataframe
-            df = pd.read_sql(query, conn)
-            # drops duplicate rows
-            df_unique = df.drop_duplicates()
-            df_unique.rename(columns={'keyword': 'trend'}, inplace=True)
-            df_unique['trend'] = df_unique['trend'].str.title()
-            
-            # print(df_unique.head())
-            
-            return(df_unique)
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        finally:
-            # always close connection when done
-            conn.close()
-    else:
-        print("Failed to establish a database connection.")
-
-
-def transform_twitter_hashflags():
-    # get the database connection
-    conn = get_db_connection()
-    if conn:
-        try:
-            # my query
-            query = "SELECT * FROM student.twitter_hashflags"
-            # my dataframe
-            df = pd.read_sql(query, conn)
-            df_unique = df.drop_duplicates()
-            df_unique = df_unique.drop(['is_hashfetti_enabled'], axis=1)
-            df_unique.rename(columns={'starting_timestamp_ms':'starting_timestamp', 'ending_timestamp_ms': 'ending_timestamp', 'asset_url': 'url'}, inplace=True)
-            # prints the head
-            # print(df_unique.head())
-            return df_unique
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        finally:
-            # always close connection when done
-            conn.close()
-    else:
-        print("Failed to establish a database connection.")
-
-
-def transform_twitter_trend():
-    # get the database connection
-    conn = get_db_connection()
-    if conn:
-        try:
-            # my query
-            query = "SELECT * FROM student.twitter_trend"
-            # my dataframe
-            df = pd.read_sql(query, conn)
-            df['related_terms'] = df['related_terms'].astype(str)
-            df_unique = df.drop_duplicates()
-            df_unique.rename(columns={'trend_name' : 'trend'}, inplace=True)
-            df_unique = df_unique.drop(['related_terms', 'impression_id'], axis=1)
-            df_unique['domain_context'] = df['domain_context'].str.replace(r' . Trending$', '', regex=True)
-            # prints the head
-            # print(df_unique.head())
-            return df_unique
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        finally:
-            # always close connection when done
-            conn.close()
-    else:
-        print("Failed to establish a database connection.")
-
-
-def transform_twitter_locations():
-    conn = get_db_connection()
-    if conn:
-        try:
-            # my query
-            query = "SELECT * FROM student.twitter_locations"
-            # my dataframe
-            df_unique = pd.read_sql(query, conn)
-            df_unique['country_name'] = df_unique['country_name'].str.lower()
-            # original_length = len(df_unique)
-            df_unique = df_unique.drop_duplicates(subset=['country_name'])
-            df_unique.rename(columns={'country_name':'country'}, inplace=True)
-            # new_length = len(df_unique)
-            # removed_count = original_length - new_length
-            # print(f"Number of duplicate rows removed: {removed_count} out of {original_length}")
-            return df_unique
-            # print(df_unique)
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        finally:
-            # always close connection when done
-            conn.close()
-    else:
-        print("Failed to establish a database connection.")
\ No newline at end of file
+from database.database import db_connection, read_frame, database_identity  # Now import should work
+from frontend import profiler, snapshot_cache
+
+
+class TableQuery(NamedTuple):
+    '''Declares what a transform needs from a table, so the database does the selecting, cleaning and
+    de-duplicating and only the rows that are used cross the wire.'''
+    table: str
+    columns: dict                 # output column name -> SQL expression
+    where: tuple = ()             # SQL conditions, combined with AND
+    distinct_on: tuple = ()       # keep one row per value of these expressions
+    group_by: tuple = ()          # aggregate the columns per value of these expressions
+    order_by: tuple = ()
+    limit: int = None
+
+    def select(self, columns=None, where=(), distinct_on=None, order_by=None, limit=None):
+        '''Returns a narrower query: a subset of the columns and extra conditions.'''
+        return self._replace(
+            columns={name: self.columns[name] for name in columns} if columns else self.columns,
+            where=self.where + tuple(where),
+            distinct_on=self.distinct_on if distinct_on is None else tuple(distinct_on),
+            order_by=self.order_by if order_by is None else tuple(order_by),
+            limit=self.limit if limit is None else limit,
+        )
+
+    def sql(self):
+        '''Builds the SELECT statement.'''
+        columns = ", ".join(
+            expression if expression == name else f"{expression} AS {name}"
+            for name, expression in self.columns.items()
+        )
+        distinct = f"DISTINCT ON ({', '.join(self.distinct_on)}) " if self.distinct_on else ""
+        query = f"SELECT {distinct}{columns} FROM {self.table}"
+        if self.where:
+            query += " WHERE " + " AND ".join(f"({condition})" for condition in self.where)
+        if self.group_by:
+            query += " GROUP BY " + ", ".join(self.group_by)
+        # DISTINCT ON keeps the first row of every group, so the order has to start with its expressions
+        order_by = self.order_by or self.distinct_on
+        if order_by:
+            query += " ORDER BY " + ", ".join(order_by)
+        if self.limit is not None:
+            query += f" LIMIT {int(self.limit)}"
+        return query
+
+
+GOOGLE_LOCATIONS = TableQuery(
+    table="student.google_locations",
+    columns={"id": "id", "country": "lower(country)"},
+    distinct_on=("lower(country)",),
+    order_by=("lower(country)", "id"),
+)
+
+GOOGLE_TREND = TableQuery(
+    table="student.google_trend",
+    columns={"id": "id", "google_location_id": "google_location_id", "trend": "initcap(keyword)",
+             "last_updated": "last_updated", "first_seen": "first_seen", "seen_count": "seen_count",
+             "modified_at": "modified_at"},
+)
+
+TWITTER_HASHFLAGS = TableQuery(
+    table="student.twitter_hashflags",
+    columns={"id": "id", "hashtag": "hashtag", "starting_timestamp": "starting_timestamp_ms",
+             "ending_timestamp": "ending_timestamp_ms", "url": "asset_url", "last_updated": "last_updated"},
+)
+
+TWITTER_TREND = TableQuery(
+    table="student.twitter_trend",
+    columns={"id": "id", "trend": "trend_name", "position": "position", "meta_description": "meta_description",
+             "domain_context": r"regexp_replace(domain_context, ' . Trending$', '')", "url": "url",
+             "last_updated": "last_updated", "location_id": "location_id", "popularity": "popularity",
+             "modified_at": "modified_at"},
+)
+
+# The most popular trends with their country, read in popularity order through twitter_trend_popularity_idx
+TOP_TRENDS = TableQuery(
+    table="student.twitter_trend t JOIN student.twitter_locations l ON l.location_id = t.location_id",
+    columns={"trend": "t.trend_name", "meta_description": "t.meta_description",
+             "domain_context": r"regexp_replace(t.domain_context, ' . Trending$', '')", "url": "t.url",
+             "country": "lower(l.country_name)", "popularity": "t.popularity"},
+    where=("t.popularity IS NOT NULL",),
+    order_by=("t.popularity DESC NULLS LAST",),
+)
+
+# The rankings precomputed by the top_trend_rank and latest_trend_rank materialized views.
+# Every filter selection is a cell of the view, ALL_CELLS standing for all countries or all categories.
+ALL_CELLS = '*'
+TOP_TREND_RANK_DEPTH = 10  # trends ranked per cell of top_trend_rank
+
+TOP_TREND_RANK = TableQuery(
+    table="student.top_trend_rank",
+    columns={"trend": "trend", "meta_description": "meta_description", "domain_context": "domain_context",
+             "url": "url", "country": "country", "popularity": "popularity"},
+    where=("cell_country = ANY(%(countries)s)", "cell_category = ANY(%(categories)s)"),
+    order_by=("popularity DESC", "trend"),
+)
+
+# The country and category pairs that have a ranking
+TOP_TREND_CELLS = TableQuery(
+    table="student.top_trend_rank",
+    columns={"country": "cell_country", "domain_context": "cell_category"},
+    where=("rank = 1", f"cell_country <> '{ALL_CELLS}'", f"cell_category <> '{ALL_CELLS}'"),
+    order_by=("cell_country", "cell_category"),
+)
+
+LATEST_TREND_RANK = TableQuery(
+    table="student.latest_trend_rank",
+    columns={"trend": "trend", "domain_context": "domain_context", "url": "url", "last_updated": "last_updated"},
+    where=("cell_category = %(category)s",),
+    order_by=("rank",),
+)
+
+LATEST_TREND_CATEGORIES = TableQuery(
+    table="student.latest_trend_rank",
+    columns={"category": "cell_category"},
+    where=("rank = 1", f"cell_category <> '{ALL_CELLS}'"),
+    order_by=("cell_category",),
+)
+
+# One popularity point per trend and fetch, over every trend seen more than 3 times in the last %(days)s days.
+# The time condition is answered by the BRIN index of twitter_trend_observation and its monthly partitions.
+TREND_OBSERVATIONS = TableQuery(
+    table="student.twitter_trend_observation",
+    columns={"trend": "trend_name", "last_updated": "observed_at", "popularity": "MAX(popularity)"},
+    where=(
+        "observed_at >= LOCALTIMESTAMP - %(days)s * INTERVAL '1 day'",
+        "trend_name IN (SELECT trend_name FROM student.twitter_trend_observation "
+        "WHERE observed_at >= LOCALTIMESTAMP - %(days)s * INTERVAL '1 day' "
+        "GROUP BY trend_name HAVING COUNT(DISTINCT observed_at) > 3)",
+    ),
+    group_by=("trend_name", "observed_at"),
+    order_by=("trend_name", "observed_at"),
+)
+
+TWITTER_LOCATIONS = TableQuery(
+    table="student.twitter_locations",
+    columns={"location_id": "location_id", "country": "lower(country_name)"},
+    distinct_on=("lower(country_name)",),
+    order_by=("lower(country_name)", "location_id"),
+)
+
+
+class Snapshot(NamedTuple):
+    '''A table kept in a local columnar snapshot, so a new dashboard process does not re-read all of it.'''
+    query: TableQuery
+    key: str = None       # column identifying a row, newer copies of a row replace older ones
+    updated: str = None   # column stamped by every insert and update to sync on; without one the table is reloaded
+
+SNAPSHOTS = {
+    "twitter_trend": Snapshot(TWITTER_TREND, key="id", updated="modified_at"),
+    "google_trend": Snapshot(GOOGLE_TREND, key="id", updated="modified_at"),
+    "twitter_locations": Snapshot(TWITTER_LOCATIONS),
+    "google_locations": Snapshot(GOOGLE_LOCATIONS),
+}
+
+# A sync reads the rows updated since the newest synced one, minus this overlap for rows committed late
+SNAPSHOT_SYNC_OVERLAP = timedelta(minutes=5)
+# Synced snapshots are rebuilt from the whole table once a day, which also drops deleted rows
+SNAPSHOT_REBUILD_SECONDS = int(os.getenv("SNAPSHOT_REBUILD_SECONDS", str(24 * 3600)))
+# Snapshots of tables without a timestamp column are reloaded when older than this
+SNAPSHOT_RELOAD_SECONDS = int(os.getenv("SNAPSHOT_RELOAD_SECONDS", "300"))
+
+_snapshot_lock = threading.Lock()
+_snapshots_expired_at = 0.0
+
+
+def read_table(query, params=None):
+    '''Runs a TableQuery on a pooled connection and returns the result as a pandas dataframe.'''
+    try:
+        # borrow a pooled connection, it is returned when the block ends
+        with db_connection() as conn, profiler.timed_query(query.table.split()[0]) as result:
+            frame = read_frame(conn, query.sql(), params=params)
+            result["rows"] = len(frame)
+            return frame
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+def table_version(table, column="id"):
+    '''Returns the largest value of an indexed column of a table, by default its newest id, which changes
+    whenever rows are added. It is read through the index, so it is cheap enough to check on every render.'''
+    try:
+        with db_connection() as conn, profiler.timed_query(f"{table} version"):
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT MAX({column}) FROM {table}")
+                return cursor.fetchone()[0]
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+@profiler.profiled
+def sync_snapshot(name):
+    '''Brings the local snapshot of a table up to date and returns it as a pandas dataframe.
+    Only the rows updated since the last sync are fetched. When the database cannot be reached,
+    the snapshot is returned as it is.'''
+    snapshot = SNAPSHOTS[name]
+    sql = snapshot.query.sql()
+    source = database_identity()  # Another database's snapshot is rebuilt, never synced
+    stored = snapshot_cache.load(name, sql, source)
+    now = time.time()
+
+    if stored is not None and snapshot.updated is None:
+        if now - stored.saved_at < SNAPSHOT_RELOAD_SECONDS and stored.saved_at > _snapshots_expired_at:
+            return stored.frame
+
+    elif stored is not None and now - stored.built_at < SNAPSHOT_REBUILD_SECONDS:
+        newest = stored.frame[snapshot.updated].max()
+        if pd.notna(newest):
+            condition = f"{snapshot.query.columns[snapshot.updated]} >= %(since)s"
+            new_rows = read_table(snapshot.query.select(where=[condition], order_by=[snapshot.key]),
+                                  params={'since': (newest - SNAPSHOT_SYNC_OVERLAP).to_pydatetime()})
+            if new_rows is None or new_rows.empty:
+                return stored.frame
+
+            frame = pd.concat([stored.frame, new_rows], ignore_index=True)
+            frame = frame.drop_duplicates(subset=[snapshot.key], keep='last')
+            if not frame[snapshot.key].is_monotonic_increasing:
+                frame = frame.sort_values(snapshot.key)
+            frame = frame.reset_index(drop=True)
+            snapshot_cache.save(name, frame, sql, source, stored.built_at)
+            return frame
+
+    # No usable snapshot: read the whole table
+    frame = read_table(snapshot.query.select(order_by=[snapshot.key]) if snapshot.key else snapshot.query)
+    if frame is None:
+        return stored.frame if stored is not None else None
+    snapshot_cache.save(name, frame, sql, source, now)
+    return frame
+
+
+def read_synced(name, columns=None, **narrow):
+    '''Reads a table through its local snapshot. Selecting columns is done on the snapshot,
+    any other narrowing is a query to the database.'''
+    snapshot = SNAPSHOTS[name]
+    order_by = narrow.pop('order_by', [snapshot.key] if snapshot.key else None)
+    if narrow or not snapshot_cache.SNAPSHOT_DIR:
+        return read_table(snapshot.query.select(columns=columns, order_by=order_by, **narrow))
+
+    try:
+        with _snapshot_lock:
+            df = sync_snapshot(name)
+    except Exception as e:
+        # e.g. the snapshot directory is not writable, read the database directly
+        print(f"An error occurred: {e}")
+        return read_table(snapshot.query.select(columns=columns, order_by=order_by))
+    if df is None or columns is None:
+        return df
+    return df[list(columns)]
+
+
+def expire_snapshots():
+    '''Makes the next read reload the snapshots of the tables that cannot be synced, e.g. after a refresh.'''
+    global _snapshots_expired_at
+    _snapshots_expired_at = time.time()
+
+
+@profiler.profiled
+def transform_google_locations(**narrow):
+    '''This function retrieves the google_locations table and returns the clean version as a pandas dataframe.
+    Keyword arguments are passed to TableQuery.select to fetch fewer columns or rows.'''
+    return read_synced("google_locations", **narrow)
+
+
+@profiler.profiled
+def transform_google_trend(**narrow):
+    '''Returns the google_trend keywords, renamed to trend and in title case, one row per keyword and country.
+    last_updated is the last time a keyword was seen.'''
+    return read_synced("google_trend", **narrow)
+
+
+@profiler.profiled
+def transform_twitter_hashflags(**narrow):
+    '''Returns the twitter_hashflags table without the hashfetti flag and with readable column names.'''
+    return read_table(TWITTER_HASHFLAGS.select(**narrow))
+
+
+@profiler.profiled
+def transform_twitter_trend(**narrow):
+    '''Returns the twitter_trend table without the related terms and impression ids,
+    and with the " · Trending" suffix removed from the domain context.'''
+    return read_synced("twitter_trend", **narrow)
+
+
+@profiler.profiled
+def transform_top_trends(countries=None, categories=None, limit=10):
+    '''Returns the `limit` most popular trend rows, optionally only for some countries (lower case)
+    and categories. The database stops reading as soon as it has found enough rows.'''
+    where = []
+    params = {}
+    if countries is not None:
+        where.append("lower(l.country_name) = ANY(%(countries)s)")
+        params['countries'] = list(countries)
+    if categories is not None:
+        where.append(r"regexp_replace(t.domain_context, ' . Trending$', '') = ANY(%(categories)s)")
+        params['categories'] = list(categories)
+    return read_table(TOP_TRENDS.select(where=where, limit=limit), params=params or None)
+
+
+@profiler.profiled
+def transform_top_trend_rank(countries=None, categories=None):
+    '''Returns the ranked trends of the selected countries (lower case) and categories, most popular first.
+    Every cell holds its own distinct trends, so a trend can come back once per selected cell.'''
+    params = {
+        'countries': [ALL_CELLS] if countries is None else list(countries),
+        'categories': [ALL_CELLS] if categories is None else list(categories),
+    }
+    return read_table(TOP_TREND_RANK, params=params)
+
+
+@profiler.profiled
+def transform_top_trend_cells():
+    '''Returns the country and domain_context pairs that have ranked trends.'''
+    return read_table(TOP_TREND_CELLS)
+
+
+@profiler.profiled
+def transform_latest_trends(category=None):
+    '''Returns the 5 most recent distinct trends of a category, or of all categories, newest first.'''
+    return read_table(LATEST_TREND_RANK, params={'category': ALL_CELLS if category is None else category})
+
+
+@profiler.profiled
+def transform_latest_trend_categories():
+    '''Returns the categories that have latest trends.'''
+    return read_table(LATEST_TREND_CATEGORIES)
+
+
+@profiler.profiled
+def transform_trend_observations(days):
+    '''Returns the popularity history of the recurring trends over the last `days` days.'''
+    return read_table(TREND_OBSERVATIONS, params={'days': days})
+
+
+@profiler.profiled
+def transform_twitter_locations(**narrow):
+    '''Returns one twitter location per country, with lower case country names.'''
+    return read_synced("twitter_locations", **narrow)
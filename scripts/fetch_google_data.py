@@ -1,18 +1,17 @@
-# import os
-# import sys
+import os
+import sys
 import requests
 import streamlit as st
 
-# # Extend sys path to access the database module or config in parent directory
-# sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Extend sys path to access the shared HTTP client
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts import http_client
 
 # from config import GOOGLE_API_HOST, GOOGLE_API_KEY
 
-GOOGLE_API_URL = "https://google-realtime-trends-data-api.p.rapidapi.com/trends"
-
-# Google Trends API
-GOOGLE_API_KEY=st.secrets["GOOGLE_API_KEY"]
-GOOGLE_API_HOST=st.secrets["GOOGLE_API_HOST"]
+# Where the Google Trends API is served. Set GOOGLE_API_BASE_URL to call a stand-in, e.g. benchmarks/api_standin.py
+GOOGLE_API_BASE_URL = os.getenv("GOOGLE_API_BASE_URL", "https://google-realtime-trends-data-api.p.rapidapi.com")
+GOOGLE_API_PATH = "/trends"
 
 def fetch_google_trends():
     """
@@ -23,12 +22,12 @@ def fetch_google_trends():
         None: If the request fails.
     """
     headers = {
-        "X-RapidAPI-Host": GOOGLE_API_HOST,
-        "X-RapidAPI-Key": GOOGLE_API_KEY
+        "X-RapidAPI-Host": st.secrets["GOOGLE_API_HOST"],  # Google Trends API credentials
+        "X-RapidAPI-Key": st.secrets["GOOGLE_API_KEY"]
     }
     
     try:
-        response = requests.get(GOOGLE_API_URL, headers=headers)
+        response = http_client.get(GOOGLE_API_BASE_URL.rstrip("/") + GOOGLE_API_PATH, headers=headers)
         response.raise_for_status()  # Raise an HTTPError if the HTTP request returned an unsuccessful status code
         data = response.json()
         return data
@@ -1,33 +1,41 @@
 import requests
-# import sys
+import sys
 import json
-# import os
+import os
 import streamlit as st
 
-# # Extend sys path to access the database module
-# sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Extend sys path to access the shared HTTP client
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts import http_client
+
 # from config import TWITTER_API_KEY, TWITTER_API_HOST 
 
-# Twitter Hashflags API
-TWITTER_API_KEY=st.secrets["TWITTER_API_KEY"]
-TWITTER_API_HOST=st.secrets["TWITTER_API_HOST"]
+# Where the Twitter API is served. Set TWITTER_API_BASE_URL to call a stand-in, e.g. benchmarks/api_standin.py
+TWITTER_API_BASE_URL = os.getenv("TWITTER_API_BASE_URL", "https://twitter135.p.rapidapi.com")
+
+# API paths for Twitter Data
+HASHTAGS_API_PATH = "/v1.1/Hashflags/"
+TRENDS_API_PATH = "/v1.1/Trends/"
+LOCATION_API_PATH = "/v1.1/Locations/"
+
 
+def api_headers() -> dict:
+    """Request headers with the API credentials, read from the secrets when a request is made."""
+    return {
+        "x-rapidapi-key": st.secrets["TWITTER_API_KEY"],
+        "x-rapidapi-host": st.secrets["TWITTER_API_HOST"]
+    }
 
-# API URLs for Twitter Data
-HASHTAGS_API_URL = "https://twitter135.p.rapidapi.com/v1.1/Hashflags/"
-TRENDS_API_URL = "https://twitter135.p.rapidapi.com/v1.1/Trends/"
-LOCATION_API_URL = "https://twitter135.p.rapidapi.com/v1.1/Locations/"
 
-# Request Headers with API credentials
-HEADERS = {
-    "x-rapidapi-key": TWITTER_API_KEY,
-    "x-rapidapi-host": TWITTER_API_HOST
-}
+def api_url(path: str) -> str:
+    """Returns the URL of an API path, on the base URL in use at the time of the call."""
+    return TWITTER_API_BASE_URL.rstrip("/") + path
 
 
 def make_api_request(url: str, params: dict = None) -> dict:
     """
     A helper function to make API requests and handle common errors.
+    Transient failures are retried by the shared HTTP client.
     Args:
         url (str): The API endpoint URL.
         params (dict): The query parameters for the request.
@@ -35,7 +43,7 @@ def make_api_request(url: str, params: dict = None) -> dict:
         dict: JSON response from the API or None in case of error.
     """
     try:
-        response = requests.get(url, headers=HEADERS, params=params)
+        response = http_client.get(url, headers=api_headers(), params=params)
         if response.status_code == 200:
             return response.json()  # Return the JSON data if successful
         else:
@@ -54,7 +62,7 @@ def fetch_twitter_locations() -> dict:
     Returns:
         dict: A dictionary containing location details.
     """
-    return make_api_request(LOCATION_API_URL)
+    return make_api_request(api_url(LOCATION_API_PATH))
 
 
 def fetch_twitter_hashtags() -> dict:
@@ -63,7 +71,7 @@ def fetch_twitter_hashtags() -> dict:
     Returns:
         dict: A dictionary containing hashtags and their details.
     """
-    return make_api_request(HASHTAGS_API_URL)
+    return make_api_request(api_url(HASHTAGS_API_PATH))
 
 
 def fetch_twitter_trends(location_id: str) -> dict:
@@ -74,7 +82,7 @@ def fetch_twitter_trends(location_id: str) -> dict:
     Returns:
         dict: A dictionary containing trending topics and their details.
     """
-    url = TRENDS_API_URL
+    url = api_url(TRENDS_API_PATH)
     params = {"location_id": location_id, "count": "20"}
     return make_api_request(url, params=params)
 
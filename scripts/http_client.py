@@ -0,0 +1,126 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts in seconds for every API request
+REQUEST_TIMEOUT = (5, 30)
+
+# Retry policy for transient failures (rate limiting and server errors)
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5   # seconds, doubled on every attempt
+BACKOFF_MAX = 30     # upper bound for a single wait, including Retry-After
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Keep-alive connections kept open per host, enough for the parallel trend fetching
+POOL_SIZE = 10
+
+_session = None
+_session_lock = threading.Lock()
+
+# Called after every attempt with (url, params, status, seconds, size), e.g. by scripts/ingest_metrics.py.
+# The status is None when the request failed without an answer.
+_observers = []
+
+
+def add_observer(observer):
+    _observers.append(observer)
+
+
+def remove_observer(observer):
+    if observer in _observers:
+        _observers.remove(observer)
+
+
+def notify(url, params, status, seconds, size):
+    for observer in list(_observers):
+        try:
+            observer(url, params, status, seconds, size)
+        except Exception as e:
+            logging.error(f"Request observer failed: {e}")
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide requests session, creating it on first use.
+    The session keeps connections alive so repeated calls to the same API skip the TLS handshake.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """
+    Reads the Retry-After header of a response.
+    Returns:
+        float: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given (zero-based) attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def get(url: str, headers: dict = None, params: dict = None,
+        timeout=REQUEST_TIMEOUT, max_retries: int = MAX_RETRIES) -> requests.Response:
+    """
+    Sends a GET request through the shared session, retrying transient failures.
+    Args:
+        url (str): The API endpoint URL.
+        headers (dict): The request headers.
+        params (dict): The query parameters for the request.
+        timeout: Timeout in seconds, or a (connect, read) tuple.
+        max_retries (int): How many times a failed request is retried.
+    Returns:
+        requests.Response: The last response received, which may still be an error response.
+    Raises:
+        requests.RequestException: If the request could not be sent after all retries.
+    """
+    session = get_session()
+    for attempt in range(max_retries + 1):
+        start = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            notify(url, params, None, time.perf_counter() - start, 0)
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"Request to {url} failed ({e}), retrying in {delay:.1f}s")
+        else:
+            if _observers:
+                # Reading the size downloads the body, which is then part of the measured time
+                notify(url, params, response.status_code, time.perf_counter() - start, len(response.content or b""))
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                return response
+            retry_after = retry_after_seconds(response)
+            delay = min(retry_after, BACKOFF_MAX) if retry_after is not None else backoff_delay(attempt)
+            logging.warning(f"Request to {url} returned {response.status_code}, retrying in {delay:.1f}s")
+            response.close()
+        time.sleep(delay)
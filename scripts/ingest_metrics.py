@@ -0,0 +1,225 @@
+"""Per-run metrics of the ingest: stage times, API latency and payload sizes, parse times, rows and
+database time per statement, and failures.
+
+update_database.main starts a run, and the ingest functions record into it through the module
+functions below, which do nothing when no run is active. The report of a run is written as JSON,
+one file per run to compare them, and in the Prometheus text format, replaced by every run so a
+node_exporter textfile collector can scrape it.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from scripts import http_client
+
+PROMETHEUS_FILE = "nowtrending_ingest.prom"
+PROMETHEUS_PREFIX = "nowtrending_ingest"
+
+
+class IngestRun:
+    """Collects the measurements of one ingest run. Safe to share between the fetching threads."""
+
+    def __init__(self, kind="ingest"):
+        self.kind = kind
+        self.started_at = time.time()
+        self.finished_at = None
+        self.stages = {}
+        self.requests = defaultdict(lambda: {"requests": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0,
+                                             "statuses": defaultdict(int)})
+        self.locations = {}
+        self.parses = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+        self.rows = defaultdict(lambda: {"parsed": 0, "inserted": 0, "skipped": 0})
+        self.statements = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def observe_request(self, url, params, status, seconds, size):
+        """http_client observer: one answered or failed API request."""
+        endpoint = urlsplit(url).path
+        location = (params or {}).get("location_id")
+        with self._lock:
+            request = self.requests[endpoint]
+            request["requests"] += 1
+            request["seconds"] += seconds
+            request["max_seconds"] = max(request["max_seconds"], seconds)
+            request["bytes"] += size
+            request["statuses"][str(status or "error")] += 1
+            if location is not None:
+                # Retries of a location add up, the status is the one of the last attempt
+                previous = self.locations.get(str(location), {"seconds": 0.0, "bytes": 0, "attempts": 0})
+                self.locations[str(location)] = {"seconds": previous["seconds"] + seconds, "bytes": size,
+                                                 "attempts": previous["attempts"] + 1, "status": status}
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_parse(self, source, seconds):
+        with self._lock:
+            self.parses[source]["calls"] += 1
+            self.parses[source]["seconds"] += seconds
+
+    def add_rows(self, source, parsed=0, inserted=0, skipped=0):
+        with self._lock:
+            rows = self.rows[source]
+            rows["parsed"] += parsed
+            rows["inserted"] += inserted
+            rows["skipped"] += skipped
+
+    def add_statement(self, name, seconds):
+        with self._lock:
+            statement = self.statements[name]
+            statement["calls"] += 1
+            statement["seconds"] += seconds
+            statement["max_seconds"] = max(statement["max_seconds"], seconds)
+
+    def add_failure(self, stage, error, location=None):
+        with self._lock:
+            self.failures.append({"stage": stage, "location": location, "error": str(error)})
+
+    def report(self):
+        """The measurements as a JSON-serializable dict."""
+        finished_at = self.finished_at or time.time()
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec="seconds"),
+                "seconds": round(finished_at - self.started_at, 6),
+                "stages": dict(self.stages),
+                "api": {endpoint: {**request, "statuses": dict(request["statuses"])}
+                        for endpoint, request in self.requests.items()},
+                "api_locations": dict(self.locations),
+                "parse": {source: dict(parse) for source, parse in self.parses.items()},
+                "rows": {source: dict(rows) for source, rows in self.rows.items()},
+                "statements": {name: dict(statement) for name, statement in self.statements.items()},
+                "failures": list(self.failures),
+            }
+
+
+_current = None
+
+
+def start_run(kind="ingest"):
+    """Starts recording a run, which the module functions below record into until finish_run."""
+    global _current
+    _current = IngestRun(kind)
+    http_client.add_observer(_current.observe_request)
+    return _current
+
+
+def finish_run(run):
+    global _current
+    run.finished_at = time.time()
+    http_client.remove_observer(run.observe_request)
+    if _current is run:
+        _current = None
+    return run.report()
+
+
+@contextmanager
+def _timed(record, *args):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _current is not None:
+            record(_current, *args, time.perf_counter() - start)
+
+
+def stage(name):
+    """Times a stage of the run, e.g. with stage("twitter_trends"): ..."""
+    return _timed(IngestRun.add_stage, name)
+
+
+def parse(source):
+    """Times the parsing of a response."""
+    return _timed(IngestRun.add_parse, source)
+
+
+def statement(name):
+    """Times a database statement, or a batch of the same statement, e.g. "twitter_trend.merge"."""
+    return _timed(IngestRun.add_statement, name)
+
+
+def rows(source, parsed=0, inserted=0, skipped=0):
+    """Counts the rows of a source that were parsed, inserted, or skipped as duplicates or invalid."""
+    if _current is not None:
+        _current.add_rows(source, parsed, inserted, skipped)
+
+
+def failure(stage, error, location=None):
+    """Records a failure the ingest recovered from."""
+    if _current is not None:
+        _current.add_failure(stage, error, location)
+
+
+def prometheus_text(report):
+    """Formats a report in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, help_text, kind, samples):
+        full_name = f"{PROMETHEUS_PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+            lines.append(f"{full_name}{{{label_text}}} {value}" if label_text else f"{full_name} {value}")
+
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    started_at = datetime.fromisoformat(report["started_at"]).timestamp()
+    metric("last_run_timestamp_seconds", "Start of the last run.", "gauge", [({"kind": report["kind"]}, started_at)])
+    metric("run_seconds", "Duration of the last run.", "gauge", [({"kind": report["kind"]}, report["seconds"])])
+    metric("stage_seconds", "Time spent in every stage of the last run.", "gauge",
+           [({"stage": name}, seconds) for name, seconds in report["stages"].items()])
+    metric("api_requests", "API requests of the last run, by endpoint and status.", "gauge",
+           [({"endpoint": endpoint, "status": status}, count)
+            for endpoint, request in report["api"].items() for status, count in request["statuses"].items()])
+    metric("api_request_seconds", "Total time waiting for the API, by endpoint.", "gauge",
+           [({"endpoint": endpoint}, request["seconds"]) for endpoint, request in report["api"].items()])
+    metric("api_request_max_seconds", "Slowest API request, by endpoint.", "gauge",
+           [({"endpoint": endpoint}, request["max_seconds"]) for endpoint, request in report["api"].items()])
+    metric("api_response_bytes", "Size of the API responses, by endpoint.", "gauge",
+           [({"endpoint": endpoint}, request["bytes"]) for endpoint, request in report["api"].items()])
+    metric("api_location_seconds", "Time waiting for the trends of every location, retries included.", "gauge",
+           [({"location": location}, values["seconds"]) for location, values in report["api_locations"].items()])
+    metric("parse_seconds", "Time parsing responses, by source.", "gauge",
+           [({"source": source}, parse["seconds"]) for source, parse in report["parse"].items()])
+    metric("rows", "Rows of the last run, by source and outcome.", "gauge",
+           [({"source": source, "outcome": outcome}, count)
+            for source, rows in report["rows"].items() for outcome, count in rows.items()])
+    metric("statement_seconds", "Database time, by statement.", "gauge",
+           [({"statement": name}, statement["seconds"]) for name, statement in report["statements"].items()])
+    metric("statement_calls", "Database statements run, by statement.", "gauge",
+           [({"statement": name}, statement["calls"]) for name, statement in report["statements"].items()])
+    failures = defaultdict(int)
+    for failed in report["failures"]:
+        failures[failed["stage"]] += 1
+    metric("failures", "Failures the last run recovered from, by stage.", "gauge",
+           [({"stage": stage_name}, count) for stage_name, count in failures.items()])
+    return "\n".join(lines) + "\n"
+
+
+def write_report(report, directory):
+    """Writes a report to ingest-<start time>.json and to the Prometheus file of the directory.
+    Both are written aside and renamed, so readers never see a partial file.
+
+    Returns:
+        str: The path of the JSON report.
+    """
+    os.makedirs(directory, exist_ok=True)
+    started_at = datetime.fromisoformat(report["started_at"])
+    json_path = os.path.join(directory, f"{report['kind']}-{started_at:%Y%m%dT%H%M%S}.json")
+    for path, text in ((json_path, json.dumps(report, indent=2)),
+                       (os.path.join(directory, PROMETHEUS_FILE), prometheus_text(report))):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            file.write(text)
+        os.replace(temp_path, path)
+    return json_path
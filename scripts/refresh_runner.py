@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from typing import NamedTuple
+
+
+class RefreshStatus(NamedTuple):
+    """Where the background refresh is at, shared by every dashboard session of the process."""
+    state: str = "idle"       # idle, running, succeeded, partial (some sources failed) or failed
+    stage: str = ""
+    done: int = 0
+    total: int = 0
+    started_at: float = None
+    finished_at: float = None
+    error: str = None         # what failed, for a partial or failed refresh
+
+    @property
+    def fraction(self):
+        """Progress of the current stage, between 0 and 1."""
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+
+_lock = threading.Lock()
+_status = RefreshStatus()
+
+
+def update_database(**options):
+    """Runs update_database.main. It is imported on the first refresh, since it loads the API
+    clients, which the dashboard does not need to render."""
+    from scripts.update_database import main
+    return main(**options)
+
+
+def refresh_status():
+    """Returns the status of the last refresh started in this process."""
+    return _status
+
+
+def start_refresh(on_complete=None, **options):
+    """Starts refreshing the database on a background thread and returns right away.
+
+    Only one refresh runs at a time: while one is running, later calls join it and get its status.
+    `on_complete` is called once the data is stored, before the refresh is reported as succeeded.
+    Other keyword arguments are passed to update_database.main.
+    """
+    global _status
+    with _lock:
+        if _status.state == "running":
+            return _status
+        _status = RefreshStatus(state="running", stage="Starting", started_at=time.time())
+        threading.Thread(
+            target=_run, args=(on_complete, options), name="nowtrending-refresh", daemon=True
+        ).start()
+        return _status
+
+
+def _report(stage, done, total):
+    """Progress callback of update_database.main."""
+    global _status
+    with _lock:
+        _status = _status._replace(stage=stage, done=done, total=total)
+
+
+def _finish(state, error=None):
+    global _status
+    with _lock:
+        _status = _status._replace(state=state, error=error, finished_at=time.time())
+
+
+def outcome(report):
+    """Judges a refresh by the metrics report of update_database.main, which recovers from the failure
+    of a source and carries on. Returns the state the refresh finished in, and a summary of what failed.
+    """
+    failures = (report or {}).get("failures", [])
+    if not failures:
+        return "succeeded", None
+    first = failures[0]
+    summary = f"{len(failures)} failure{'s' if len(failures) > 1 else ''}, e.g. {first['stage']}: {first['error']}"
+    # Rows are only counted once they are stored
+    stored = any(rows.get("parsed") for rows in report.get("rows", {}).values())
+    return ("partial" if stored else "failed"), summary
+
+
+def _run(on_complete, options):
+    try:
+        report = update_database(progress=_report, **options)
+        if on_complete:
+            on_complete()
+    except Exception as e:
+        logging.error(f"Background refresh failed: {e}")
+        _finish("failed", str(e))
+    else:
+        _finish(*outcome(report))
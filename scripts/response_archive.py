@@ -0,0 +1,89 @@
+"""Append-only archive of the raw API responses, so ingest runs can be replayed without the network.
+
+Every response is one JSON line with its source, location, fetch time and the start time of its run.
+Every run writes a file of its own, named after the time it started, so a run that is killed midway
+only leaves the end of its own file unreadable.
+"""
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import datetime, timezone
+
+# Keys every archived record has
+RECORD_KEYS = {"source", "location", "response"}
+
+
+class ResponseArchive:
+    """Writes the responses of one ingest run. Safe to share between the fetching threads."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.started_at = datetime.now(timezone.utc)
+        self.path = os.path.join(directory, f"responses-{self.started_at:%Y%m%dT%H%M%S%fZ}.jsonl.gz")
+        self.count = 0
+        self._file = gzip.open(self.path, "xt", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, source, location, response):
+        """Appends a response, e.g. record("twitter_trends", "23424950", trends_data)."""
+        line = json.dumps({
+            "source": source,
+            "location": location,
+            "fetched_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "run_started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "response": response,
+        }, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def archive_files(paths):
+    """Expands archive files and directories into the archive files they hold, oldest first."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "responses-*.jsonl.gz")))
+        else:
+            files.append(path)
+    return files
+
+
+def read_archive(paths):
+    """Yields the archived records of files or directories, in the order they were written.
+    Lines that cannot be decoded are logged and skipped."""
+    for path in archive_files(paths):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                for number, line in enumerate(file, start=1):
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        record = None
+                    if not isinstance(record, dict) or not RECORD_KEYS <= record.keys():
+                        # e.g. the end of a killed run, which older archives appended the next run to
+                        logging.error(f"Skipping line {number} of archive {path}, it is not an archived response")
+                        continue
+                    yield record
+        except (EOFError, gzip.BadGzipFile, zlib.error, UnicodeDecodeError) as e:
+            # The run writing the end of the file was interrupted, keep what was read
+            logging.error(f"Archive {path} is truncated: {e}")
+
+
+def archived_time(value):
+    """Parses a time of an archived record, e.g. its fetched_at, or returns None if it has none."""
+    return datetime.fromisoformat(value) if value else None
@@ -0,0 +1,112 @@
+"""Extracts the trends from a Twitter Trends API timeline.
+
+The fields of a trend sit at the end of deep paths inside every timeline item. The paths are
+declared once in TREND_FIELDS and compiled into a single function that walks every item once,
+reading each shared part of the paths (e.g. clientEventInfo -> ... -> trendMetadata) a single time.
+"""
+import json
+import logging
+from types import MappingProxyType
+
+try:
+    import ijson  # Optional, only needed to stream large responses
+except ImportError:
+    ijson = None
+
+# Where the trend of a timeline item is, an item without one is skipped
+TREND_PATH = ("item", "content", "trend")
+
+# Output field -> (path from the timeline item, value when the path is missing)
+TREND_FIELDS = {
+    "trendName": (TREND_PATH + ("name",), None),
+    "position": (("item", "clientEventInfo", "details", "guideDetails", "transparentGuideDetails",
+                  "trendMetadata", "position"), 0),
+    "metaDescription": (TREND_PATH + ("trendMetadata", "metaDescription"), ""),
+    "domainContext": (TREND_PATH + ("trendMetadata", "domainContext"), ""),
+    "url": (TREND_PATH + ("url", "url"), ""),
+    "impressionId": (TREND_PATH + ("clientEventInfo", "details", "guideDetails", "transparentGuideDetails",
+                                   "trendMetadata", "impressionId"), ""),
+    "relatedTerms": (TREND_PATH + ("clientEventInfo", "details", "guideDetails", "transparentGuideDetails",
+                                   "trendMetadata", "relatedTerms"), []),
+}
+
+# Stands for a missing level of a path, read-only so it can be shared by every lookup
+EMPTY = MappingProxyType({})
+
+# Where the timeline items are while streaming a response with ijson
+STREAM_ITEMS_PREFIX = "timeline.instructions.item.addEntries.entries.item.content.timelineModule.items.item"
+
+
+def compile_extractor(fields=TREND_FIELDS, required=TREND_PATH):
+    """
+    Builds a function that turns one timeline item into a trend dict, or None when `required` is empty.
+    Every intermediate object is looked up once, in the order of the paths, and a missing level
+    is replaced by the shared EMPTY mapping instead of a new placeholder dict.
+    """
+    names = {(): "item"}
+    lines = ["def extract(item, _empty=EMPTY):"]
+
+    def node(path):
+        # Emits the lookup of a path, after the lookups of its parents
+        if path not in names:
+            parent = node(path[:-1])
+            names[path] = f"n{len(names)}"
+            lines.append(f"    {names[path]} = {parent}.get({path[-1]!r}) or _empty")
+        return names[path]
+
+    trend = node(required)
+    lines.append(f"    if not {trend}:")
+    lines.append("        return None")
+
+    values = [
+        f"        {field!r}: {node(path[:-1])}.get({path[-1]!r}, {default!r}),"
+        for field, (path, default) in fields.items()
+    ]
+    lines += ["    return {"] + values + ["    }"]
+
+    namespace = {"EMPTY": EMPTY}
+    exec(compile("\n".join(lines), "<trend extractor>", "exec"), namespace)
+    return namespace["extract"]
+
+
+extract_trend = compile_extractor()
+
+
+def timeline_items(trends_data):
+    """Yields the items of the first addEntries instruction of a timeline."""
+    instructions = (trends_data.get("timeline") or {}).get("instructions") or []
+    for instruction in instructions:
+        if "addEntries" in instruction:
+            for entry in instruction["addEntries"].get("entries") or []:
+                content = entry.get("content") or {}
+                yield from (content.get("timelineModule") or {}).get("items") or []
+            return
+
+
+def parse_trends(trends_data):
+    """Returns the trends of a decoded timeline, in order."""
+    trends = []
+    for item in timeline_items(trends_data):
+        trend = extract_trend(item)
+        if trend is not None:
+            trends.append(trend)
+    return trends
+
+
+def iter_trends(stream):
+    """
+    Yields the trends of a JSON timeline read from a binary file-like object, e.g. a streamed
+    `response.raw`, as soon as each item is decoded. Needs ijson; without it the whole
+    response is decoded first. While streaming, the items of every addEntries instruction
+    are read, the responses only have one.
+    """
+    if ijson is None:
+        logging.warning("ijson is not installed, decoding the whole response before parsing it.")
+        yield from parse_trends(json.load(stream))
+        return
+
+    # ijson yields Decimal for non-integer numbers, which json would have decoded as float
+    for item in ijson.items(stream, STREAM_ITEMS_PREFIX, use_float=True):
+        trend = extract_trend(item)
+        if trend is not None:
+            yield trend
@@ -1,84 +1,144 @@
 import sys
 import os
+import argparse
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import closing
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 # Extend sys path to access the database module
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from database.database import get_db_connection
+from database.database import db_connection, copy_rows, execute_values, is_embedded, refresh_materialized_view
 from scripts.fetch_twitter_data import fetch_twitter_hashtags, fetch_twitter_trends, fetch_twitter_locations
 from scripts.fetch_google_data import fetch_google_trends
+from scripts.trend_parser import parse_trends
+from scripts.response_archive import ResponseArchive, read_archive, archived_time
+from scripts import ingest_metrics
+from frontend.popularity import parse_popularity, parse_popularity_series
 
 # Set up basic logging configuration to suppress all logs except critical errors
 logging.basicConfig(level=logging.CRITICAL)  # Only shows critical errors
 
 GOOGLE_API_URL = "https://google-realtime-trends-data-api.p.rapidapi.com/trends"
 
+# Number of countries whose trends are fetched in parallel. RapidAPI plans throttle
+# per second, so keep the default small; set TREND_FETCH_WORKERS=1 for sequential fetching.
+TREND_FETCH_WORKERS = int(os.getenv("TREND_FETCH_WORKERS", "4"))
 
-def update_google_trends_database(google_data):
+
+def load_google_records(cursor, records, seen_at=None):
+    """Bulk-load Google Trends records with the given cursor.
+
+    Country ids are resolved with one set-based query, missing countries are inserted
+    with one multi-row INSERT, and all keywords are upserted with one multi-row INSERT:
+    a keyword already stored for its country is counted as seen again instead of being added.
+    The keywords are seen at `seen_at`, e.g. the fetch time of a replayed response, or now.
+
+    Returns:
+        int: The number of distinct keywords stored, new or seen again.
+    """
+    # Keep the first record of every country, as it carries the location metadata
+    countries = {}
+    for record in records:
+        country = record.get("country")
+        if country:
+            countries.setdefault(country, record)
+
+    if not countries:
+        return 0
+
+    # Resolve the ids of the countries that are already in the database
+    with ingest_metrics.statement("google_locations.lookup"):
+        cursor.execute(
+            "SELECT country, MIN(id) FROM student.google_locations WHERE country = ANY(%s) GROUP BY country;",
+            (list(countries),)
+        )
+        location_ids = dict(cursor.fetchall())
+
+    new_locations = []
+    for country, record in countries.items():
+        if country in location_ids:
+            continue
+        lastUpdate_str = record.get("lastUpdate", "")
+        scrapedAt_str = record.get("scrapedAt", "")
+
+        lastUpdate_dt = datetime.strptime(lastUpdate_str, "%d-%m-%Y , %H:%M:%S") if lastUpdate_str else None
+        scrapedAt_dt = datetime.fromisoformat(scrapedAt_str.replace("Z", "+00:00")) if scrapedAt_str else None
+
+        new_locations.append((True, "OK", country, lastUpdate_dt, scrapedAt_dt))
+
+    if new_locations:
+        with ingest_metrics.statement("google_locations.insert"):
+            inserted = execute_values(
+                cursor,
+                """
+                INSERT INTO student.google_locations (success, message, country, lastUpdate, scrapedAt)
+                VALUES %s
+                RETURNING id, country;
+                """,
+                new_locations,
+                page_size=len(new_locations),
+                fetch=True
+            )
+        location_ids.update((country, location_id) for location_id, country in inserted)
+
+    # Keywords are stored in lower case, the dashboard shows them in title case, so 'Paella' and 'paella' are one.
+    # A row can only be upserted once per statement, so repeated keywords are dropped first
+    seen_at = seen_at or datetime.now(timezone.utc)
+    keyword_rows = [(location_id, keyword, seen_at, seen_at) for location_id, keyword in dict.fromkeys(
+        (location_ids[record["country"]], keyword.lower())
+        for record in records if record.get("country")
+        for keyword in record.get("keywordsText", [])  # Expecting a list of keywords
+    )]
+
+    if keyword_rows:
+        with ingest_metrics.statement("google_trend.upsert"):
+            execute_values(
+                cursor,
+                """
+                INSERT INTO student.google_trend (google_location_id, keyword, last_updated, first_seen)
+                VALUES %s
+                ON CONFLICT (google_location_id, keyword) DO UPDATE
+                SET last_updated = GREATEST(google_trend.last_updated, EXCLUDED.last_updated),
+                    modified_at = now(),
+                    first_seen = LEAST(google_trend.first_seen, EXCLUDED.first_seen),
+                    seen_count = google_trend.seen_count + 1;
+                """,
+                keyword_rows,
+                page_size=len(keyword_rows)
+            )
+
+    return len(keyword_rows)
+
+
+def update_google_trends_database(google_data, seen_at=None):
     """Update the Google trends data in the database, storing keywords separately.
        Only insert a new google_locations record if the country is not already present.
+       The keywords are seen at `seen_at`, now if None.
     """
     if not google_data:
         logging.warning("No Google Trends data to update.")
-        return
+        return False
 
     try:
         # Handle both dict and list inputs for google_data
         records = google_data.get("data", []) if isinstance(google_data, dict) else google_data
 
-        with get_db_connection() as conn:
+        keywords = sum(len(record.get("keywordsText", [])) for record in records)
+        with db_connection() as conn:
             with closing(conn.cursor()) as cursor:
-                # Query to insert into google_locations table
-                trend_query = """
-                    INSERT INTO student.google_locations (success, message, country, lastUpdate, scrapedAt)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING id;
-                """
-                # Query to insert keywords into google_trend table
-                keyword_query = """
-                    INSERT INTO student.google_trend (google_location_id, keyword)
-                    VALUES (%s, %s);
-                """
-
-                for record in records:
-                    country = record.get("country")
-                    if not country:
-                        # Optionally, skip or handle records without a country
-                        continue
-
-                    # Check if the country already exists
-                    cursor.execute("SELECT id FROM student.google_locations WHERE country = %s", (country,))
-                    result = cursor.fetchone()
-
-                    if result:
-                        # Use the existing id if the country is already in the database
-                        trend_id = result[0]
-                    else:
-                        # Prepare values for insertion
-                        success = True
-                        message = "OK"
-                        lastUpdate_str = record.get("lastUpdate", "")
-                        scrapedAt_str = record.get("scrapedAt", "")
-
-                        lastUpdate_dt = datetime.strptime(lastUpdate_str, "%d-%m-%Y , %H:%M:%S") if lastUpdate_str else None
-                        scrapedAt_dt = datetime.fromisoformat(scrapedAt_str.replace("Z", "+00:00")) if scrapedAt_str else None
-
-                        # Insert a new row and retrieve the new id
-                        cursor.execute(trend_query, (success, message, country, lastUpdate_dt, scrapedAt_dt))
-                        trend_id = cursor.fetchone()[0]
-
-                    # Insert each keyword associated with this google_location_id
-                    keywords = record.get("keywordsText", [])  # Expecting a list of keywords
-                    for keyword in keywords:
-                        cursor.execute(keyword_query, (trend_id, keyword))
-
+                stored = load_google_records(cursor, records, seen_at)
                 conn.commit()
+        # Keywords repeated in the response are skipped
+        ingest_metrics.rows("google_trends", parsed=keywords, inserted=stored, skipped=keywords - stored)
+        return True
 
     except Exception as e:
         logging.error(f"Error updating Google Trends database: {e}")
+        ingest_metrics.failure("google_trends", e)
+        return False
 
 def update_hashflags_database():
     """Fetch and update hashflags data in the database."""
@@ -89,7 +149,7 @@ def update_hashflags_database():
         return
 
     try:
-        with get_db_connection() as conn:
+        with db_connection() as conn, ingest_metrics.statement("twitter_hashflags.upsert"):
             with closing(conn.cursor()) as cursor:  # Automatically closes cursor after usage
                 for tag in hashtags:
                     hashtag = tag["hashtag"]
@@ -107,32 +167,30 @@ def update_hashflags_database():
                         ending_timestamp_ms = EXCLUDED.ending_timestamp_ms,
                         asset_url = EXCLUDED.asset_url,
                         is_hashfetti_enabled = EXCLUDED.is_hashfetti_enabled,
-                        last_updated = CURRENT_TIMESTAMP;
+                        last_updated = now();
                     """
 
                     cursor.execute(query, (hashtag, starting_timestamp_ms, ending_timestamp_ms, asset_url, is_hashfetti_enabled))
 
                 conn.commit()  # Commit the transaction after updating all hashflags
+        ingest_metrics.rows("twitter_hashflags", parsed=len(hashtags), inserted=len(hashtags))
 
     except Exception as e:
         logging.error(f"Error updating hashflags database: {e}")
+        ingest_metrics.failure("twitter_hashflags", e)
 
 
 def update_twitter_locations(locations):
-    """Insert only country-level locations into the database, ignoring invalid ones."""
+    """Insert only country-level locations into the database, ignoring invalid ones.
+       Returns True if the locations were stored.
+    """
     if not locations:
         logging.warning("No locations data to update.")
-        return
+        return False
 
     try:
-        with get_db_connection() as conn:
+        with db_connection() as conn:
             with closing(conn.cursor()) as cursor:
-                query = """
-                INSERT INTO student.twitter_locations (location_id, country_name)
-                VALUES (%s, %s)
-                ON CONFLICT (location_id) DO NOTHING;
-                """
-
                 location_data = []
 
                 for loc in locations:
@@ -150,135 +208,565 @@ def update_twitter_locations(locations):
                             logging.debug(f"Skipping invalid location data: {loc}")
                             continue
 
+                # One row per country, in a single statement; the countries already stored are not returned
+                location_data = list(dict(location_data).items())
+                inserted = []
                 if location_data:
                     logging.info(f"Inserting {len(location_data)} valid country locations into the database")
-                    cursor.executemany(query, location_data)
-                    conn.commit()
+                    with ingest_metrics.statement("twitter_locations.insert"):
+                        inserted = execute_values(
+                            cursor,
+                            """
+                            INSERT INTO student.twitter_locations (location_id, country_name)
+                            VALUES %s
+                            ON CONFLICT (location_id) DO NOTHING
+                            RETURNING location_id;
+                            """,
+                            location_data,
+                            page_size=len(location_data),
+                            fetch=True
+                        )
+                        conn.commit()
 
                 else:
                     logging.warning("No valid country locations to insert")
+        # Locations that are not countries, repeated or already stored are skipped
+        ingest_metrics.rows("twitter_locations", parsed=len(locations), inserted=len(inserted),
+                            skipped=len(locations) - len(inserted))
+        return True
                     
     except Exception as e:
         logging.error(f"Error updating Twitter locations database: {e}")
+        ingest_metrics.failure("twitter_locations", e)
+        return False
+
+
+TREND_COLUMNS = ("trend_name", "position", "meta_description", "domain_context", "url",
+                 "impression_id", "related_terms", "location_id", "popularity")
+
+# Rows updated per statement when backfilling the popularity column
+BACKFILL_BATCH_SIZE = 10000
+
+# How long a successful fetch stays fresh. A refresh skips the sources fetched more recently than this,
+# the trends are tracked per country (source 'twitter_trends:<location_id>').
+SOURCE_MAX_AGE = {
+    "twitter_locations": timedelta(hours=24),
+    "twitter_trends": timedelta(minutes=30),
+    "google_trends": timedelta(minutes=30),
+}
+
+# Directory of the raw response archive. Archiving is off unless it is set here or with --archive.
+INGEST_ARCHIVE_DIR = os.getenv("INGEST_ARCHIVE_DIR", "")
+
+# Directory of the per-run metrics reports (scripts/ingest_metrics.py). Off unless it is set here or with --metrics.
+INGEST_METRICS_DIR = os.getenv("INGEST_METRICS_DIR", "")
 
+# Materialized views ranking the trends for the dashboard panels, refreshed at the end of an ingest
+RANKING_VIEWS = ("student.top_trend_rank", "student.latest_trend_rank")
 
-def update_trends_database(trends, location_id):
-    """Update the Twitter trends data in the database, now with location_id."""
+
+def ensure_observation_partition(cursor, when):
+    """Create the monthly partition of student.twitter_trend_observation that holds `when`, if needed.
+       It runs in the transaction of the load, so a rolled back load leaves no trace. When the partition
+       exists, IF NOT EXISTS returns before the parent table is locked, which keeps it cheap.
+       The embedded backend keeps the observations in a single table.
+    """
+    if is_embedded(cursor):
+        return
+    if when.tzinfo is not None:
+        # e.g. an archived UTC time: observed_at is stored, and the bounds are read, in the session's time zone
+        cursor.execute("SELECT %s::timestamp;", (when,))
+        when = cursor.fetchone()[0]
+    month_start = when.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS student.twitter_trend_observation_{month_start:%Y_%m}
+        PARTITION OF student.twitter_trend_observation
+        FOR VALUES FROM (%s) TO (%s);
+        """,
+        (month_start, next_month)
+    )
+
+
+def observation_time():
+    """Returns the time the trends of an ingest run are observed at, read once from the database so
+       every country of the run shares it. None if the database cannot be reached.
+    """
     try:
-        with get_db_connection() as conn:
+        with db_connection() as conn:
             with closing(conn.cursor()) as cursor:
-                cursor.execute("SELECT trend_name FROM student.twitter_trend WHERE location_id = %s;", (location_id,))
-                existing_trends = {row[0] for row in cursor.fetchall()}
+                cursor.execute("SELECT LOCALTIMESTAMP;")
+                return cursor.fetchone()[0]
+    except Exception as e:
+        logging.error(f"Error reading the database time: {e}")
+        return None
+
+
+def load_trends(cursor, rows, observed_at=None, fetched_at=None):
+    """Bulk-load trend rows into student.twitter_trend through the staging table.
 
-                query = """
-                INSERT INTO student.twitter_trend (trend_name, position, meta_description, domain_context, url, impression_id, related_terms, location_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (trend_name, location_id) DO NOTHING;
-                """  # Avoid duplicate trends per location
+    The rows are bulk-loaded into the staging table (COPY on Postgres) and merged with a single
+    INSERT ... SELECT, so existing trends are skipped by the unique constraint instead
+    of being read back first. TRUNCATE locks the staging table until the transaction
+    ends, which keeps concurrent loads from mixing their rows.
 
-                new_trends = []
+    Every row is also appended to student.twitter_trend_observation, stamped with the
+    time of the run, to keep the history of the trend's popularity.
 
-                for trend in trends:
-                    trend_name = trend.get("trendName")
-                    if trend_name in existing_trends:
-                        continue
+    Args:
+        rows (list): Tuples with the values of TREND_COLUMNS, related_terms as a list.
+        observed_at (datetime): Time of the ingest run, see observation_time(). The time of the load if None.
+        fetched_at (datetime): The last_updated of the new trends, e.g. the fetch time of a replayed response.
+            The time of the load if None.
+    Returns:
+        int: The number of new trends inserted.
+    """
+    columns = ", ".join(TREND_COLUMNS)
+    with ingest_metrics.statement("twitter_trend_staging.truncate"):
+        cursor.execute("TRUNCATE student.twitter_trend_staging;")
+    with ingest_metrics.statement("twitter_trend_staging.copy"):
+        copy_rows(cursor, "student.twitter_trend_staging", TREND_COLUMNS, rows, force_null=("popularity",))
+    with ingest_metrics.statement("twitter_trend.merge"):
+        cursor.execute(f"""
+            INSERT INTO student.twitter_trend ({columns}, last_updated)
+            SELECT DISTINCT ON (trend_name, location_id) {columns}, COALESCE(%s, CURRENT_TIMESTAMP)
+            FROM student.twitter_trend_staging
+            ORDER BY trend_name, location_id, position
+            ON CONFLICT (trend_name, location_id) DO NOTHING;
+        """, (fetched_at,))  # Avoid duplicate trends per location
+        inserted = cursor.rowcount
+
+    if observed_at is None:
+        cursor.execute("SELECT LOCALTIMESTAMP;")
+        observed_at = cursor.fetchone()[0]
+    ensure_observation_partition(cursor, observed_at)
+    with ingest_metrics.statement("twitter_trend_observation.insert"):
+        cursor.execute("""
+            INSERT INTO student.twitter_trend_observation (trend_name, location_id, observed_at, position, meta_description, popularity)
+            SELECT DISTINCT ON (trend_name, location_id) trend_name, location_id, %s, position, meta_description, popularity
+            FROM student.twitter_trend_staging
+            ORDER BY trend_name, location_id, position;
+        """, (observed_at,))
+
+    return inserted
+
+
+def update_trends_database(trends, location_id, observed_at=None, fetched_at=None):
+    """Update the Twitter trends data in the database, now with location_id.
+       The trends are observed at `observed_at`, the time of the ingest run, and new ones
+       are stamped with `fetched_at`; both default to the time of the load.
+       Returns True if the trends were stored.
+    """
+    try:
+        new_trends = []
+
+        for trend in trends:
+            trend_name = trend.get("trendName")
+            if not trend_name:
+                continue
 
-                    position = trend.get("position", 0)
-                    meta_description = trend.get("metaDescription", "")
-                    domain_context = trend.get("domainContext", "")
-                    url = trend.get("url", "")
-                    impression_id = trend.get("impressionId", "")
-                    related_terms = trend.get("relatedTerms", [])
-                    related_terms = "{" + ",".join(f'"{term}"' for term in related_terms) + "}" if related_terms else "{}"
+            position = trend.get("position", 0)
+            meta_description = trend.get("metaDescription", "")
+            domain_context = trend.get("domainContext", "")
+            url = trend.get("url", "")
+            impression_id = trend.get("impressionId", "")
+            related_terms = list(trend.get("relatedTerms") or [])
+            popularity = parse_popularity(meta_description)
+            popularity = None if popularity != popularity else round(popularity)  # NaN when there is no number
 
-                    new_trends.append((trend_name, position, meta_description, domain_context, url, impression_id, related_terms, location_id))
+            new_trends.append((trend_name, position, meta_description, domain_context, url, impression_id, related_terms, location_id, popularity))
 
-                if new_trends:
-                    cursor.executemany(query, new_trends)
+        if not new_trends:
+            ingest_metrics.rows("twitter_trends", parsed=len(trends), skipped=len(trends))
+            return True
 
+        with db_connection() as conn:
+            with closing(conn.cursor()) as cursor:
+                inserted = load_trends(cursor, new_trends, observed_at, fetched_at)
                 conn.commit()
+        # Trends without a name, repeated in the response or already stored are skipped
+        ingest_metrics.rows("twitter_trends", parsed=len(trends), inserted=inserted, skipped=len(trends) - inserted)
+        return True
 
     except Exception as e:
         logging.error(f"Error updating trends database: {e}")
+        ingest_metrics.failure("twitter_trends", e, location_id)
+        return False
+
+
+def backfill_trend_popularity():
+    """Fill the popularity column of trends stored before it was parsed at ingest.
+
+    The trends are read and updated BACKFILL_BATCH_SIZE at a time, in id order, so the
+    whole table is never held in memory. Updated rows get a new modified_at, which makes
+    the dashboard snapshots pick them up.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    updated = 0
+    last_id = 0
+    try:
+        with db_connection() as conn:
+            with closing(conn.cursor()) as cursor:
+                while True:
+                    cursor.execute(
+                        "SELECT id, meta_description FROM student.twitter_trend "
+                        "WHERE id > %s AND popularity IS NULL "
+                        "AND regexp_replace(meta_description, '[^0-9]', '', 'g') <> '' "
+                        "ORDER BY id LIMIT %s;",
+                        (last_id, BACKFILL_BATCH_SIZE)
+                    )
+                    batch = cursor.fetchall()
+                    if not batch:
+                        break
+                    last_id = batch[-1][0]  # The next batch starts after this one, even if some of its rows stay NULL
+
+                    values = parse_popularity_series([meta_description for _, meta_description in batch])
+                    updates = [(row[0], round(value)) for row, value in zip(batch, values) if value == value]
+                    if updates:
+                        execute_values(
+                            cursor,
+                            """
+                            UPDATE student.twitter_trend AS t SET popularity = v.popularity, modified_at = now()
+                            FROM (VALUES %s) AS v (id, popularity)
+                            WHERE t.id = v.id;
+                            """,
+                            updates,
+                            page_size=len(updates)
+                        )
+                        updated += len(updates)
+                    conn.commit()
+
+    except Exception as e:
+        logging.error(f"Error backfilling trend popularity: {e}")
+
+    return updated
 
 
 def parse_trends_data(trends_data):
-    """Parse the trends data returned from Twitter."""
+    """Parse the trends data returned from Twitter, walking every timeline item once."""
     if not trends_data:
         logging.error("No trends data to parse.")
         return []  # Return an empty list or handle as appropriate.
 
-    parsed_trends = []
-    timeline_data = trends_data.get("timeline", {})
-    instructions = timeline_data.get("instructions", [])
+    return parse_trends(trends_data)
 
-    entries = []
-    for instruction in instructions:
-        if "addEntries" in instruction:
-            entries = instruction["addEntries"].get("entries", [])
-            break
 
-    if not entries:
-        return parsed_trends
+def load_watermark_ages():
+    """Returns how long ago every source was last fetched successfully, as {source: timedelta}."""
+    try:
+        with db_connection() as conn:
+            with closing(conn.cursor()) as cursor:
+                with ingest_metrics.statement("ingest_watermark.read"):
+                    cursor.execute("SELECT source, LOCALTIMESTAMP - last_success FROM student.ingest_watermark;")
+                    return dict(cursor.fetchall())
+    except Exception as e:
+        logging.error(f"Error reading ingest watermarks: {e}")
+        return {}
 
-    for entry in entries:
-        content = entry.get("content", {})
-        trend = content.get("timelineModule", {}).get("items", [])
 
-        for item in trend:
-            trend_data = item.get("item", {}).get("content", {}).get("trend", {})
+def record_watermark(source):
+    """Marks a source as successfully fetched now."""
+    try:
+        with db_connection() as conn, ingest_metrics.statement("ingest_watermark.upsert"):
+            with closing(conn.cursor()) as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO student.ingest_watermark (source, last_success)
+                    VALUES (%s, LOCALTIMESTAMP)
+                    ON CONFLICT (source) DO UPDATE SET last_success = EXCLUDED.last_success;
+                    """,
+                    (source,)
+                )
+                conn.commit()
+    except Exception as e:
+        logging.error(f"Error recording the watermark of {source}: {e}")
 
-            if trend_data:
-                parsed_trends.append({
-                    "trendName": trend_data.get("name"),
-                    "position": item.get("item", {}).get("clientEventInfo", {}).get("details", {}).get("guideDetails", {}).get("transparentGuideDetails", {}).get("trendMetadata", {}).get("position", 0),
-                    "metaDescription": trend_data.get("trendMetadata", {}).get("metaDescription", ""),
-                    "domainContext": trend_data.get("trendMetadata", {}).get("domainContext", ""),
-                    "url": trend_data.get("url", {}).get("url", ""),
-                    "impressionId": trend_data.get("clientEventInfo", {}).get("details", {}).get("guideDetails", {}).get("transparentGuideDetails", {}).get("trendMetadata", {}).get("impressionId", ""),
-                    "relatedTerms": trend_data.get("clientEventInfo", {}).get("details", {}).get("guideDetails", {}).get("transparentGuideDetails", {}).get("trendMetadata", {}).get("relatedTerms", [])
-                })
 
-    return parsed_trends
+def is_fresh(watermark_ages, source):
+    """Checks whether a source was fetched recently enough to be skipped."""
+    age = watermark_ages.get(source)
+    return age is not None and age < SOURCE_MAX_AGE[source.split(":")[0]]
 
 
-def main():
-    """Main function to update locations, Twitter trends, and Google trends data."""
-    
-    # Fetch and update Twitter locations
-    locations = fetch_twitter_locations()
-    if locations:
-        update_twitter_locations(locations)
-    else:
-        logging.error("Failed to fetch Twitter locations.")
+def load_stored_locations():
+    """Returns the country locations already in the database, shaped like the Locations API response."""
+    try:
+        with db_connection() as conn:
+            with closing(conn.cursor()) as cursor:
+                cursor.execute("SELECT location_id, country_name FROM student.twitter_locations;")
+                return [
+                    {"place_id": location_id, "name": country_name, "location_type": "Country"}
+                    for location_id, country_name in cursor.fetchall()
+                ]
+    except Exception as e:
+        logging.error(f"Error reading stored Twitter locations: {e}")
+        return []
 
-    # Fetch and update Twitter trends per location
-    if locations:
-        for location in locations:
-            location_id = location.get("place_id")
-            location_type = location.get("location_type")  # Ensure it's a country
 
-            if not location_id or location_type != "Country":
-                logging.warning(f"Skipping invalid location: {location}")  # Debugging message
-                continue  # Skip invalid locations
+def no_progress(stage, done, total):
+    """Default progress callback of main(), which reports nothing."""
 
-            trends_data = fetch_twitter_trends(location_id)
-    
-            if isinstance(trends_data, dict) and "status" in trends_data and trends_data["status"] is False:
-                logging.error(f"Error fetching trends for {location.get('name')}: {trends_data.get('message')}")
-                continue  # Skip locations that result in API errors
 
-            parsed_trends = parse_trends_data(trends_data)
+def archive_response(archive, source, location, response):
+    """Keeps a raw response in the archive of the run, if there is one."""
+    if archive is not None and response is not None:
+        archive.record(source, location, response)
+
+
+def trends_from_response(location, trends_data):
+    """Parse the trends of a Trends API response.
+
+    Returns:
+        list: The parsed trends, or None if the request failed.
+    """
+    if not trends_data:
+        ingest_metrics.failure("twitter_trends", "The request failed", location.get("place_id"))
+        return None
+
+    if isinstance(trends_data, dict) and "status" in trends_data and trends_data["status"] is False:
+        logging.error(f"Error fetching trends for {location.get('name')}: {trends_data.get('message')}")
+        ingest_metrics.failure("twitter_trends", trends_data.get("message"), location.get("place_id"))
+        return None  # Skip locations that result in API errors
+
+    with ingest_metrics.parse("twitter_trends"):
+        return parse_trends_data(trends_data)
+
+
+def fetch_location_trends(location, archive=None):
+    """Fetch and parse the trends of a single country-level location.
+
+    Returns:
+        list: The parsed trends, or None if the request failed.
+    """
+    location_id = location.get("place_id")
+    trends_data = fetch_twitter_trends(location_id)
+    archive_response(archive, "twitter_trends", location_id, trends_data)
+
+    return trends_from_response(location, trends_data)
+
+
+def update_all_trends(locations, max_workers=TREND_FETCH_WORKERS, watermark_ages=None, progress=no_progress,
+                      archive=None, observed_at=None):
+    """Fetch the trends of every country concurrently and store each one as soon as it arrives.
+
+    Requests run on a bounded thread pool of `max_workers` threads, while the database
+    writes stay on the calling thread so only one connection is used at a time.
+    Countries whose watermark is still fresh are skipped. Every country is observed at `observed_at`.
+
+    Returns:
+        int: Number of countries whose trends were stored.
+    """
+    watermark_ages = watermark_ages or {}
+    countries = []
+    for location in locations:
+        location_id = location.get("place_id")
+        location_type = location.get("location_type")  # Ensure it's a country
+
+        if not location_id or location_type != "Country":
+            logging.warning(f"Skipping invalid location: {location}")  # Debugging message
+            continue  # Skip invalid locations
+
+        if is_fresh(watermark_ages, f"twitter_trends:{location_id}"):
+            continue  # Fetched recently enough
+
+        countries.append(location)
+
+    stored = 0
+    progress("Twitter trends", 0, len(countries))
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(fetch_location_trends, location, archive): location for location in countries}
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            location = futures[future]
+            try:
+                parsed_trends = future.result()
+            except Exception as e:
+                logging.error(f"Error fetching trends for {location.get('name')}: {e}")
+                ingest_metrics.failure("twitter_trends", e, location.get("place_id"))
+                parsed_trends = None
+
+            if parsed_trends is not None and update_trends_database(parsed_trends, location.get("place_id"), observed_at):
+                record_watermark(f"twitter_trends:{location.get('place_id')}")
+                stored += 1
+
+            progress("Twitter trends", done, len(countries))
+
+    return stored
+
+
+def refresh_rankings():
+    """Recomputes the dashboard rankings from the stored trends.
+       CONCURRENTLY keeps the views readable by the dashboard while they are rebuilt.
+    """
+    try:
+        with db_connection() as conn:
+            with closing(conn.cursor()) as cursor:
+                for view in RANKING_VIEWS:
+                    with ingest_metrics.statement(f"{view.split('.')[-1]}.refresh"):
+                        refresh_materialized_view(cursor, view)
+                        conn.commit()
+        return True
+    except Exception as e:
+        logging.error(f"Error refreshing the trend rankings: {e}")
+        ingest_metrics.failure("rankings", e)
+        return False
+
+
+def main(max_workers=TREND_FETCH_WORKERS, incremental=True, progress=no_progress, archive_dir=INGEST_ARCHIVE_DIR,
+         metrics_dir=INGEST_METRICS_DIR):
+    """Main function to update locations, Twitter trends, and Google trends data.
+
+    Args:
+        max_workers (int): Number of countries whose trends are fetched in parallel.
+        incremental (bool): Skip the sources whose last successful fetch is still fresh.
+        progress (callable): Called with (stage, done, total) as the refresh advances.
+        archive_dir (str): Directory where the raw responses are archived, none when empty.
+        metrics_dir (str): Directory where the metrics report of the run is written, none when empty.
+    Returns:
+        dict: The metrics report of the run.
+    """
+    archive = ResponseArchive(archive_dir) if archive_dir else None
+    run = ingest_metrics.start_run("ingest")
+    try:
+        watermark_ages = load_watermark_ages() if incremental else {}
+
+        # Fetch and update Twitter locations, or reuse the stored ones while they are fresh
+        progress("Twitter locations", 0, 1)
+        with ingest_metrics.stage("twitter_locations"):
+            if is_fresh(watermark_ages, "twitter_locations"):
+                locations = load_stored_locations()
+            else:
+                locations = fetch_twitter_locations()
+                archive_response(archive, "twitter_locations", None, locations)
+                if locations:
+                    if update_twitter_locations(locations):
+                        record_watermark("twitter_locations")
+                else:
+                    logging.error("Failed to fetch Twitter locations.")
+                    ingest_metrics.failure("twitter_locations", "The request failed")
+
+        # Fetch and update Twitter trends per location, all observed at the time of the run
+        stored = 0
+        if locations:
+            with ingest_metrics.stage("twitter_trends"):
+                stored = update_all_trends(locations, max_workers=max_workers, watermark_ages=watermark_ages,
+                                           progress=progress, archive=archive, observed_at=observation_time())
     
+        # Fetch and update Google trends
+        progress("Google trends", 0, 1)
+        if not is_fresh(watermark_ages, "google_trends"):
+            with ingest_metrics.stage("google_trends"):
+                google_data = fetch_google_trends()
+                archive_response(archive, "google_trends", None, google_data)
+                if not google_data:
+                    logging.error("Failed to fetch Google Trends data.")
+                    ingest_metrics.failure("google_trends", "The request failed")
+                elif update_google_trends_database(google_data):  # Records its own failure
+                    record_watermark("google_trends")
+        progress("Google trends", 1, 1)
+
+        # Rank the new trends for the dashboard
+        if stored or not incremental:
+            progress("Rankings", 0, 1)
+            with ingest_metrics.stage("rankings"):
+                refresh_rankings()
+            progress("Rankings", 1, 1)
+    finally:
+        if archive is not None:
+            archive.close()
+        report = finish_metrics(run, metrics_dir)
+    return report
+
+
+def finish_metrics(run, metrics_dir):
+    """Ends the metrics of a run and writes its report, if there is a directory for it."""
+    report = ingest_metrics.finish_run(run)
+    if metrics_dir:
+        try:
+            logging.info(f"Wrote the ingest metrics to {ingest_metrics.write_report(report, metrics_dir)}")
+        except OSError as e:
+            logging.error(f"Error writing the ingest metrics: {e}")
+    return report
+
+
+def replay_archive(paths, metrics_dir=INGEST_METRICS_DIR):
+    """Loads archived responses through the same parsing and update functions as a live run,
+    at full speed and without any request. Watermarks are left as they are.
+
+    Args:
+        paths (list): Archive files, or directories of archive files.
+        metrics_dir (str): Directory where the metrics report of the replay is written, none when empty.
+    Returns:
+        dict: Number of responses and trends replayed, and the seconds it took.
+    """
+    start = time.perf_counter()
+    run = ingest_metrics.start_run("replay")
+    try:
+        with ingest_metrics.stage("replay"):
+            responses, trends = replay_records(read_archive(paths))
+        if trends:
+            with ingest_metrics.stage("rankings"):
+                refresh_rankings()
+    finally:
+        finish_metrics(run, metrics_dir)
+    return {"responses": responses, "trends": trends, "seconds": time.perf_counter() - start}
+
+
+def replay_records(records):
+    """Loads archived records, and returns the number of responses and trends loaded.
+
+    The trends and keywords are stamped with the time they were fetched, and the trends are
+    observed at the start time of their run, as they were by the live run.
+    """
+    responses = trends = 0
+    for record in records:
+        source, location, response = record["source"], record["location"], record["response"]
+        fetched_at = archived_time(record.get("fetched_at"))
+        # Archives written before the start time of the run was recorded only have the fetch time
+        observed_at = archived_time(record.get("run_started_at")) or fetched_at
+        if source == "twitter_locations":
+            update_twitter_locations(response)
+        elif source == "twitter_trends":
+            parsed_trends = trends_from_response({"place_id": location, "name": location}, response)
             if parsed_trends:
-                update_trends_database(parsed_trends, location_id)
-    
-    # Fetch and update Google trends
-    google_data = fetch_google_trends()
-    if google_data:
-        update_google_trends_database(google_data)
-    else:
-        logging.error("Failed to fetch or update Google Trends data.")
+                update_trends_database(parsed_trends, location, observed_at, fetched_at)
+                trends += len(parsed_trends)
+        elif source == "google_trends":
+            update_google_trends_database(response, fetched_at)
+        else:
+            logging.warning(f"Skipping archived response of unknown source {source}")
+            continue
+        responses += 1
+    return responses, trends
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Fetch the latest trends and update the database.")
+    parser.add_argument("--workers", type=int, default=TREND_FETCH_WORKERS,
+                        help="number of countries to fetch in parallel (default: %(default)s)")
+    parser.add_argument("--full", action="store_true",
+                        help="fetch every source, even those fetched recently")
+    parser.add_argument("--archive", metavar="DIR", default=INGEST_ARCHIVE_DIR,
+                        help="write the raw API responses of the run to a compressed archive file in DIR")
+    parser.add_argument("--metrics", metavar="DIR", default=INGEST_METRICS_DIR,
+                        help="write a JSON and a Prometheus report of the run's timings to DIR")
+    parser.add_argument("--replay", metavar="PATH", nargs="+",
+                        help="load archived responses from files or directories instead of calling the APIs")
+    parser.add_argument("--backfill-popularity", action="store_true",
+                        help="fill the popularity column of existing trends instead of fetching new data")
+    args = parser.parse_args()
+
+    if args.backfill_popularity:
+        backfilled = backfill_trend_popularity()
+        if backfilled:
+            refresh_rankings()  # The Top-10 ranks the trends by popularity
+        print(f"Backfilled the popularity of {backfilled} trends.")
+    elif args.replay:
+        stats = replay_archive(args.replay, metrics_dir=args.metrics)
+        print(f"Replayed {stats['responses']} responses ({stats['trends']} trends) in {stats['seconds']:.2f}s, "
+              f"{stats['trends'] / max(stats['seconds'], 1e-9):.0f} trends/s.")
+    else:
+        main(max_workers=args.workers, incremental=not args.full, archive_dir=args.archive, metrics_dir=args.metrics)
@@ -0,0 +1,62 @@
+import gc
+import unittest
+import weakref
+from unittest.mock import patch
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from frontend import charts, explorations
+
+
+def make_growth(trends):
+    points = explorations.TREND_GROWTH_POINTS
+    times = np.tile(pd.date_range('2025-01-01', periods=points, freq='h').to_numpy(), (len(trends), 1))
+    popularity = np.arange(len(trends) * points, dtype=float).reshape(len(trends), points)
+    return explorations.GrowthSeries((42, 0), list(trends), times, popularity,
+                                     {trend: row for row, trend in enumerate(trends)})
+
+
+class TestCharts(unittest.TestCase):
+
+    def setUp(self):
+        charts.growth_chart.clear()
+        self.addCleanup(charts.growth_chart.clear)
+
+    def test_draw_growth_chart_frees_its_figure(self):
+        figures = []
+        original_init = Figure.__init__
+
+        def track(figure, *args, **kwargs):
+            original_init(figure, *args, **kwargs)
+            figures.append(weakref.ref(figure))
+
+        with patch.object(Figure, '__init__', track):
+            png = charts.draw_growth_chart(make_growth(['#A', '#B']), ('#A', '#B'))
+
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        gc.collect()
+        self.assertEqual(len(figures), 1)
+        self.assertIsNone(figures[0]())
+        self.assertEqual(plt.get_fignums(), [])  # Nothing is left in pyplot's registry
+
+    @patch('frontend.charts.draw_growth_chart', return_value=b'png')
+    @patch('frontend.charts.load_growth_series')
+    def test_growth_chart_is_rendered_once_per_key(self, mock_growth, mock_draw):
+        mock_growth.return_value = make_growth(['#A', '#B'])
+
+        charts.growth_chart(('#A',), (42, 0))
+        charts.growth_chart(('#A',), (42, 0))
+        self.assertEqual(mock_draw.call_count, 1)
+
+        # Another selection, data version or size is another chart
+        charts.growth_chart(('#A', '#B'), (42, 0))
+        charts.growth_chart(('#A',), (43, 0))
+        charts.growth_chart(('#A',), (42, 0), size=(5, 3))
+        self.assertEqual(mock_draw.call_count, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,14 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import logging
+import threading
+import time
 
 # Assuming the functions are in a module named `db_script.py`
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR
+
+from database import database
 from database.database import get_db_connection, execute_schema
 
 
@@ -83,3 +89,95 @@ def test_execute_schema_success(self, mock_open, mock_exists, mock_connect):
         mock_exists.return_value = True
         mock_open.return_value.__enter__.return_value.read.return_value = "CREATE TABLE test (id INT);"
         mock_cursor.exe
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        database.close_pool()
+
+    def tearDown(self):
+        database.close_pool()
+
+    @patch('psycopg2.pool.ThreadedConnectionPool')
+    def test_db_connection_returns_connection_to_pool(self, mock_pool_class):
+        """Test that a lent connection goes back to the pool."""
+        mock_pool = mock_pool_class.return_value
+        mock_conn = MagicMock(closed=0)
+        mock_conn.get_transaction_status.return_value = TRANSACTION_STATUS_IDLE
+        mock_pool.getconn.return_value = mock_conn
+
+        with database.db_connection() as conn:
+            self.assertIs(conn, mock_conn)
+
+        mock_pool_class.assert_called_once()
+        mock_pool.putconn.assert_called_once_with(mock_conn, close=False)
+
+        # The pool is created once and reused
+        with database.db_connection():
+            pass
+        mock_pool_class.assert_called_once()
+
+    @patch('psycopg2.pool.ThreadedConnectionPool')
+    def test_db_connection_replaces_broken_connection(self, mock_pool_class):
+        """Test that a closed connection is discarded instead of being lent."""
+        mock_pool = mock_pool_class.return_value
+        broken_conn = MagicMock(closed=1)
+        good_conn = MagicMock(closed=0)
+        good_conn.get_transaction_status.return_value = TRANSACTION_STATUS_IDLE
+        mock_pool.getconn.side_effect = [broken_conn, good_conn]
+
+        with database.db_connection() as conn:
+            self.assertIs(conn, good_conn)
+
+        mock_pool.putconn.assert_any_call(broken_conn, close=True)
+
+    @patch('psycopg2.pool.ThreadedConnectionPool')
+    def test_db_connection_checks_the_replacement_connection(self, mock_pool_class):
+        """Test that the connection taken after a broken one is checked too."""
+        mock_pool = mock_pool_class.return_value
+        broken_conn = MagicMock(closed=1)
+        stale_conn = MagicMock(closed=0)
+        stale_conn.cursor.side_effect = psycopg2.OperationalError("server closed the connection")
+        good_conn = MagicMock(closed=0)
+        good_conn.get_transaction_status.return_value = TRANSACTION_STATUS_IDLE
+        mock_pool.getconn.side_effect = [broken_conn, stale_conn, good_conn]
+
+        with database.db_connection() as conn:
+            self.assertIs(conn, good_conn)
+
+        mock_pool.putconn.assert_any_call(stale_conn, close=True)
+
+    @patch('psycopg2.pool.ThreadedConnectionPool')
+    def test_pool_is_created_once_on_a_cold_start(self, mock_pool_class):
+        """Test that threads starting at once share one pool instead of replacing each other's."""
+        def connect(*args, **kwargs):
+            time.sleep(0.05)  # Connecting takes a while, long enough for the threads to overlap
+            return MagicMock()
+        mock_pool_class.side_effect = connect
+
+        pools = []
+        threads = [threading.Thread(target=lambda: pools.append(database.get_pool())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_pool_class.assert_called_once()
+        self.assertEqual(len({id(pool) for pool in pools}), 1)
+        pools[0].connections.closeall.assert_not_called()
+
+    @patch('psycopg2.pool.ThreadedConnectionPool')
+    def test_db_connection_rolls_back_on_error(self, mock_pool_class):
+        """Test that uncommitted work is rolled back before the connection is returned."""
+        mock_pool = mock_pool_class.return_value
+        mock_conn = MagicMock(closed=0)
+        mock_conn.get_transaction_status.return_value = TRANSACTION_STATUS_INERROR
+        mock_pool.getconn.return_value = mock_conn
+
+        with self.assertRaises(ValueError):
+            with database.db_connection():
+                raise ValueError("query failed")
+
+        mock_conn.rollback.assert_called()
+        mock_pool.putconn.assert_called_once_with(mock_conn, close=False)
@@ -0,0 +1,203 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from database import database, duckdb_backend
+from frontend import transformation
+from scripts import ingest_metrics, update_database
+
+
+@unittest.skipIf(not duckdb_backend.available(), "duckdb is not installed")
+class TestDuckDBBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        settings = {"DB_BACKEND": "duckdb", "DB_DUCKDB_PATH": os.path.join(self.directory.name, "test.duckdb")}
+        for patcher in (patch.dict(os.environ, settings), patch('frontend.snapshot_cache.SNAPSHOT_DIR', '')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        duckdb_backend.close_databases()
+        self.directory.cleanup()
+
+    def test_translate_placeholders(self):
+        self.assertEqual(duckdb_backend.translate("a = %s AND b = ANY(%(names)s) AND c LIKE '1%%'"),
+                         "a = ? AND b = ANY($names) AND c LIKE '1%'")
+
+    def test_uncommitted_work_is_rolled_back(self):
+        with database.db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("INSERT INTO student.twitter_locations VALUES (%s, %s), (%s, %s);",
+                               ("1", "Spain", "2", "Italy"))
+                self.assertEqual(cursor.rowcount, 2)
+                cursor.execute("INSERT INTO student.twitter_locations VALUES (%s, %s);", ("3", "Chad"))
+            conn.commit()
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM student.twitter_locations;")
+
+        with database.db_connection() as conn:
+            frame = database.read_frame(conn, "SELECT country_name FROM student.twitter_locations ORDER BY 1;")
+        self.assertEqual(list(frame["country_name"]), ["Chad", "Italy", "Spain"])
+
+    def test_ingest_and_rankings(self):
+        update_database.update_twitter_locations([
+            {"place_id": "1", "name": "Spain", "location_type": "Country"},
+            {"place_id": "2", "name": "Italy", "location_type": "Country"},
+        ])
+        trends = [
+            {"trendName": "#Paella", "position": 1, "metaDescription": "1.5M posts",
+             "domainContext": "Food · Trending", "relatedTerms": ["rice", 'say "hi"']},
+            {"trendName": "#Siesta", "position": 2, "metaDescription": "20K posts", "domainContext": "Lifestyle"},
+        ]
+        self.assertTrue(update_database.update_trends_database(trends, "1"))
+        self.assertTrue(update_database.update_trends_database(trends[:1], "2"))
+        self.assertTrue(update_database.update_trends_database(trends, "1"))  # Already stored, skipped
+        self.assertTrue(update_database.update_google_trends_database(
+            {"data": [{"country": "Spain", "scrapedAt": "2025-03-14T12:30:00.000Z",
+                       "keywordsText": ["el clásico", "paella"]}]}))
+        self.assertTrue(update_database.refresh_rankings())
+
+        stored = transformation.transform_twitter_trend()
+        self.assertEqual(len(stored), 3)
+        self.assertEqual(list(stored["domain_context"]), ["Food", "Lifestyle", "Food"])
+        with database.db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT related_terms FROM student.twitter_trend WHERE id = 1;")
+            self.assertEqual(cursor.fetchone()[0], ["rice", 'say "hi"'])
+
+        ranked = transformation.transform_top_trend_rank(countries=["spain"])
+        self.assertEqual(list(ranked["trend"]), ["#Paella", "#Siesta"])
+        self.assertEqual(list(ranked["popularity"]), [1500000, 20000])
+        latest = transformation.transform_latest_trends("Food")
+        self.assertEqual(list(latest["trend"]), ["#Paella"])
+        self.assertEqual(list(transformation.transform_google_trend()["trend"]), ["El Clásico", "Paella"])
+        self.assertEqual(len(transformation.transform_trend_observations(7)), 0)  # Seen fewer than 4 times
+
+    def test_google_keywords_are_counted_not_appended(self):
+        for keywords in (["paella", "futbol"], ["Paella", "futbol"], ["PAELLA", "Futbol"]):
+            self.assertTrue(update_database.update_google_trends_database(
+                {"data": [{"country": "Spain", "scrapedAt": "2025-03-14T12:30:00.000Z", "keywordsText": keywords}]}))
+
+        with database.db_connection() as conn:
+            frame = database.read_frame(
+                conn, "SELECT keyword, seen_count, first_seen <= last_updated AS ordered "
+                      "FROM student.google_trend ORDER BY keyword;")
+        self.assertEqual(list(frame["keyword"]), ["futbol", "paella"])
+        self.assertEqual(list(frame["seen_count"]), [3, 3])
+        self.assertTrue(frame["ordered"].all())
+
+    def test_existing_google_keywords_are_compacted(self):
+        # Keywords appended by every refresh, before they were unique
+        with database.db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("DROP INDEX student.google_trend_keyword_idx;")
+            conn.commit()
+            cursor.execute("INSERT INTO student.google_locations (id, country) VALUES (1, 'Spain');")
+            cursor.execute("""
+                INSERT INTO student.google_trend (google_location_id, keyword, last_updated, first_seen, seen_count)
+                VALUES (1, 'paella', '2025-01-01', NULL, 1), (1, 'Paella', '2025-01-03', NULL, 1),
+                       (1, 'paella', '2025-01-02', NULL, 1), (1, 'Futbol', '2025-01-02', NULL, 1);
+            """)
+            conn.commit()
+        duckdb_backend.close_databases()  # The compaction runs when the database is opened again
+
+        with database.db_connection() as conn:
+            frame = database.read_frame(
+                conn, "SELECT id, keyword, first_seen, last_updated, seen_count FROM student.google_trend ORDER BY id;")
+        self.assertEqual(list(frame["keyword"]), ["paella", "futbol"])
+        self.assertEqual(list(frame["seen_count"]), [3, 1])
+        self.assertEqual(list(frame["first_seen"].dt.strftime("%Y-%m-%d")), ["2025-01-01", "2025-01-02"])
+        self.assertEqual(list(frame["last_updated"].dt.strftime("%Y-%m-%d")), ["2025-01-03", "2025-01-02"])
+
+    def test_locations_already_stored_are_counted_as_skipped(self):
+        locations = [{"place_id": "1", "name": "Spain", "location_type": "Country"},
+                     {"place_id": "2", "name": "Italy", "location_type": "Country"},
+                     {"place_id": "2", "name": "Italy", "location_type": "Country"},  # Repeated in the response
+                     {"place_id": "9", "name": "Madrid", "location_type": "Town"}]
+        self.assertTrue(update_database.update_twitter_locations(locations[:1]))
+
+        run = ingest_metrics.start_run()
+        self.assertTrue(update_database.update_twitter_locations(locations))
+        report = ingest_metrics.finish_run(run)
+
+        self.assertEqual(report["rows"]["twitter_locations"], {"parsed": 4, "inserted": 1, "skipped": 3})
+        with database.db_connection() as conn:
+            frame = database.read_frame(conn, "SELECT location_id FROM student.twitter_locations ORDER BY 1;")
+        self.assertEqual(list(frame["location_id"]), ["1", "2"])
+
+    @patch('scripts.update_database.BACKFILL_BATCH_SIZE', 2)
+    def test_popularity_is_backfilled_in_batches(self):
+        # Trends stored before the popularity was parsed at ingest
+        with database.db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO student.twitter_trend (trend_name, position, meta_description, location_id, modified_at)
+                VALUES ('#A', 1, '1.5M posts', '1', '2025-01-01'), ('#B', 2, '2 in 3 days', '1', '2025-01-01'),
+                       ('#C', 3, '', '1', '2025-01-01'), ('#D', 4, '20K posts', '1', '2025-01-01'),
+                       ('#E', 5, '7 posts', '1', '2025-01-01');
+            """)
+            conn.commit()
+
+        self.assertEqual(update_database.backfill_trend_popularity(), 4)
+
+        with database.db_connection() as conn:
+            frame = database.read_frame(
+                conn, "SELECT trend_name, popularity, modified_at > '2025-01-01' AS modified "
+                      "FROM student.twitter_trend ORDER BY id;")
+        self.assertEqual(list(frame["popularity"].fillna(-1)), [1500000, 2, -1, 20000, 7])
+        # The updated rows reach the snapshots, which sync on modified_at
+        self.assertEqual(list(frame["modified"]), [True, True, False, True, True])
+
+
+
+class TestSettings(unittest.TestCase):
+
+    @patch('database.database.st')
+    def test_setting_prefers_environment(self, mock_st):
+        mock_st.secrets.get.return_value = "secret-host"
+
+        with patch.dict(os.environ, {"DB_HOST": "env-host"}):
+            self.assertEqual(database.setting("DB_HOST"), "env-host")
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(database.setting("DB_HOST"), "secret-host")
+
+    @patch('database.database.st')
+    def test_exported_setting_wins_over_the_secret_copied_over_it(self, mock_st):
+        secrets = {"DB_NAME": "postgres", "DB_HOST": "secret-host"}
+
+        def read_secret(name):
+            # Like Streamlit, the first read copies every top-level secret into os.environ
+            os.environ.update(secrets)
+            return secrets.get(name)
+        mock_st.secrets.get.side_effect = read_secret
+
+        with patch.dict(os.environ, {"DB_NAME": "exported"}, clear=True), \
+                patch('database.database._started_with', {"DB_NAME": "exported"}):
+            self.assertEqual(database.backend(), database.POSTGRES)  # Reads the secrets, DB_BACKEND is not set
+            self.assertEqual(os.environ["DB_NAME"], "postgres")
+            self.assertEqual(database.setting("DB_NAME"), "exported")
+            self.assertEqual(database.setting("DB_HOST"), "secret-host")
+
+    @patch('database.database.st')
+    def test_database_identity_names_the_backend_and_database(self, mock_st):
+        mock_st.secrets.get.return_value = None
+        postgres = {"DB_HOST": "db", "DB_PORT": "5432", "DB_NAME": "nowtrending"}
+
+        with patch.dict(os.environ, postgres, clear=True):
+            self.assertEqual(database.database_identity(), "postgres://db:5432/nowtrending")
+        with patch.dict(os.environ, {**postgres, "DB_NAME": "other"}, clear=True):
+            self.assertEqual(database.database_identity(), "postgres://db:5432/other")
+        with patch.dict(os.environ, {"DB_BACKEND": "duckdb", "DB_DUCKDB_PATH": "/data/a.duckdb"}, clear=True):
+            self.assertEqual(database.database_identity(), "duckdb:///data/a.duckdb")
+
+    @patch('database.database.st')
+    def test_setting_without_secrets_file(self, mock_st):
+        mock_st.secrets.get.side_effect = FileNotFoundError("no secrets.toml")
+
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(database.setting("DB_BACKEND", database.POSTGRES), database.POSTGRES)
+            with self.assertRaises(KeyError):
+                database.setting("DB_HOST")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from frontend import explorations
+
+
+class TestExplorationsCache(unittest.TestCase):
+
+    def setUp(self):
+        explorations.clear_cache()
+
+    def tearDown(self):
+        explorations.clear_cache()
+
+    @patch('frontend.explorations.transform_google_trend')
+    @patch('frontend.explorations.transform_google_locations')
+    def test_results_are_cached_until_cleared(self, mock_locations, mock_trend):
+        mock_locations.side_effect = lambda: pd.DataFrame({'id': [1], 'country': ['spain']})
+        mock_trend.return_value = pd.DataFrame({'google_location_id': [1], 'trend': ['Paella'],
+                                                'last_updated': [pd.Timestamp('2025-01-01')]})
+
+        first = explorations.google_loc()
+        second = explorations.google_loc()
+
+        # The second call is served from the cache
+        self.assertEqual(mock_locations.call_count, 1)
+        pd.testing.assert_frame_equal(first, second)
+
+        # Callers get their own copy, so changing one does not change the cache
+        second['Country'] = 'changed'
+        self.assertEqual(explorations.google_loc()['Country'].iloc[0], 'spain')
+
+        # A refresh drops the cached result
+        explorations.clear_cache()
+        explorations.google_loc()
+        self.assertEqual(mock_locations.call_count, 2)
+
+    def test_resample_growth_matches_per_trend_interpolation(self):
+        rng = np.random.default_rng(7)
+        frames = []
+        for trend, count in (('#B', 5), ('#A', 9), ('#C', 4)):
+            times = pd.Timestamp('2025-01-01') + pd.to_timedelta(np.sort(rng.choice(10_000, count, replace=False)),
+                                                                 unit='min')
+            popularity = rng.integers(1_000, 100_000, count).astype(float)
+            popularity[1] = np.nan  # Counted as 0
+            frames.append(pd.DataFrame({'trend': trend, 'last_updated': times, 'popularity': popularity}))
+        df = pd.concat(frames).sample(frac=1, random_state=1)
+
+        trends, times, popularity = explorations.resample_growth(df, points=24)
+
+        self.assertEqual(trends, ['#A', '#B', '#C'])
+        for row, trend in enumerate(trends):
+            history = df[df['trend'] == trend].sort_values('last_updated')
+            expected_times = pd.date_range(history['last_updated'].min(), history['last_updated'].max(), periods=24)
+            expected = np.interp(expected_times.asi8, history['last_updated'].to_numpy().astype(np.int64),
+                                 history['popularity'].fillna(0))
+            self.assertTrue((np.abs(times[row] - expected_times.to_numpy()) <= np.timedelta64(1, 'us')).all())
+            np.testing.assert_allclose(popularity[row], expected)
+
+    @patch('frontend.explorations.table_version', return_value=pd.Timestamp('2025-01-01 02:00'))
+    @patch('frontend.explorations.transform_trend_observations')
+    def test_growth_series_are_computed_once_per_observations_version(self, mock_observations, mock_version):
+        mock_observations.return_value = pd.DataFrame({
+            'trend': ['#A', '#A', '#B', '#B'],
+            'last_updated': pd.to_datetime(['2025-01-01 00:00', '2025-01-01 01:00', '2025-01-01 00:00',
+                                            '2025-01-01 02:00']),
+            'popularity': [0, 1_000, 500, None],
+        })
+        explorations.load_growth_series.clear()
+        self.addCleanup(explorations.load_growth_series.clear)
+
+        growth = explorations.growth_series()
+        series = explorations.growth_series().series('#A')
+
+        mock_observations.assert_called_once_with(explorations.TREND_GROWTH_WINDOW_DAYS)
+        self.assertEqual(growth.trends, ['#A', '#B'])
+        self.assertEqual(len(series), explorations.TREND_GROWTH_POINTS)
+        self.assertEqual(series['popularity'].iloc[-1], 1_000)
+        self.assertEqual(growth.series('#B')['popularity'].iloc[-1], 0)
+
+        # The version is the newest observation, which another process's ingest also moves
+        mock_version.assert_called_with('student.twitter_trend_observation', 'observed_at')
+        mock_version.return_value = pd.Timestamp('2025-01-01 03:00')
+        explorations.growth_series()
+        self.assertEqual(mock_observations.call_count, 2)
+
+        # A refresh is a new version too
+        explorations.clear_cache()
+        explorations.growth_series()
+        self.assertEqual(mock_observations.call_count, 3)
+
+    @patch('frontend.explorations.transform_top_trend_rank', return_value=None)  # The view cannot be read
+    @patch('frontend.explorations.transform_top_trends')
+    def test_top_trends_are_distinct(self, mock_top_trends, mock_top_trend_rank):
+        # The same trend is popular in two countries
+        mock_top_trends.return_value = pd.DataFrame({
+            'trend': ['#A', '#A', '#B'], 'meta_description': ['2M posts', '1M posts', '5K posts'],
+            'domain_context': ['Sports'] * 3, 'url': ['a', 'a', 'b'], 'country': ['spain', 'italy', 'spain'],
+            'popularity': [2_000_000, 1_000_000, 5_000],
+        })
+
+        df = explorations.top_trends(countries=('spain', 'italy'), limit=2)
+
+        mock_top_trends.assert_called_once_with(('spain', 'italy'), None, limit=6)
+        self.assertEqual(df['Trend'].tolist(), ['#A', '#B'])
+        self.assertEqual(df.columns.tolist(), ['Trend', 'Popularity', 'domain_context', 'URL', 'country'])
+
+    @patch('frontend.explorations.transform_top_trends')
+    @patch('frontend.explorations.transform_top_trend_rank')
+    def test_top_trends_read_the_ranking_view(self, mock_top_trend_rank, mock_top_trends):
+        # Spain and Italy both rank #A, once per selected cell
+        mock_top_trend_rank.return_value = pd.DataFrame({
+            'trend': ['#A', '#A', '#B'], 'meta_description': ['2M posts', '1M posts', '5K posts'],
+            'domain_context': ['Sports'] * 3, 'url': ['a', 'a', 'b'], 'country': ['spain', 'italy', 'spain'],
+            'popularity': [2_000_000, 1_000_000, 5_000],
+        })
+
+        df = explorations.top_trends(countries=('spain', 'italy'), limit=10)
+
+        mock_top_trend_rank.assert_called_once_with(('spain', 'italy'), None)
+        mock_top_trends.assert_not_called()
+        self.assertEqual(df['Trend'].tolist(), ['#A', '#B'])
+        self.assertEqual(df['country'].tolist(), ['spain', 'spain'])
+
+    @patch('frontend.explorations.transform_latest_trends')
+    def test_latest_trends_are_looked_up_per_category(self, mock_latest_trends):
+        mock_latest_trends.return_value = pd.DataFrame({'trend': ['#B', '#A'], 'domain_context': ['Music', 'Sports'],
+                                                        'url': ['b', 'a'], 'last_updated': pd.date_range('2025-01-01', periods=2)})
+
+        df = explorations.latest_trends()
+        explorations.latest_trends('Music')
+
+        self.assertEqual(df.columns.tolist(), ['Trend', 'Category', 'url', 'last_updated'])
+        self.assertEqual([call.args[0] for call in mock_latest_trends.call_args_list], [None, 'Music'])
+
+
+if __name__ == '__main__':
+    unittest.main()
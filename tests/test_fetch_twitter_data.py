@@ -7,7 +7,7 @@ from scripts.fetch_twitter_data import fetch_twitter_locations, fetch_twitter_ha
 
 class TestTwitterAPI(unittest.TestCase):
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_twitter_locations_success(self, mock_get):
         # Simulate a successful API response
         mock_get.return_value.status_code = 200
@@ -18,8 +18,9 @@ class TestTwitterAPI(unittest.TestCase):
         self.assertEqual(result[0]['place_id'], "123")
         self.assertEqual(result[0]['name'], "Test Location")
 
-    @patch('requests.get')
-    def test_fetch_twitter_locations_failure(self, mock_get):
+    @patch('scripts.http_client.time.sleep')
+    @patch('requests.Session.get')
+    def test_fetch_twitter_locations_failure(self, mock_get, mock_sleep):
         # Simulate an API failure
         mock_get.return_value.status_code = 500
         mock_get.return_value.text = "Internal Server Error"
@@ -27,7 +28,7 @@ class TestTwitterAPI(unittest.TestCase):
         result = fetch_twitter_locations()
         self.assertIsNone(result)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_twitter_hashtags_success(self, mock_get):
         # Simulate a successful API response
         mock_get.return_value.status_code = 200
@@ -38,7 +39,7 @@ class TestTwitterAPI(unittest.TestCase):
         self.assertIn("#Python", result['hashtags'])
         self.assertIn("#Coding", result['hashtags'])
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_twitter_trends_success(self, mock_get):
         # Simulate a successful API response
         mock_get.return_value.status_code = 200
@@ -49,6 +50,16 @@ class TestTwitterAPI(unittest.TestCase):
         self.assertIn("#PythonTrending", result['trends'])
         self.assertIn("#TechNews", result['trends'])
 
+    @patch('scripts.fetch_twitter_data.TWITTER_API_BASE_URL', "http://127.0.0.1:8765/")
+    @patch('requests.Session.get')
+    def test_fetch_twitter_trends_base_url_override(self, mock_get):
+        # Requests go to the configured base URL, e.g. the local API stand-in
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"trends": []}
+
+        fetch_twitter_trends("123")
+        self.assertEqual(mock_get.call_args[0][0], "http://127.0.0.1:8765/v1.1/Trends/")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from scripts import http_client
+
+
+def make_response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+class TestHttpClient(unittest.TestCase):
+
+    @patch('scripts.http_client.time.sleep')
+    @patch('requests.Session.get')
+    def test_retries_rate_limit_using_retry_after(self, mock_get, mock_sleep):
+        # The first attempt is rate limited, the second one succeeds
+        mock_get.side_effect = [make_response(429, {"Retry-After": "3"}), make_response(200)]
+
+        response = http_client.get("https://example.com/trends")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_get.call_count, 2)
+        mock_sleep.assert_called_once_with(3.0)
+
+    @patch('scripts.http_client.time.sleep')
+    @patch('requests.Session.get')
+    def test_gives_up_after_max_retries(self, mock_get, mock_sleep):
+        mock_get.return_value = make_response(503)
+
+        response = http_client.get("https://example.com/trends", max_retries=2)
+
+        # The last error response is returned to the caller
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @patch('scripts.http_client.time.sleep')
+    @patch('requests.Session.get')
+    def test_client_errors_are_not_retried(self, mock_get, mock_sleep):
+        mock_get.return_value = make_response(404)
+
+        response = http_client.get("https://example.com/trends")
+
+        self.assertEqual(response.status_code, 404)
+        mock_get.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    @patch('scripts.http_client.time.sleep')
+    @patch('requests.Session.get')
+    def test_connection_errors_are_retried(self, mock_get, mock_sleep):
+        mock_get.side_effect = [requests.ConnectionError("reset"), make_response(200)]
+
+        response = http_client.get("https://example.com/trends")
+
+        self.assertEqual(response.status_code, 200)
+        # Requests always carry a timeout
+        self.assertEqual(mock_get.call_args.kwargs["timeout"], http_client.REQUEST_TIMEOUT)
+
+    def test_backoff_delay_is_bounded(self):
+        for attempt in range(10):
+            delay = http_client.backoff_delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, http_client.BACKOFF_MAX)
+
+
+if __name__ == '__main__':
+    unittest.main()
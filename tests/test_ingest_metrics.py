@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+from scripts import ingest_metrics, http_client
+
+
+class TestIngestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.run = ingest_metrics.start_run("ingest")
+        self.addCleanup(ingest_metrics.finish_run, self.run)
+
+    @patch('requests.Session.get')
+    def test_records_api_requests(self, mock_get):
+        response = MagicMock(status_code=200, headers={}, content=b"x" * 120)
+        mock_get.return_value = response
+
+        http_client.get("https://api.example.com/v1/trends/", params={"location_id": "23424950"})
+        http_client.get("https://api.example.com/v1/trends/", params={"location_id": "23424950"})
+
+        report = ingest_metrics.finish_run(self.run)
+        self.assertEqual(report["api"]["/v1/trends/"]["requests"], 2)
+        self.assertEqual(report["api"]["/v1/trends/"]["bytes"], 240)
+        self.assertEqual(report["api"]["/v1/trends/"]["statuses"], {"200": 2})
+        self.assertEqual(report["api_locations"]["23424950"]["attempts"], 2)
+
+        # Requests after the run are not recorded
+        http_client.get("https://api.example.com/v1/trends/")
+        self.assertEqual(self.run.report()["api"]["/v1/trends/"]["requests"], 2)
+
+    def test_records_stages_rows_and_failures(self):
+        with ingest_metrics.stage("twitter_trends"):
+            with ingest_metrics.statement("twitter_trend.merge"):
+                pass
+            with ingest_metrics.statement("twitter_trend.merge"):
+                pass
+        ingest_metrics.rows("twitter_trends", parsed=10, inserted=7, skipped=3)
+        ingest_metrics.rows("twitter_trends", parsed=5, inserted=5)
+        ingest_metrics.failure("twitter_trends", ValueError("bad payload"), "23424950")
+
+        report = ingest_metrics.finish_run(self.run)
+        self.assertIn("twitter_trends", report["stages"])
+        self.assertEqual(report["statements"]["twitter_trend.merge"]["calls"], 2)
+        self.assertEqual(report["rows"]["twitter_trends"], {"parsed": 15, "inserted": 12, "skipped": 3})
+        self.assertEqual(report["failures"],
+                         [{"stage": "twitter_trends", "location": "23424950", "error": "bad payload"}])
+
+    def test_no_active_run(self):
+        ingest_metrics.finish_run(self.run)
+
+        # Nothing to record into, and nothing fails
+        with ingest_metrics.stage("google_trends"):
+            ingest_metrics.rows("google_trends", parsed=1)
+        self.assertEqual(self.run.report()["rows"], {})
+
+    def test_write_report(self):
+        ingest_metrics.rows("google_trends", parsed=2, inserted=2)
+        ingest_metrics.failure("google_trends", 'quote " and\nnewline')
+        report = ingest_metrics.finish_run(self.run)
+
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = ingest_metrics.write_report(report, directory)
+            with open(json_path) as file:
+                self.assertEqual(json.load(file), report)
+            with open(os.path.join(directory, ingest_metrics.PROMETHEUS_FILE)) as file:
+                text = file.read()
+            self.assertEqual(sorted(os.listdir(directory)), sorted([os.path.basename(json_path),
+                                                                    ingest_metrics.PROMETHEUS_FILE]))
+
+        self.assertIn('nowtrending_ingest_rows{source="google_trends",outcome="inserted"} 2', text)
+        self.assertIn('nowtrending_ingest_failures{stage="google_trends"} 1', text)
+        self.assertIn("# TYPE nowtrending_ingest_run_seconds gauge", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from frontend.popularity import parse_popularity, parse_popularity_series
+
+
+class TestPopularity(unittest.TestCase):
+
+    VALUES = ["1.7M posts", "997K posts", "9,969 posts", "2.5k", "12 posts", "5 Mentions", "", "abc", None, 7]
+    EXPECTED = [1_700_000, 997_000, 9_969, 2_500, 12, 5, np.nan, np.nan, np.nan, np.nan]
+
+    def test_parse_popularity(self):
+        for value, expected in zip(self.VALUES, self.EXPECTED):
+            with self.subTest(value=value):
+                np.testing.assert_equal(parse_popularity(value), expected)
+
+    def test_series_matches_scalar_parser(self):
+        values = pd.Series(self.VALUES * 3, index=range(100, 100 + 3 * len(self.VALUES)))
+
+        parsed = parse_popularity_series(values)
+
+        # Same results as the scalar parser, on the same index
+        self.assertTrue(parsed.index.equals(values.index))
+        np.testing.assert_array_equal(parsed.to_numpy(), np.array(self.EXPECTED * 3, dtype=float))
+
+    def test_series_without_values(self):
+        self.assertTrue(parse_popularity_series(pd.Series([], dtype=object)).empty)
+        self.assertTrue(parse_popularity_series(pd.Series([None, ""])).isna().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from frontend import explorations, profiler
+
+
+class TestProfiler(unittest.TestCase):
+
+    def tearDown(self):
+        profiler.start_render(enabled=False)
+
+    def test_sections_calls_and_queries(self):
+        @profiler.profiled
+        def inner():
+            profiler.query("student.twitter_trend", 25, 0.01)
+
+        @profiler.profiled
+        def outer():
+            inner()
+            inner()
+
+        profiler.start_render()
+        profiler.section("Top trends")
+        outer()
+        profiler.section("Google trends")
+        report = profiler.finish_render()
+
+        self.assertEqual([section["section"] for section in report["sections"]], ["Top trends", "Google trends"])
+        self.assertEqual(report["calls"]["test_profiler.inner"]["calls"], 2)
+        outer_call = report["calls"]["test_profiler.outer"]
+        self.assertLessEqual(outer_call["self_seconds"], outer_call["seconds"])
+        self.assertEqual(report["queries"]["student.twitter_trend"], {"queries": 2, "rows": 50,
+                                                                      "seconds": 0.02})
+        self.assertEqual((report["total_queries"], report["total_rows"]), (2, 50))
+        json.dumps(report)  # Exportable as it is
+
+    def test_not_profiled(self):
+        profiler.section("Top trends")
+        profiler.query("student.twitter_trend", 1, 0.01)
+
+        self.assertIsNone(profiler.current())
+        self.assertIsNone(profiler.finish_render())
+
+    @patch('frontend.explorations.transform_latest_trend_categories')
+    def test_cached_calls_are_counted(self, mock_categories):
+        mock_categories.return_value = pd.DataFrame({'category': ['Music', 'Sports']})
+        explorations.clear_cache()
+        self.addCleanup(explorations.clear_cache)
+
+        profiler.start_render()
+        explorations.latest_trend_categories()
+        explorations.latest_trend_categories()
+        report = profiler.finish_render()
+
+        # The second call is answered by the cache, but still shows up
+        self.assertEqual(report["calls"]["explorations.latest_trend_categories"]["calls"], 2)
+        self.assertEqual(mock_categories.call_count, 1)
+
+    def test_reports_are_appended_to_the_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profiles.jsonl")
+            with patch('frontend.profiler.PROFILE_LOG', path):
+                for _ in range(2):
+                    profiler.start_render()
+                    profiler.section("Page setup")
+                    profiler.finish_render()
+
+            with open(path) as file:
+                reports = [json.loads(line) for line in file]
+        self.assertEqual(len(reports), 2)
+        self.assertEqual(reports[0]["sections"][0]["section"], "Page setup")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+from scripts import refresh_runner
+
+
+class TestRefreshRunner(unittest.TestCase):
+
+    def setUp(self):
+        refresh_runner._status = refresh_runner.RefreshStatus()
+
+    @patch('scripts.refresh_runner.update_database')
+    def test_single_refresh_at_a_time(self, mock_update_database):
+        release = threading.Event()
+        finished = threading.Event()
+
+        def update(progress):
+            progress("Twitter trends", 1, 4)
+            release.wait(5)
+        mock_update_database.side_effect = update
+        on_complete = MagicMock(side_effect=finished.set)
+
+        first = refresh_runner.start_refresh(on_complete=on_complete)
+        second = refresh_runner.start_refresh(on_complete=on_complete)
+
+        # The second call joins the running refresh instead of starting another one
+        self.assertEqual(first.state, "running")
+        self.assertEqual(second.started_at, first.started_at)
+        release.set()
+        self.assertTrue(finished.wait(5))
+
+        for _ in range(100):
+            if refresh_runner.refresh_status().state != "running":
+                break
+            threading.Event().wait(0.01)
+        status = refresh_runner.refresh_status()
+        self.assertEqual(status.state, "succeeded")
+        self.assertEqual((status.stage, status.fraction), ("Twitter trends", 0.25))
+        mock_update_database.assert_called_once()
+        on_complete.assert_called_once()
+
+    @patch('scripts.refresh_runner.update_database', side_effect=RuntimeError("API down"))
+    def test_failed_refresh(self, mock_update_database):
+        on_complete = MagicMock()
+
+        refresh_runner.start_refresh(on_complete=on_complete)
+        for _ in range(100):
+            if refresh_runner.refresh_status().state != "running":
+                break
+            threading.Event().wait(0.01)
+
+        status = refresh_runner.refresh_status()
+        self.assertEqual((status.state, status.error), ("failed", "API down"))
+        on_complete.assert_not_called()
+
+    @patch('scripts.refresh_runner.update_database')
+    def test_refresh_is_judged_by_its_report(self, mock_update_database):
+        quota = {"stage": "twitter_trends", "location": "1", "error": "quota"}
+        reports = [
+            ({"failures": [], "rows": {}}, ("succeeded", None)),  # Every source was still fresh
+            ({"failures": [quota, quota], "rows": {}},
+             ("failed", "2 failures, e.g. twitter_trends: quota")),
+            ({"failures": [quota], "rows": {"google_trends": {"parsed": 20, "inserted": 5, "skipped": 15}}},
+             ("partial", "1 failure, e.g. twitter_trends: quota")),
+        ]
+        for report, expected in reports:
+            with self.subTest(expected[0]):
+                mock_update_database.return_value = report
+                refresh_runner.start_refresh()
+                for _ in range(100):
+                    if refresh_runner.refresh_status().state != "running":
+                        break
+                    threading.Event().wait(0.01)
+
+                status = refresh_runner.refresh_status()
+                self.assertEqual((status.state, status.error), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import patch
+
+from benchmarks.synthetic import twitter_timeline
+from scripts.response_archive import ResponseArchive, read_archive
+from scripts.update_database import replay_archive, main
+
+
+class TestResponseArchive(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_runs_write_files_of_their_own(self):
+        with ResponseArchive(self.directory) as archive:
+            archive.record("twitter_locations", None, [{"place_id": "1"}])
+        # A second run records from several threads at once
+        with ResponseArchive(self.directory) as archive, ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda i: archive.record("twitter_trends", str(i), {"i": i}), range(20)))
+
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        records = list(read_archive([self.directory]))
+        self.assertEqual(len(records), 21)
+        self.assertEqual(records[0]["response"], [{"place_id": "1"}])
+        self.assertEqual(sorted(r["location"] for r in records[1:]), sorted(str(i) for i in range(20)))
+        self.assertTrue(all(r["fetched_at"] for r in records))
+
+    def test_truncated_archive_keeps_the_complete_records(self):
+        with ResponseArchive(self.directory) as archive:
+            for i in range(3):
+                archive.record("twitter_trends", str(i), {"i": i})
+        with open(archive.path, "rb") as file:
+            data = file.read()
+        with open(archive.path, "wb") as file:
+            file.write(data[:-10])  # The gzip trailer is lost
+
+        self.assertEqual([r["location"] for r in read_archive([archive.path])], ["0", "1", "2"])
+
+    def test_run_appended_after_a_killed_run_does_not_break_the_archive(self):
+        # Archives used to append every run of a day to one file
+        path = os.path.join(self.directory, "responses-20250314.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as file:
+            for i in range(2000):
+                file.write(json.dumps({"source": "twitter_trends", "location": str(i), "response": {"i": i}}) + "\n")
+        with open(path, "rb") as file:
+            data = file.read()
+        with open(path, "wb") as file:
+            file.write(data[:len(data) // 2])  # The run was killed
+        with gzip.open(path, "at", encoding="utf-8") as file:
+            file.write(json.dumps({"source": "google_trends", "location": None, "response": {}}) + "\n")
+
+        records = list(read_archive([path]))
+        self.assertTrue(all(isinstance(record, dict) for record in records))
+
+    @patch('scripts.update_database.record_watermark')
+    @patch('scripts.update_database.refresh_rankings')
+    @patch('scripts.update_database.update_google_trends_database')
+    @patch('scripts.update_database.update_trends_database')
+    @patch('scripts.update_database.update_twitter_locations')
+    @patch('scripts.update_database.observation_time', return_value=None)
+    @patch('scripts.update_database.load_watermark_ages', return_value={})
+    @patch('scripts.update_database.fetch_google_trends', return_value={"data": []})
+    @patch('scripts.update_database.fetch_twitter_trends', side_effect=lambda location_id: twitter_timeline(2))
+    @patch('scripts.update_database.fetch_twitter_locations')
+    def test_ingest_archives_every_response(self, mock_fetch_locations, *mocks):
+        mock_fetch_locations.return_value = [{"place_id": "1", "location_type": "Country"},
+                                             {"place_id": "2", "location_type": "Country"}]
+
+        main(max_workers=2, archive_dir=self.directory)
+
+        records = list(read_archive([self.directory]))
+        self.assertEqual([r["source"] for r in records[:1] + records[-1:]], ["twitter_locations", "google_trends"])
+        self.assertEqual(sorted(r["location"] for r in records[1:-1]), ["1", "2"])
+        self.assertEqual(records[1]["response"], twitter_timeline(2))
+
+    @patch('scripts.update_database.refresh_rankings')
+    @patch('scripts.update_database.update_google_trends_database')
+    @patch('scripts.update_database.update_trends_database')
+    @patch('scripts.update_database.update_twitter_locations')
+    def test_replay_loads_the_archived_responses(self, mock_locations, mock_trends, mock_google, mock_refresh):
+        with ResponseArchive(self.directory) as archive:
+            archive.record("twitter_locations", None, [{"place_id": "1", "location_type": "Country"}])
+            archive.record("twitter_trends", "1", twitter_timeline(5))
+            archive.record("twitter_trends", "2", {"status": False, "message": "quota"})  # Skipped like a live run
+            archive.record("google_trends", None, {"data": []})
+        records = list(read_archive([self.directory]))
+
+        with patch('scripts.update_database.fetch_twitter_trends') as mock_fetch:
+            stats = replay_archive([self.directory])
+            mock_fetch.assert_not_called()
+
+        mock_locations.assert_called_once_with([{"place_id": "1", "location_type": "Country"}])
+        mock_trends.assert_called_once()
+        self.assertEqual(mock_trends.call_args.args[1], "1")
+        # Stamped with the archived times: observed at the start of the run, last updated when fetched
+        self.assertEqual(mock_trends.call_args.args[2:],
+                         (datetime.fromisoformat(records[1]["run_started_at"]),
+                          datetime.fromisoformat(records[1]["fetched_at"])))
+        mock_google.assert_called_once_with({"data": []}, datetime.fromisoformat(records[3]["fetched_at"]))
+        mock_refresh.assert_called_once()
+        self.assertEqual((stats["responses"], stats["trends"]), (4, len(mock_trends.call_args.args[0])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import tempfile
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+import pandas as pd
+
+from frontend import transformation
+from frontend.transformation import TableQuery, TWITTER_TREND, transform_twitter_locations, transform_top_trends
+
+
+class TestTableQuery(unittest.TestCase):
+
+    def test_sql_selects_declared_columns(self):
+        query = TableQuery(table="student.t", columns={"id": "id", "country": "lower(country)"})
+
+        self.assertEqual(query.sql(), "SELECT id, lower(country) AS country FROM student.t")
+
+    def test_select_narrows_columns_and_rows(self):
+        query = TWITTER_TREND.select(
+            columns=['trend', 'url'],
+            where=["meta_description <> ''"],
+            distinct_on=['trend_name'],
+        )
+
+        self.assertEqual(
+            query.sql(),
+            "SELECT DISTINCT ON (trend_name) trend_name AS trend, url FROM student.twitter_trend "
+            "WHERE (meta_description <> '') ORDER BY trend_name"
+        )
+        # The declared query itself is left untouched
+        self.assertEqual(TWITTER_TREND.where, ())
+
+    @patch('frontend.snapshot_cache.SNAPSHOT_DIR', '')  # Without snapshots every read is a query
+    @patch('frontend.transformation.pd.read_sql')
+    @patch('frontend.transformation.db_connection')
+    def test_transform_runs_pushed_down_query(self, mock_db_connection, mock_read_sql):
+        mock_conn = MagicMock()
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
+
+        result = transform_twitter_locations()
+
+        self.assertIs(result, mock_read_sql.return_value)
+        sql = mock_read_sql.call_args.args[0]
+        self.assertIn("DISTINCT ON (lower(country_name))", sql)
+        self.assertIs(mock_read_sql.call_args.args[1], mock_conn)
+
+    @patch('frontend.transformation.pd.read_sql')
+    @patch('frontend.transformation.db_connection')
+    def test_top_trends_is_an_ordered_limit(self, mock_db_connection, mock_read_sql):
+        transform_top_trends(countries=['spain'], limit=30)
+
+        sql = mock_read_sql.call_args.args[0]
+        self.assertTrue(sql.endswith("ORDER BY t.popularity DESC NULLS LAST LIMIT 30"))
+        self.assertIn("lower(l.country_name) = ANY(%(countries)s)", sql)
+        self.assertEqual(mock_read_sql.call_args.kwargs['params'], {'countries': ['spain']})
+
+    def test_sql_groups_before_ordering(self):
+        query = TableQuery(table="student.t", columns={"trend": "trend_name", "popularity": "MAX(popularity)"},
+                           group_by=("trend_name",), order_by=("trend_name",))
+
+        self.assertEqual(
+            query.sql(),
+            "SELECT trend_name AS trend, MAX(popularity) AS popularity FROM student.t "
+            "GROUP BY trend_name ORDER BY trend_name"
+        )
+
+
+    @patch('frontend.transformation.pd.read_sql')
+    @patch('frontend.transformation.db_connection')
+    def test_top_trend_rank_reads_the_selected_cells(self, mock_db_connection, mock_read_sql):
+        transformation.transform_top_trend_rank(countries=('spain', 'italy'))
+
+        sql = mock_read_sql.call_args.args[0]
+        self.assertIn("FROM student.top_trend_rank WHERE (cell_country = ANY(%(countries)s))", sql)
+        self.assertEqual(mock_read_sql.call_args.kwargs['params'],
+                         {'countries': ['spain', 'italy'], 'categories': [transformation.ALL_CELLS]})
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for patcher in (patch('frontend.snapshot_cache.SNAPSHOT_DIR', directory.name),
+                        patch('frontend.transformation.database_identity', return_value='postgres://db:5432/a')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def trends(ids, hour):
+        return pd.DataFrame({'id': ids, 'trend': [f'#T{i}' for i in ids],
+                             'modified_at': [pd.Timestamp('2025-01-01') + pd.Timedelta(hours=hour)] * len(ids)})
+
+    @patch('frontend.transformation.read_table')
+    def test_sync_fetches_only_new_rows(self, mock_read_table):
+        # The first read builds the snapshot from the whole table
+        mock_read_table.return_value = self.trends([1, 2], hour=1)
+        first = transformation.transform_twitter_trend(columns=['id', 'trend'])
+        self.assertEqual(first['id'].tolist(), [1, 2])
+        self.assertEqual(mock_read_table.call_args.args[0].where, ())
+
+        # The next one only asks for the rows updated since, and merges them in by id
+        mock_read_table.return_value = pd.concat([self.trends([2], hour=1), self.trends([3], hour=2)])
+        second = transformation.transform_twitter_trend()
+        query = mock_read_table.call_args.args[0]
+        self.assertIn("modified_at >= %(since)s", query.where)
+        self.assertEqual(mock_read_table.call_args.kwargs['params'],
+                         {'since': pd.Timestamp('2025-01-01 01:00') - transformation.SNAPSHOT_SYNC_OVERLAP})
+        self.assertEqual(second['id'].tolist(), [1, 2, 3])
+
+        # The database being unreachable leaves the snapshot readable
+        mock_read_table.return_value = None
+        self.assertEqual(transformation.transform_twitter_trend()['id'].tolist(), [1, 2, 3])
+
+    @patch('frontend.transformation.read_table')
+    def test_snapshot_of_another_database_is_rebuilt(self, mock_read_table):
+        mock_read_table.return_value = self.trends([1, 2], hour=1)
+        transformation.transform_twitter_trend()
+
+        # The same query on another database reads the whole table again instead of syncing into the snapshot
+        mock_read_table.return_value = self.trends([7], hour=1)
+        with patch('frontend.transformation.database_identity', return_value='duckdb:///tmp/b.duckdb'):
+            other = transformation.transform_twitter_trend()
+        self.assertEqual(mock_read_table.call_args.args[0].where, ())
+        self.assertEqual(other['id'].tolist(), [7])
+
+    @patch('frontend.transformation.read_table')
+    def test_small_tables_are_reloaded_when_expired(self, mock_read_table):
+        mock_read_table.return_value = pd.DataFrame({'location_id': ['1'], 'country': ['spain']})
+
+        transformation.transform_twitter_locations()
+        transformation.transform_twitter_locations()
+        self.assertEqual(mock_read_table.call_count, 1)
+
+        time.sleep(0.01)  # The snapshot file is older than the expiry
+        transformation.expire_snapshots()
+        transformation.transform_twitter_locations()
+        self.assertEqual(mock_read_table.call_count, 2)
+
+    @patch('frontend.transformation.read_table')
+    def test_narrowed_reads_go_to_the_database(self, mock_read_table):
+        transformation.transform_twitter_trend(where=["position = 1"])
+
+        query = mock_read_table.call_args.args[0]
+        self.assertEqual(query.where, ("position = 1",))
+        self.assertEqual(query.order_by, ("id",))
+
+
+if __name__ == '__main__':
+    unittest.main()
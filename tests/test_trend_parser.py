@@ -0,0 +1,50 @@
+import io
+import json
+import unittest
+from unittest.mock import patch
+
+from benchmarks.bench_parse_trends import legacy_parse_trends_data
+from benchmarks.synthetic import twitter_timeline
+from scripts.trend_parser import parse_trends, iter_trends, extract_trend
+
+
+class TestTrendParser(unittest.TestCase):
+
+    def test_same_trends_as_the_previous_parser(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                timeline = twitter_timeline(2_000, seed=seed)
+                self.assertEqual(parse_trends(timeline), legacy_parse_trends_data(timeline))
+
+    def test_only_the_first_add_entries_instruction_is_read(self):
+        timeline = twitter_timeline(10)
+        instructions = timeline["timeline"]["instructions"]
+        instructions.append(json.loads(json.dumps(instructions[1])))
+
+        self.assertEqual(len(parse_trends(timeline)), len(legacy_parse_trends_data(timeline)))
+        self.assertEqual(parse_trends({"timeline": {"instructions": [{"clearCache": {}}]}}), [])
+
+    def test_missing_levels_take_the_defaults(self):
+        # The previous parser failed on the null levels
+        item = {"item": {"clientEventInfo": None, "content": {"trend": {"name": "#A", "url": None}}}}
+
+        self.assertEqual(extract_trend(item), {
+            "trendName": "#A", "position": 0, "metaDescription": "", "domainContext": "",
+            "url": "", "impressionId": "", "relatedTerms": [],
+        })
+        self.assertIsNone(extract_trend({"item": {"content": {"trend": {}}}}))
+        # Every trend gets its own list
+        self.assertIsNot(extract_trend(item)["relatedTerms"], extract_trend(item)["relatedTerms"])
+
+    def test_streaming_yields_the_same_trends(self):
+        timeline = twitter_timeline(500)
+        raw = json.dumps(timeline).encode()
+
+        self.assertEqual(list(iter_trends(io.BytesIO(raw))), parse_trends(timeline))
+        # Without ijson the response is decoded whole, with the same result
+        with patch('scripts.trend_parser.ijson', None):
+            self.assertEqual(list(iter_trends(io.BytesIO(raw))), parse_trends(timeline))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,37 +1,42 @@
 import unittest
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch, MagicMock
-from scripts.update_database import update_hashflags_database, update_trends_database
+from scripts.update_database import update_hashflags_database, update_trends_database, update_all_trends, load_google_records, ensure_observation_partition, main
+
+SEEN_AT = datetime(2025, 3, 14, 12, 0)
 
 
 class TestTwitterDataUpdate(unittest.TestCase):
 
-    @patch('scripts.fetch_twitter_data.fetch_twitter_hashtags')
-    @patch('scripts.fetch_twitter_data.fetch_twitter_trends')
-    @patch('database.database.get_db_connection')
-    def test_update_hashflags_database(self, mock_get_db_connection, mock_fetch_trends, mock_fetch_hashtags):
+    @patch('scripts.update_database.fetch_twitter_hashtags')
+    @patch('scripts.update_database.db_connection')
+    def test_update_hashflags_database(self, mock_db_connection, mock_fetch_hashtags):
         # Mock the fetch_twitter_hashtags response
         mock_fetch_hashtags.return_value = [{"hashtag": "#Test", "starting_timestamp_ms": 1609459200000, "ending_timestamp_ms": 1609545600000}]
         
         # Mock the database connection
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_get_db_connection.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         
         # Run the function
         update_hashflags_database()
         
         # Assertions
-        mock_cursor.execute.assert_called_once_with(  # Check that the correct query was executed
-            'INSERT INTO student.twitter_hashflags (hashtag, starting_timestamp_ms, ending_timestamp_ms, asset_url, is_hashfetti_enabled) VALUES (%s, to_timestamp(%s), to_timestamp(%s), %s, %s) ON CONFLICT (hashtag) DO UPDATE SET starting_timestamp_ms = EXCLUDED.starting_timestamp_ms, ending_timestamp_ms = EXCLUDED.ending_timestamp_ms, asset_url = EXCLUDED.asset_url, is_hashfetti_enabled = EXCLUDED.is_hashfetti_enabled, last_updated = CURRENT_TIMESTAMP;',
-            ('#Test', 1609459200, 1609545600, None, False)
+        mock_cursor.execute.assert_called_once()  # Check that the correct query was executed
+        query, params = mock_cursor.execute.call_args.args
+        self.assertEqual(
+            " ".join(query.split()),
+            'INSERT INTO student.twitter_hashflags (hashtag, starting_timestamp_ms, ending_timestamp_ms, asset_url, is_hashfetti_enabled) VALUES (%s, to_timestamp(%s), to_timestamp(%s), %s, %s) ON CONFLICT (hashtag) DO UPDATE SET starting_timestamp_ms = EXCLUDED.starting_timestamp_ms, ending_timestamp_ms = EXCLUDED.ending_timestamp_ms, asset_url = EXCLUDED.asset_url, is_hashfetti_enabled = EXCLUDED.is_hashfetti_enabled, last_updated = now();'
         )
+        self.assertEqual(params, ('#Test', 1609459200, 1609545600, None, False))
         
         mock_conn.commit.assert_called_once()  # Ensure that commit was called
 
     @patch('scripts.fetch_twitter_data.fetch_twitter_hashtags')
     @patch('scripts.fetch_twitter_data.fetch_twitter_trends')
-    @patch('database.database.get_db_connection')
+    @patch('scripts.update_database.db_connection')
     def test_update_trends_database(self, mock_get_db_connection, mock_fetch_trends, mock_fetch_hashtags):
         # Test data
         trends_data = [
@@ -97,33 +102,182 @@ class TestTwitterDataUpdate(unittest.TestCase):
         mock_get_db_connection.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
 
-        # Simulate existing trends in the database
-        mock_cursor.execute.return_value = None  # No actual database call
-        mock_cursor.fetchall.return_value = [("#Python")]  # Simulate #Python already existing in the database
+        mock_conn.__enter__.return_value = mock_conn
+        mock_cursor.rowcount = 1  # The merge inserts one new trend, the other is already stored
+        mock_cursor.fetchone.return_value = (datetime(2025, 3, 14, 12, 30),)  # Time of the load
 
         # Call the update_trends_database function
-        update_trends_database(trends_data)
-
-        # Assert that only one trend (#JavaScript) was inserted and #Python was skipped
-        mock_cursor.executemany.assert_called_once_with(
-            """
-            INSERT INTO student.twitter_trends (trend_name, position, meta_description, domain_context, url, impression_id, related_terms)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (trend_name) DO NOTHING;
-            """, [
-                ('#JavaScript', 2, "Another programming language", "Technology", "https://www.example2.com", "67890", '{"programming", "web"}')
-            ])
+        update_trends_database(trends_data, "123")
+
+        # Assert that both trends were streamed into the staging table with COPY
+        mock_cursor.copy_expert.assert_called_once()
+        copy_sql, buffer = mock_cursor.copy_expert.call_args.args
+        self.assertIn("COPY student.twitter_trend_staging", copy_sql)
+        self.assertEqual(buffer.getvalue().splitlines(), [
+            '"#Python","1","A programming language","Technology","https://www.example.com","12345","{""programming"",""coding""}","123",""',
+            '"#JavaScript","2","Another programming language","Technology","https://www.example2.com","67890","{""programming"",""web""}","123",""',
+        ])
+
+        # The merge skips existing trends in the database instead of reading them first
+        executed = [call.args[0] for call in mock_cursor.execute.call_args_list]
+        self.assertTrue(any("ON CONFLICT (trend_name, location_id) DO NOTHING" in sql for sql in executed))
+        mock_cursor.fetchall.assert_not_called()
+
+        # Every trend is appended to the history, in the partition of the current month
+        self.assertTrue(any("twitter_trend_observation_2025_03" in sql for sql in executed))
+        self.assertIn("INSERT INTO student.twitter_trend_observation", executed[-1])
+        self.assertEqual(mock_cursor.execute.call_args.args[1], (datetime(2025, 3, 14, 12, 30),))
 
         # Ensure that commit was called to save changes
         mock_conn.commit.assert_called_once()
 
-    @patch('database.database.get_db_connection')
+    @patch('scripts.update_database.db_connection')
+    def test_update_trends_database_at_run_time(self, mock_get_db_connection):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_db_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        run_time = datetime(2025, 3, 14, 12, 0)
+
+        update_trends_database([{"trendName": "#Python"}], "123", run_time)
+        update_trends_database([{"trendName": "#Python"}], "456", run_time)
+
+        # Both countries are observed at the time of the run, not at the time of their load
+        executed = [call.args for call in mock_cursor.execute.call_args_list]
+        self.assertFalse(any("LOCALTIMESTAMP" in args[0] for args in executed))
+        self.assertEqual([args[1] for args in executed if "INSERT INTO student.twitter_trend_observation" in args[0]],
+                         [(run_time,), (run_time,)])
+        # The partition is created within every load, so a load rolled back does not leave it missing
+        self.assertEqual(sum("twitter_trend_observation_2025_03" in args[0] for args in executed), 2)
+
+    @patch('scripts.update_database.db_connection')
     def test_update_trends_database_empty(self, mock_get_db_connection):
         # Test that the function does nothing if no trends data is provided
-        update_trends_database([])  # Empty data list
+        update_trends_database([], "123")  # Empty data list
+
+        # Assert that no connection was opened, because there is no data to insert
+        mock_get_db_connection.assert_not_called()
+
+    @patch('scripts.update_database.record_watermark')
+    @patch('scripts.update_database.update_trends_database')
+    @patch('scripts.update_database.fetch_twitter_trends')
+    def test_update_all_trends(self, mock_fetch_trends, mock_update_trends, mock_record_watermark):
+        # Every country gets its own single-trend timeline
+        def timeline(location_id):
+            trend = {"name": f"#Trend{location_id}"}
+            return {"timeline": {"instructions": [{"addEntries": {"entries": [
+                {"content": {"timelineModule": {"items": [{"item": {"content": {"trend": trend}}}]}}}
+            ]}}]}}
+        mock_fetch_trends.side_effect = timeline
+
+        locations = [
+            {"place_id": "1", "name": "Spain", "location_type": "Country"},
+            {"place_id": "2", "name": "Madrid", "location_type": "City"},  # Not a country, skipped
+            {"place_id": "3", "name": "Italy", "location_type": "Country"},
+        ]
+        update_all_trends(locations, max_workers=2)
+
+        # Only the two countries are fetched and each result is stored under its own location
+        self.assertEqual(mock_fetch_trends.call_count, 2)
+        stored = {call.args[1]: call.args[0][0]["trendName"] for call in mock_update_trends.call_args_list}
+        self.assertEqual(stored, {"1": "#Trend1", "3": "#Trend3"})
+
+    @patch('scripts.update_database.record_watermark')
+    @patch('scripts.update_database.update_trends_database')
+    @patch('scripts.update_database.fetch_twitter_trends')
+    def test_update_all_trends_skips_fresh_countries(self, mock_fetch_trends, mock_update_trends, mock_record_watermark):
+        mock_fetch_trends.side_effect = lambda location_id: None if location_id == "3" else {"timeline": {}}
+        mock_update_trends.return_value = True
+        progress = MagicMock()
+
+        locations = [
+            {"place_id": "1", "name": "Spain", "location_type": "Country"},
+            {"place_id": "2", "name": "France", "location_type": "Country"},
+            {"place_id": "3", "name": "Italy", "location_type": "Country"},  # The request fails
+        ]
+        watermark_ages = {
+            "twitter_trends:1": timedelta(hours=2),     # Stale, fetched again
+            "twitter_trends:2": timedelta(minutes=5),   # Fresh, skipped
+        }
+        update_all_trends(locations, max_workers=2, watermark_ages=watermark_ages, progress=progress)
+
+        self.assertEqual(sorted(call.args[0] for call in mock_fetch_trends.call_args_list), ["1", "3"])
+        # Only the country that was fetched and stored moves its watermark
+        mock_record_watermark.assert_called_once_with("twitter_trends:1")
+        progress.assert_called_with("Twitter trends", 2, 2)
+
+    @patch('scripts.update_database.refresh_rankings')
+    @patch('scripts.update_database.fetch_google_trends')
+    @patch('scripts.update_database.update_all_trends')
+    @patch('scripts.update_database.observation_time')
+    @patch('scripts.update_database.load_stored_locations')
+    @patch('scripts.update_database.load_watermark_ages')
+    def test_main_refreshes_rankings_after_new_trends(self, mock_ages, mock_stored_locations, mock_observation_time,
+                                                      mock_update_all_trends, mock_fetch_google, mock_refresh_rankings):
+        mock_ages.return_value = {"twitter_locations": timedelta(minutes=1), "google_trends": timedelta(minutes=1)}
+        mock_stored_locations.return_value = [{"place_id": "1", "name": "Spain", "location_type": "Country"}]
+
+        # Nothing new was stored, the rankings are left as they are
+        mock_update_all_trends.return_value = 0
+        main()
+        mock_refresh_rankings.assert_not_called()
+        mock_fetch_google.assert_not_called()  # Still fresh
+
+        mock_update_all_trends.return_value = 1
+        main()
+        mock_refresh_rankings.assert_called_once()
+
+    @patch('scripts.update_database.execute_values')
+    def test_load_google_records_bulk(self, mock_execute_values):
+        records = [
+            {"country": "Spain", "keywordsText": ["paella", "futbol"]},
+            {"country": "Italy", "lastUpdate": "01-02-2025 , 10:00:00", "keywordsText": ["pasta"]},
+            {"keywordsText": ["ignored"]},  # Records without a country are skipped
+        ]
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [("Spain", 7)]  # Spain is already stored
+        mock_execute_values.side_effect = [[(8, "Italy")], None]
+
+        inserted = load_google_records(mock_cursor, records, seen_at=SEEN_AT)
+
+        # One lookup for all countries, one insert for new countries and one for all keywords
+        mock_cursor.execute.assert_called_once()
+        self.assertEqual(sorted(mock_cursor.execute.call_args.args[1][0]), ["Italy", "Spain"])
+        self.assertEqual(mock_execute_values.call_count, 2)
+        self.assertEqual(mock_execute_values.call_args_list[0].args[2][0][2], "Italy")
+        self.assertEqual(mock_execute_values.call_args_list[1].args[2],
+                         [(7, "paella", SEEN_AT, SEEN_AT), (7, "futbol", SEEN_AT, SEEN_AT), (8, "pasta", SEEN_AT, SEEN_AT)])
+        self.assertEqual(inserted, 3)
+
+    @patch('scripts.update_database.execute_values')
+    def test_load_google_records_upserts_distinct_keywords(self, mock_execute_values):
+        records = [
+            {"country": "Spain", "keywordsText": ["paella", "futbol", "Paella"]},
+            {"country": "Spain", "keywordsText": ["FUTBOL"]},
+        ]
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [("Spain", 7)]
+
+        stored = load_google_records(mock_cursor, records, seen_at=SEEN_AT)
+
+        # Every keyword is upserted once, in lower case, the ones already stored are counted as seen again
+        sql, rows = mock_execute_values.call_args.args[1:3]
+        self.assertEqual(rows, [(7, "paella", SEEN_AT, SEEN_AT), (7, "futbol", SEEN_AT, SEEN_AT)])
+        self.assertIn("ON CONFLICT (google_location_id, keyword) DO UPDATE", sql)
+        self.assertIn("seen_count = google_trend.seen_count + 1", sql)
+        self.assertEqual(stored, 2)
+
+    def test_partition_of_an_archived_time_is_in_the_session_time_zone(self):
+        # Replayed times are UTC, the database converts them to its session time, e.g. New York
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = (datetime(2025, 2, 28, 21, 0),)
+
+        ensure_observation_partition(mock_cursor, datetime(2025, 3, 1, 2, 0, tzinfo=timezone.utc))
 
-        # Assert that commit was not called, because there is no data to insert
-        mock_get_db_connection().commit.assert_not_called()
+        self.assertEqual(mock_cursor.execute.call_args_list[0].args[1], (datetime(2025, 3, 1, 2, 0, tzinfo=timezone.utc),))
+        sql, bounds = mock_cursor.execute.call_args.args
+        self.assertIn("twitter_trend_observation_2025_02", sql)
+        self.assertEqual(bounds, (datetime(2025, 2, 1), datetime(2025, 3, 1)))
 
 
 if __name__ == '__main__':